@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark: rank_bm25 BM25Okapi vs the sparse-matrix engine (apollo_ai_agent/sparse_bm25.py).
+
+Synthetic corpora at each --docs size: document lengths ~ Poisson(--avg-len), terms drawn from a
+Zipf-like distribution over --vocab terms (as real text is), and queries of 2-8 terms from the
+same distribution. Per size it reports:
+  - build time (BM25Okapi(corpus) vs SparseBM25 from the same counts) and sparse matrix size
+  - single-query top-k latency p50/p95: BM25Okapi.get_scores + the old sorted() top-n, vs top_k()
+  - batched throughput: top_k_batch() over --batch queries at a time (queries/s)
+  - parity: max |score difference| and top-k agreement against BM25Okapi
+BM25Okapi keeps a Python dict per document, so it only runs up to --okapi-max-docs; larger sizes
+report the sparse engine alone. Run from the repo root:
+  python MiscelleniousFiles/bench_bm25_sparse.py --docs 10000 100000 1000000
+  python MiscelleniousFiles/bench_bm25_sparse.py --docs 10000 --okapi-queries 200 --json bm25.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from scipy import sparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "apollo_ai_agent"))
+
+from sparse_bm25 import SparseBM25  # noqa: E402
+
+
+def _pct(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def make_corpus(n_docs, vocab_size, avg_len, seed):
+    """(n_docs, vocab) count matrix plus the term names."""
+    rng = np.random.default_rng(seed)
+    probs = 1.0 / np.arange(1, vocab_size + 1) ** 1.07
+    probs /= probs.sum()
+    lengths = rng.poisson(avg_len, n_docs)
+    terms = rng.choice(vocab_size, size=int(lengths.sum()), p=probs)
+    rows = np.repeat(np.arange(n_docs), lengths)
+    counts = sparse.csr_matrix((np.ones(len(terms)), (rows, terms)), shape=(n_docs, vocab_size))
+    counts.sum_duplicates()
+    return counts, [f"t{i}" for i in range(vocab_size)], probs
+
+
+def make_queries(n, names, probs, seed):
+    rng = np.random.default_rng(seed)
+    # Skip the ~50 most frequent terms, as stopword removal does in preprocess_text
+    tail = probs[50:] / probs[50:].sum()
+    return [[names[50 + t] for t in rng.choice(len(tail), size=rng.integers(2, 9), p=tail)] for _ in range(n)]
+
+
+def okapi_corpus(counts, names):
+    """Token lists for BM25Okapi (term order inside a document does not matter to BM25)."""
+    corpus = []
+    for d in range(counts.shape[0]):
+        start, end = counts.indptr[d], counts.indptr[d + 1]
+        doc = []
+        for t, c in zip(counts.indices[start:end], counts.data[start:end]):
+            doc.extend([names[t]] * int(c))
+        corpus.append(doc)
+    return corpus
+
+
+def okapi_top_k(bm25, query, k):
+    scores = bm25.get_scores(query)
+    top = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+    return top, scores
+
+
+def run_size(n_docs, args):
+    counts, names, probs = make_corpus(n_docs, args.vocab, args.avg_len, args.seed)
+    queries = make_queries(args.queries, names, probs, args.seed + 1)
+    vocab = {name: i for i, name in enumerate(names)}
+    out = {"docs": n_docs, "nnz": int(counts.nnz)}
+
+    start = time.perf_counter()
+    engine = SparseBM25.from_counts(counts, vocab, dtype=np.float32)
+    out["sparse_build_s"] = round(time.perf_counter() - start, 2)
+    m = engine.term_doc
+    out["sparse_matrix_mb"] = round((m.data.nbytes + m.indices.nbytes + m.indptr.nbytes) / 1e6, 1)
+
+    latencies = []
+    for q in queries:
+        t = time.perf_counter()
+        engine.top_k(q, args.k)
+        latencies.append(time.perf_counter() - t)
+    out["sparse_p50_ms"] = round(_pct(latencies, 50) * 1000, 3)
+    out["sparse_p95_ms"] = round(_pct(latencies, 95) * 1000, 3)
+
+    t = time.perf_counter()
+    for i in range(0, len(queries), args.batch):
+        engine.top_k_batch(queries[i:i + args.batch], args.k)
+    out["sparse_batched_qps"] = round(len(queries) / (time.perf_counter() - t), 1)
+    out["sparse_single_qps"] = round(len(queries) / sum(latencies), 1)
+
+    if n_docs <= args.okapi_max_docs:
+        from rank_bm25 import BM25Okapi
+
+        corpus = okapi_corpus(counts, names)
+        start = time.perf_counter()
+        okapi = BM25Okapi(corpus)
+        out["okapi_build_s"] = round(time.perf_counter() - start, 2)
+        del corpus
+
+        sample = queries[:args.okapi_queries]
+        latencies, max_diff, agree = [], 0.0, 0
+        exact = SparseBM25.from_okapi(okapi, dtype=np.float64)
+        converted = SparseBM25.from_okapi(okapi, dtype=np.float32)
+        for q in sample:
+            t = time.perf_counter()
+            top, scores = okapi_top_k(okapi, q, args.k)
+            latencies.append(time.perf_counter() - t)
+            max_diff = max(max_diff, float(np.abs(exact.get_scores(q) - scores).max()))
+            agree += list(converted.top_k(q, args.k)[0]) == top
+        out["okapi_p50_ms"] = round(_pct(latencies, 50) * 1000, 2)
+        out["okapi_p95_ms"] = round(_pct(latencies, 95) * 1000, 2)
+        out["speedup_p50"] = round(out["okapi_p50_ms"] / out["sparse_p50_ms"], 1) if out["sparse_p50_ms"] else None
+        out["max_score_diff_float64"] = max_diff
+        out["topk_identical_float32"] = round(agree / len(sample), 4)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare rank_bm25 and the sparse BM25 engine")
+    parser.add_argument("--docs", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--avg-len", type=float, default=40.0, help="mean tokens per document")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--okapi-queries", type=int, default=50, help="queries timed against BM25Okapi")
+    parser.add_argument("--okapi-max-docs", type=int, default=100000, help="skip BM25Okapi above this size")
+    parser.add_argument("--batch", type=int, default=32, help="queries per top_k_batch call")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for n_docs in args.docs:
+        r = run_size(n_docs, args)
+        line = (f"docs={n_docs:>8d} | build {r['sparse_build_s']:6.2f}s {r['sparse_matrix_mb']:7.1f}MB | "
+                f"sparse p50={r['sparse_p50_ms']:8.3f}ms p95={r['sparse_p95_ms']:8.3f}ms "
+                f"{r['sparse_single_qps']:8.1f} q/s, batched {r['sparse_batched_qps']:8.1f} q/s")
+        if "okapi_p50_ms" in r:
+            line += (f" | okapi build {r['okapi_build_s']:6.2f}s p50={r['okapi_p50_ms']:8.2f}ms "
+                     f"p95={r['okapi_p95_ms']:8.2f}ms | x{r['speedup_p50']} | "
+                     f"max diff {r['max_score_diff_float64']:.1e}, top-{args.k} identical {r['topk_identical_float32']:.0%}")
+        print(line)
+        results.append(r)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"vocab": args.vocab, "avg_len": args.avg_len, "k": args.k, "batch": args.batch,
+                       "results": results}, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
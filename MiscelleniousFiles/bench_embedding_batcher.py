@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark: query embedding with and without cross-request micro-batching (apollo_ai_agent/embedding_service.py).
+
+N client threads each embed unique queries back to back, the way concurrent websocket turns do
+through asyncio.to_thread. They run in two modes:
+  - direct  : every request is its own batch-of-one forward pass
+  - batched : requests go through EmbeddingBatcher (max wait / max batch as given)
+Reported per mode: throughput (queries/s), per-request latency p50/p95, and the average batch size.
+The embedding cache is bypassed, so every query is a real encode.
+
+By default it uses the real model (langchain_huggingface + sentence-transformers). --fake swaps in
+a cost model instead: fixed + per-item milliseconds per forward pass, serialized under one lock
+like a CPU-bound model that already uses every core. That isolates the batching logic.
+Run from the repo root:
+  python MiscelleniousFiles/bench_embedding_batcher.py --clients 1 8 32 --queries 20
+  python MiscelleniousFiles/bench_embedding_batcher.py --fake --fixed-ms 25 --per-item-ms 2 --clients 1 8 32
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "apollo_ai_agent"))
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")  # keep the benchmark off the on-disk cache
+
+from embedding_service import DEFAULT_MODEL, EmbeddingBatcher  # noqa: E402
+
+TEMPLATES = [
+    "Which Apollo tyre fits a {car} for {use}?",
+    "Price of {size} tyres for {car}",
+    "Is the {tyre} good for {use} on a {car}?",
+    "Warranty and tread life of {tyre} {size}",
+]
+CARS = ["Hyundai Creta", "Maruti Swift", "Mahindra Thar", "Toyota Innova", "Tata Nexon", "Honda City", "Kia Seltos"]
+USES = ["city driving", "highway trips", "off-road use", "monsoon roads", "long drives"]
+SIZES = ["185/65 R15", "205/55 R16", "215/60 R17", "235/70 R16", "165/80 R14"]
+TYRES = ["Alnac 4G", "Amazer 4G Life", "Apterra AT2", "Aspire 4G", "Apterra HT2"]
+
+
+def make_queries(n, offset=0):
+    out = []
+    for i in range(offset, offset + n):
+        t = TEMPLATES[i % len(TEMPLATES)]
+        out.append(t.format(car=CARS[i % len(CARS)], use=USES[(i // 3) % len(USES)],
+                            size=SIZES[(i // 5) % len(SIZES)], tyre=TYRES[(i // 7) % len(TYRES)]) + f" #{i}")
+    return out
+
+
+class FakeModel:
+    """fixed_ms + per_item_ms per call, one call at a time (the model already saturates the CPU)."""
+
+    def __init__(self, fixed_ms, per_item_ms, dim=768):
+        self.fixed = fixed_ms / 1000.0
+        self.per_item = per_item_ms / 1000.0
+        self.dim = dim
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            time.sleep(self.fixed + self.per_item * len(texts))
+        return [[float(len(t))] * self.dim for t in texts]
+
+
+def _pct(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def run(encode_one, clients, per_client):
+    latencies, lock = [], threading.Lock()
+
+    def client(c):
+        mine = []
+        for q in make_queries(per_client, offset=c * per_client):
+            start = time.perf_counter()
+            encode_one(q)
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput_qps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_pct(latencies, 50) * 1000, 1),
+        "p95_ms": round(_pct(latencies, 95) * 1000, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare direct vs micro-batched query embedding")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--queries", type=int, default=20, help="queries per client")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--fake", action="store_true", help="use the cost model instead of the real encoder")
+    parser.add_argument("--fixed-ms", type=float, default=25.0, help="fake: cost per forward pass")
+    parser.add_argument("--per-item-ms", type=float, default=2.0, help="fake: extra cost per text in a batch")
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    if args.fake:
+        model = FakeModel(args.fixed_ms, args.per_item_ms)
+    else:
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        model = HuggingFaceEmbeddings(model_name=args.model)
+        model.embed_documents(["warm up"])
+
+    results = []
+    for clients in args.clients:
+        direct = run(lambda q: model.embed_documents([q])[0], clients, args.queries)
+        batcher = EmbeddingBatcher(model.embed_documents, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000.0)
+        batched = run(lambda q: batcher.embed([q])[0], clients, args.queries)
+        batched["avg_batch_size"] = batcher.stats()["avg_batch_size"]
+        batcher.close()
+        speedup = batched["throughput_qps"] / direct["throughput_qps"] if direct["throughput_qps"] else 0.0
+        print(
+            f"clients={clients:4d} | direct  {direct['throughput_qps']:8.1f} q/s p50={direct['p50_ms']:7.1f}ms "
+            f"p95={direct['p95_ms']:7.1f}ms | batched {batched['throughput_qps']:8.1f} q/s "
+            f"p50={batched['p50_ms']:7.1f}ms p95={batched['p95_ms']:7.1f}ms "
+            f"avg batch={batched['avg_batch_size']} | x{speedup:.1f}"
+        )
+        results.append({"clients": clients, "direct": direct, "batched": batched, "speedup": round(speedup, 2)})
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"fake": args.fake, "max_batch": args.max_batch, "max_wait_ms": args.max_wait_ms,
+                       "results": results}, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Benchmark: PyTorch fp32 all-mpnet-base-v2 vs the ONNX Runtime backend (apollo_ai_agent/embedding_backends.py).
+
+Each backend runs in its own child process so its memory is measured in isolation. A child:
+  - loads the model (load time, RSS after load)
+  - embeds every query one at a time (single-query latency p50/p95)
+  - embeds the catalog in batches (docs/s)
+  - reports peak RSS, and saves its query and document vectors for the comparison
+The parent then compares each candidate with the reference (PyTorch fp32 unless --reference onnx-fp32):
+  - cosine between the two models' vectors for the same text (mean / p5 / min), documents and queries
+  - recall@k of the catalog search against the reference ranking, two ways:
+      "reindexed": candidate queries against candidate document vectors (store rebuilt with the backend)
+      "mixed":     candidate queries against reference document vectors (store left as it is)
+
+Catalog: documents.json of an exported vector index (python vector_index.py export), or a CSV column.
+Export the ONNX models first (python embedding_backends.py export [--no-quantize]). Run from apollo_ai_agent/:
+  python ../MiscelleniousFiles/bench_onnx_embeddings.py --index ./tyres_vector_index
+  python ../MiscelleniousFiles/bench_onnx_embeddings.py --csv ./data/apolloTyres_combined_cleaned.csv \\
+      --backends torch onnx onnx-fp32 --threads 4
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "apollo_ai_agent")
+sys.path.insert(0, APP_DIR)
+
+QUERIES = [
+    "What sizes are available for Apollo Alnac 4G?",
+    "Best Apollo tyre for a Hyundai Creta",
+    "Apollo Amazer 4G Life 185/65 R15 price",
+    "Which tyre suits a Mahindra Thar for off-road use?",
+    "Apterra AT2 load index",
+    "Tubeless tyres for Maruti Swift",
+    "Apollo Aspire 4G for sports sedans",
+    "Warranty on Apollo car tyres",
+    "Alnac 4GS 205/55 R16",
+    "Quiet comfortable tyre for highway driving",
+    "Apollo tyres for Toyota Innova Crysta",
+    "Tyre with good wet grip for monsoon",
+    "Apollo Apterra HT2 sizes",
+    "Tyre pressure for Honda City",
+    "Budget tyre for Tata Nexon",
+    "Apollo Amazer XL for taxis",
+]
+
+
+def _pct(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def load_catalog(args):
+    if args.index:
+        with open(os.path.join(args.index, "documents.json"), encoding="utf-8") as f:
+            texts = [d["content"] for d in json.load(f)]
+    else:
+        import pandas as pd
+
+        texts = pd.read_csv(args.csv)[args.column].dropna().astype(str).tolist()
+    return texts[:args.limit] if args.limit else texts
+
+
+# ---- child: one backend ----
+
+def run_child(args):
+    from embedding_backends import OnnxEmbeddings, make_embedding_model, onnx_model_dir
+
+    with open(args.texts) as f:
+        payload = json.load(f)
+    rss_start = _rss_mb()
+    start = time.perf_counter()
+    if args.child == "torch":
+        model = make_embedding_model(args.model, "torch")
+    else:
+        model = OnnxEmbeddings(onnx_model_dir(args.model, quantize=args.child == "onnx"), threads=args.threads)
+    load_s = time.perf_counter() - start
+    rss_loaded = _rss_mb()
+    model.embed_query("warm up")
+
+    latencies, queries = [], []
+    for q in payload["queries"]:
+        t = time.perf_counter()
+        queries.append(model.embed_query(q))
+        latencies.append(time.perf_counter() - t)
+    t = time.perf_counter()
+    docs = model.embed_documents(payload["docs"])
+    docs_s = time.perf_counter() - t
+
+    np.savez(args.out, queries=np.asarray(queries, dtype=np.float32), docs=np.asarray(docs, dtype=np.float32))
+    print(json.dumps({
+        "backend": args.child,
+        "load_s": round(load_s, 2),
+        "rss_model_mb": round(rss_loaded - rss_start, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+        "query_p50_ms": round(_pct(latencies, 50) * 1000, 2),
+        "query_p95_ms": round(_pct(latencies, 95) * 1000, 2),
+        "query_mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "docs_per_s": round(len(payload["docs"]) / docs_s, 1) if docs_s else None,
+    }))
+
+
+# ---- parent: compare ----
+
+def _topk(q, d, k):
+    return np.argsort(-(q @ d.T), axis=1)[:, :k]
+
+
+def _recall(pred, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(p) & set(t)) / k for p, t in zip(pred, truth)]))
+
+
+def _cosines(a, b):
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def compare(reference, candidate, k):
+    doc_cos = _cosines(reference["docs"], candidate["docs"])
+    query_cos = _cosines(reference["queries"], candidate["queries"])
+    truth = _topk(reference["queries"], reference["docs"], k)
+    return {
+        "doc_cosine_mean": round(float(doc_cos.mean()), 5),
+        "doc_cosine_p5": round(float(np.percentile(doc_cos, 5)), 5),
+        "doc_cosine_min": round(float(doc_cos.min()), 5),
+        "query_cosine_mean": round(float(query_cos.mean()), 5),
+        f"recall_at_{k}_reindexed": round(_recall(_topk(candidate["queries"], candidate["docs"], k), truth), 4),
+        f"recall_at_{k}_mixed": round(_recall(_topk(candidate["queries"], reference["docs"], k), truth), 4),
+        "top1_agreement_reindexed": round(float(np.mean(
+            _topk(candidate["queries"], candidate["docs"], 1)[:, 0] == truth[:, 0])), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PyTorch fp32 and ONNX Runtime embedding backends")
+    parser.add_argument("--index", default=None, help="exported vector index directory (documents.json)")
+    parser.add_argument("--csv", default=None, help="catalog CSV instead of --index")
+    parser.add_argument("--column", default="tyre_detailed_summary")
+    parser.add_argument("--limit", type=int, default=None, help="embed only the first N catalog texts")
+    parser.add_argument("--queries", default=None, help="file with one query per line")
+    parser.add_argument("--model", default="sentence-transformers/all-mpnet-base-v2")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"], choices=["torch", "onnx", "onnx-fp32"],
+                        help="torch = PyTorch fp32; onnx = the int8 export; onnx-fp32 = the unquantized export")
+    parser.add_argument("--reference", default="torch", choices=["torch", "onnx-fp32"],
+                        help="backend the others are compared with")
+    parser.add_argument("--threads", type=int, default=None, help="ONNX Runtime intra-op threads")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to this file")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--texts", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--out", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args)
+    if not args.index and not args.csv:
+        parser.error("give --index or --csv")
+
+    queries = QUERIES
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    docs = load_catalog(args)
+    print(f"{len(docs)} catalog texts, {len(queries)} queries, k={args.k}")
+
+    backends = [args.reference] + [b for b in args.backends if b != args.reference]
+    results, vectors = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        texts_path = os.path.join(tmp, "texts.json")
+        with open(texts_path, "w") as f:
+            json.dump({"queries": queries, "docs": docs}, f)
+        for backend in backends:
+            out = os.path.join(tmp, f"{backend}.npz")
+            cmd = [sys.executable, os.path.abspath(__file__), "--child", backend, "--texts", texts_path,
+                   "--out", out, "--model", args.model]
+            if args.threads:
+                cmd += ["--threads", str(args.threads)]
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"{backend}: failed\n{proc.stderr[-2000:]}")
+                continue
+            results[backend] = json.loads(proc.stdout.strip().splitlines()[-1])
+            with np.load(out) as data:
+                vectors[backend] = {"queries": data["queries"], "docs": data["docs"]}
+            r = results[backend]
+            print(f"{backend:10s} | load {r['load_s']:6.2f}s | model RSS {r['rss_model_mb']:7.1f}MB peak {r['peak_rss_mb']:7.1f}MB | "
+                  f"query p50={r['query_p50_ms']:7.2f}ms p95={r['query_p95_ms']:7.2f}ms | {r['docs_per_s']:8.1f} docs/s")
+
+    if args.reference in vectors:
+        for backend in backends[1:]:
+            if backend in vectors:
+                results[backend]["vs_reference"] = compare(vectors[args.reference], vectors[backend], args.k)
+                print(f"{backend:10s} vs {args.reference}: {results[backend]['vs_reference']}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"docs": len(docs), "queries": len(queries), "k": args.k, "reference": args.reference,
+                       "results": results}, f, indent=2)
+        print(f"Results written to {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
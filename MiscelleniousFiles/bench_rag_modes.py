@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Benchmark: two-call condense-question RAG vs single-call mode (local query building) in app/rag_engine.
+
+Replays scripted multi-turn conversations against the real Chroma index and Gemini, once per mode.
+For every turn it records:
+  - end-to-end latency (retrieval + answer; condense mode also pays the question rewrite)
+  - retrieval hit: some retrieved document contains every expected term for that turn
+Turn 1 of each conversation has no history, so both modes behave the same there. Follow-up turns
+show the difference.
+
+Requires GEMINI_API_KEY and a built index (python -m app.vector_store build). Run from the repo root:
+  python MiscelleniousFiles/bench_rag_modes.py
+  python MiscelleniousFiles/bench_rag_modes.py --retrieval-only --json bench_rag_modes.json
+"""
+
+import os
+os.environ["PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION"] = "python"
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+
+from app import llm_setup
+from app.query_builder import build_retrieval_query
+from app.rag_engine import RAGEngine
+
+# (question, terms every hit document must contain), one list per conversation
+CONVERSATIONS = [
+    [
+        ("Tell me about the Apollo Amazer 4G Life", ["amazer"]),
+        ("What sizes does it come in?", ["amazer"]),
+        ("Is 185/65 R15 available?", ["amazer", "185/65"]),
+        ("And the price?", ["amazer"]),
+    ],
+    [
+        ("Which Apollo tyre suits a Mahindra Thar for off-road use?", ["apterra"]),
+        ("What about the Apterra AT2 specifically?", ["apterra"]),
+        ("What is its load index?", ["apterra"]),
+    ],
+    [
+        ("Show me Apollo Alnac 4GS tyres", ["alnac"]),
+        ("Which of them fit a Hyundai Creta?", ["alnac"]),
+        ("Tubeless?", ["alnac"]),
+    ],
+    [
+        ("I drive a Maruti Swift mostly in the city", []),
+        ("Which Amazer tyre would you suggest?", ["amazer"]),
+        ("How long is the warranty on that?", ["amazer"]),
+    ],
+]
+
+
+def _pct(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _hit(docs, terms) -> bool:
+    if not terms:
+        return True
+    return any(all(t.lower() in doc.page_content.lower() for t in terms) for doc in docs)
+
+
+async def _condense_turn(engine, chain, question, history, location, retrieval_only):
+    if retrieval_only:
+        # Same two steps as the chain without the answer call: LLM rewrite (if history) + retrieval
+        query = question
+        if history:
+            query = await chain.question_generator.arun(
+                question=question, chat_history=(chain.get_chat_history or _get_chat_history)(history)
+            )
+        return await engine.retriever.ainvoke(query), None
+    result = await chain.ainvoke({"question": question, "chat_history": history, "user_location": location})
+    return result["source_documents"], result["answer"]
+
+
+async def _single_turn(engine, question, history, location, retrieval_only):
+    docs = await engine.retriever.ainvoke(build_retrieval_query(question, history)[0])
+    if retrieval_only:
+        return docs, None
+    inputs = engine.single_call_inputs(docs, question, history, location)
+    answer = await engine.answer_chain.ainvoke(inputs)
+    return docs, getattr(answer, "content", answer)
+
+
+async def run_mode(engine, mode, retrieval_only, location):
+    chain = ConversationalRetrievalChain.from_llm(
+        llm=engine.answer_llm,
+        condense_question_llm=engine.llm,
+        retriever=engine.retriever,
+        combine_docs_chain_kwargs={"prompt": llm_setup.SYSTEM_PROMPT},
+        return_source_documents=True,
+    )
+    latencies, follow_up_latencies, hits, follow_up_hits = [], [], [], []
+    for conversation in CONVERSATIONS:
+        history = []
+        for turn_no, (question, terms) in enumerate(conversation):
+            start = time.perf_counter()
+            if mode == "condense":
+                docs, answer = await _condense_turn(engine, chain, question, history, location, retrieval_only)
+            else:
+                docs, answer = await _single_turn(engine, question, history, location, retrieval_only)
+            elapsed = time.perf_counter() - start
+            hit = _hit(docs, terms)
+            latencies.append(elapsed)
+            hits.append(hit)
+            if turn_no:
+                follow_up_latencies.append(elapsed)
+                follow_up_hits.append(hit)
+            history.append((question, answer or ""))
+    return {
+        "mode": mode,
+        "turns": len(latencies),
+        "latency_p50_ms": round(_pct(latencies, 50) * 1000, 1),
+        "latency_p95_ms": round(_pct(latencies, 95) * 1000, 1),
+        "latency_mean_ms": round(statistics.mean(latencies) * 1000, 1),
+        "follow_up_latency_mean_ms": round(statistics.mean(follow_up_latencies) * 1000, 1),
+        "hit_rate": round(sum(hits) / len(hits), 3),
+        "follow_up_hit_rate": round(sum(follow_up_hits) / len(follow_up_hits), 3),
+    }
+
+
+async def main_async(args):
+    engine = RAGEngine(k=args.k)
+    await asyncio.to_thread(engine.initialize)
+    results = []
+    for _ in range(args.repeat):
+        for mode in args.modes:
+            res = await run_mode(engine, mode, args.retrieval_only, args.location)
+            results.append(res)
+            print(
+                f"{mode:9s} | latency p50={res['latency_p50_ms']:8.1f}ms p95={res['latency_p95_ms']:8.1f}ms "
+                f"follow-up mean={res['follow_up_latency_mean_ms']:8.1f}ms | hit rate={res['hit_rate']:.2f} "
+                f"(follow-ups {res['follow_up_hit_rate']:.2f})"
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare condense-question vs single-call RAG")
+    parser.add_argument("--modes", nargs="+", default=["condense", "single"], choices=["condense", "single"])
+    parser.add_argument("--k", type=int, default=5, help="documents retrieved per turn")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per mode (alternating)")
+    parser.add_argument("--location", default="Delhi, North India")
+    parser.add_argument("--retrieval-only", action="store_true", help="skip the answer generation call")
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"k": args.k, "retrieval_only": args.retrieval_only, "results": results}, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark: legacy blocking token loop vs astream-based streaming in chat_handler._stream_chain.
+
+Runs fully offline. A fake chain emits tokens with a fixed per-token generation delay:
+  - "legacy"  : sync chain.stream() (blocking delay) + asyncio.sleep(0.05) after every chunk
+  - "astream" : async chain.astream() (non-blocking delay), no artificial sleep
+
+For each concurrency level, N fake WebSocket clients run one turn at the same time and we
+report time-to-first-chunk (TTFC) and total latency percentiles.
+
+Usage:
+  python MiscelleniousFiles/bench_stream_chain.py --clients 50 200 500 --tokens 20 --token-delay 0.005
+  python MiscelleniousFiles/bench_stream_chain.py --json bench_stream.json
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+
+class FakeChain:
+    """Emits `tokens` string pieces, `token_delay` seconds apart."""
+
+    def __init__(self, tokens: int, token_delay: float):
+        self.tokens = tokens
+        self.token_delay = token_delay
+
+    def stream(self, inputs):
+        for i in range(self.tokens):
+            time.sleep(self.token_delay)  # blocking network read, as with the sync client
+            yield f"tok{i} "
+
+    async def astream(self, inputs):
+        for i in range(self.tokens):
+            await asyncio.sleep(self.token_delay)
+            yield f"tok{i} "
+
+
+class FakeWebSocket:
+    """Records the arrival time of the first and last frame."""
+
+    def __init__(self):
+        self.first_chunk_at = None
+        self.last_frame_at = None
+
+    async def send_text(self, text: str):
+        now = time.perf_counter()
+        if self.first_chunk_at is None and '"chunk"' in text:
+            self.first_chunk_at = now
+        self.last_frame_at = now
+
+
+async def legacy_stream(ws: FakeWebSocket, chain: FakeChain):
+    full = ""
+    for piece in chain.stream({}):
+        full += piece
+        await asyncio.create_task(ws.send_text(json.dumps({"chunk": piece})))
+        await asyncio.sleep(0.05)
+    await asyncio.create_task(ws.send_text(json.dumps({"end": True, "full_response": full})))
+
+
+async def astream_stream(ws: FakeWebSocket, chain: FakeChain):
+    full = ""
+    async for piece in chain.astream({}):
+        full += piece
+        await ws.send_text(json.dumps({"chunk": piece}))
+    await ws.send_text(json.dumps({"end": True, "full_response": full}))
+
+
+def _pct(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def run_level(mode: str, clients: int, tokens: int, token_delay: float):
+    chain = FakeChain(tokens, token_delay)
+    runner = legacy_stream if mode == "legacy" else astream_stream
+    sockets = [FakeWebSocket() for _ in range(clients)]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(runner(ws, chain) for ws in sockets))
+    wall = time.perf_counter() - start
+
+    ttfc = [ws.first_chunk_at - start for ws in sockets if ws.first_chunk_at]
+    total = [ws.last_frame_at - start for ws in sockets if ws.last_frame_at]
+    return {
+        "mode": mode,
+        "clients": clients,
+        "ttfc_p50_ms": round(_pct(ttfc, 50) * 1000, 2),
+        "ttfc_p95_ms": round(_pct(ttfc, 95) * 1000, 2),
+        "total_p50_ms": round(_pct(total, 50) * 1000, 2),
+        "total_p95_ms": round(_pct(total, 95) * 1000, 2),
+        "total_mean_ms": round(statistics.mean(total) * 1000, 2) if total else 0.0,
+        "wall_s": round(wall, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark legacy vs astream token streaming")
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--tokens", type=int, default=20, help="chunks per response")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="seconds per chunk")
+    parser.add_argument("--modes", nargs="+", default=["legacy", "astream"], choices=["legacy", "astream"])
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for clients in args.clients:
+        for mode in args.modes:
+            res = asyncio.run(run_level(mode, clients, args.tokens, args.token_delay))
+            results.append(res)
+            print(
+                f"{mode:8s} clients={clients:4d} | TTFC p50={res['ttfc_p50_ms']:9.1f}ms "
+                f"p95={res['ttfc_p95_ms']:9.1f}ms | total p50={res['total_p50_ms']:9.1f}ms "
+                f"p95={res['total_p95_ms']:9.1f}ms | wall={res['wall_s']:.2f}s"
+            )
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"tokens": args.tokens, "token_delay": args.token_delay, "results": results}, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
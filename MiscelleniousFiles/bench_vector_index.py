@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Chroma (retrieve_vdb_apollo) vs the in-memory exact index (apollo_ai_agent/vector_index.py).
+
+Real mode compares the two stores over the same catalog. It needs ./chroma_tyres_db and an export
+of it (python vector_index.py export). Queries are embedded once, and then it measures:
+  - search latency per query (vector in, top-k out), which leaves the shared embedding cost out
+  - end-to-end latency (embed + search)
+  - batched throughput of the index (all queries in one matrix product)
+  - parity: top-k overlap, same top-1, and max |Chroma distance - (2 - 2 * cosine)|
+Synthetic mode needs no model or Chroma. It checks float32/float16 indices on random clustered
+vectors against a float64 brute force, at catalog sizes and above. float16 is measured both upcast
+on load (the default) and kept resident as float16.
+
+Run from apollo_ai_agent/ (the stores use relative paths):
+  python ../MiscelleniousFiles/bench_vector_index.py --chroma ./chroma_tyres_db --index ./tyres_vector_index
+  python ../MiscelleniousFiles/bench_vector_index.py --synthetic 5000 50000 --dim 768
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "apollo_ai_agent"))
+
+from vector_index import VectorIndex, normalize_rows  # noqa: E402
+
+QUERIES = [
+    "What sizes are available for Apollo Alnac 4G?",
+    "Best Apollo tyre for a Hyundai Creta",
+    "Apollo Amazer 4G Life 185/65 R15 price",
+    "Which tyre suits a Mahindra Thar for off-road use?",
+    "Apterra AT2 load index",
+    "Tubeless tyres for Maruti Swift",
+    "Apollo Aspire 4G for sports sedans",
+    "Warranty on Apollo car tyres",
+    "Alnac 4GS 205/55 R16",
+    "Quiet comfortable tyre for highway driving",
+    "Apollo tyres for Toyota Innova Crysta",
+    "Tyre with good wet grip for monsoon",
+    "Apollo Apterra HT2 sizes",
+    "Tyre pressure for Honda City",
+    "Budget tyre for Tata Nexon",
+    "Apollo Amazer XL for taxis",
+]
+
+
+def _pct(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _latency(name, seconds, extra=""):
+    ms = [s * 1000 for s in seconds]
+    print(f"{name:28s} | p50={_pct(ms, 50):8.3f}ms p95={_pct(ms, 95):8.3f}ms mean={statistics.mean(ms):8.3f}ms {extra}")
+    return {"p50_ms": round(_pct(ms, 50), 4), "p95_ms": round(_pct(ms, 95), 4), "mean_ms": round(statistics.mean(ms), 4)}
+
+
+def _timed(fn, repeat):
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def run_real(args):
+    from langchain_chroma import Chroma
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    queries = QUERIES
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    embeddings = HuggingFaceEmbeddings(model_name=args.model)
+    chroma = Chroma(persist_directory=args.chroma, embedding_function=embeddings)
+    index = VectorIndex.load(args.index)
+    print(f"Chroma: {args.chroma} | index: {args.index} ({len(index)} x {index.dim} {index.matrix.dtype}) | "
+          f"{len(queries)} queries, k={args.k}")
+
+    vectors = [embeddings.embed_query(q) for q in queries]
+    chroma_search, index_search = [], []
+    overlaps, top1_same, max_score_diff = [], 0, 0.0
+    for vec in vectors:
+        chroma_hits, t = _timed(lambda: chroma.similarity_search_by_vector_with_relevance_scores(vec, k=args.k), args.repeat)
+        chroma_search.extend(t)
+        (idx, sims), t = _timed(lambda: index.search(vec, args.k), args.repeat)
+        index_search.extend(t)
+
+        chroma_contents = [doc.page_content for doc, _ in chroma_hits]
+        index_contents = [index.documents[i]["content"] for i in idx[0]]
+        overlaps.append(len(set(chroma_contents) & set(index_contents)) / max(1, len(chroma_contents)))
+        top1_same += bool(chroma_contents) and chroma_contents[0] == index_contents[0]
+        by_content = dict(zip(index_contents, (2.0 - 2.0 * float(s) for s in sims[0])))
+        for doc, distance in chroma_hits:
+            if doc.page_content in by_content:
+                max_score_diff = max(max_score_diff, abs(distance - by_content[doc.page_content]))
+
+    results = {"queries": len(queries), "k": args.k, "rows": len(index), "dtype": str(index.matrix.dtype)}
+    results["chroma_search"] = _latency("chroma search (by vector)", chroma_search)
+    results["index_search"] = _latency("index search (by vector)", index_search)
+
+    _, chroma_e2e = _timed(lambda: [chroma.similarity_search_with_score(q, k=args.k) for q in queries], 1)
+    _, index_e2e = _timed(lambda: [index.search(embeddings.embed_query(q), args.k) for q in queries], 1)
+    results["chroma_end_to_end"] = _latency("chroma embed+search", [chroma_e2e[0] / len(queries)])
+    results["index_end_to_end"] = _latency("index embed+search", [index_e2e[0] / len(queries)])
+
+    batch = normalize_rows(vectors)
+    _, batch_times = _timed(lambda: index.search(batch, args.k), args.repeat)
+    results["index_batched_per_query"] = _latency(
+        f"index batched ({len(queries)}/call)", [t / len(queries) for t in batch_times], "per query"
+    )
+
+    results["parity"] = {
+        "mean_overlap_at_k": round(statistics.mean(overlaps), 4),
+        "top1_agreement": round(top1_same / len(queries), 4),
+        "max_score_diff": round(max_score_diff, 6),
+    }
+    print(f"parity: overlap@{args.k}={results['parity']['mean_overlap_at_k']:.3f} "
+          f"top1={results['parity']['top1_agreement']:.3f} max |score diff|={max_score_diff:.2e}")
+    return results
+
+
+def _clustered(n, dim, rng, centers=64):
+    # Catalog rows are many variants (sizes) of few products: points around a few centres
+    c = rng.standard_normal((centers, dim)).astype(np.float32)
+    return c[rng.integers(0, centers, n)] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def run_synthetic(args):
+    rng = np.random.default_rng(7)
+    out = []
+    for n in args.synthetic:
+        vectors = _clustered(n, args.dim, rng)
+        queries = _clustered(args.n_queries, args.dim, rng)
+        exact = normalize_rows(vectors).astype(np.float64) @ normalize_rows(queries).astype(np.float64).T
+        truth = np.argsort(-exact, axis=0)[:args.k].T
+        docs = [{"content": str(i), "metadata": {}} for i in range(n)]
+        # float16 on disk is upcast on load by default; "float16-resident" keeps it (load(upcast=False))
+        for dtype in ("float32", "float16", "float16-resident"):
+            index = VectorIndex.build(vectors, docs, dtype="float32" if dtype == "float32" else "float16")
+            if dtype == "float16":
+                index.matrix = index.matrix.astype(np.float32)
+            single = []
+            for q in queries:
+                _, t = _timed(lambda: index.search(q, args.k), args.repeat)
+                single.extend(t)
+            (idx, _), batch_times = _timed(lambda: index.search(queries, args.k), args.repeat)
+            recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(idx, truth)])
+            name = f"n={n} {dtype}"
+            res = {"rows": n, "dtype": dtype, "matrix_mb": round(index.matrix.nbytes / 1e6, 2),
+                   "recall_at_k": round(float(recall), 4)}
+            res["single"] = _latency(name, single, f"recall@{args.k}={recall:.4f} {res['matrix_mb']:.1f}MB")
+            res["batched_per_query"] = _latency(
+                f"{name} batched", [t / len(queries) for t in batch_times], f"({len(queries)}/call)"
+            )
+            out.append(res)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Chroma with the in-memory exact vector index")
+    parser.add_argument("--chroma", default="./chroma_tyres_db")
+    parser.add_argument("--index", default="./tyres_vector_index")
+    parser.add_argument("--model", default="sentence-transformers/all-mpnet-base-v2")
+    parser.add_argument("--queries", default=None, help="file with one query per line")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20, help="timed repetitions per query")
+    parser.add_argument("--synthetic", type=int, nargs="+", default=None, metavar="ROWS",
+                        help="random-vector mode at these catalog sizes (no Chroma or model needed)")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--n-queries", type=int, default=64)
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    results = run_synthetic(args) if args.synthetic else run_real(args)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
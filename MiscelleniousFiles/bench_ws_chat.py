@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Load test for the /ws/chat pipeline in apollo_ai_agent/main.py, fully offline.
+
+The script starts the real FastAPI app in a child process (uvicorn). Before the app is imported,
+the heavy modules are replaced with deterministic stand-ins:
+  - llm_handler             : fake chat model (first-token latency + tokens/sec)
+  - llm_query_normalization : fake normalizer (fixed latency, fixed category)
+  - retrieval_func          : fake vector retrieval (fixed latency); bm25_retrieval and
+                              retrieve_vdb_apollo become empty stand-ins
+  - db_functions            : in-memory DB (chat history batches, dealers; everything else no-ops)
+Everything else (fast router, caches, session store, history writer, routing, streaming) is the
+real code. No MySQL server, Gemini key or vector store is needed. The app's light dependencies
+(fastapi, uvicorn, websockets, mysql-connector, pyjwt, httpx, python-dotenv) must be installed.
+
+For each concurrency level, N WebSocket clients each send --messages questions back to back.
+The script reports:
+  - time-to-first-chunk (TTFC)
+  - the gap between chunks
+  - p50/p95/p99 end-to-end latency per message
+  - messages/sec
+Results are written as JSON so runs can be compared over time.
+
+Usage:
+  python MiscelleniousFiles/bench_ws_chat.py --clients 10 50 100 --messages 5
+  python MiscelleniousFiles/bench_ws_chat.py --llm-latency 0.4 --tokens-per-sec 40 --json bench_ws.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AGENT_DIR = os.path.join(REPO_ROOT, "apollo_ai_agent")
+
+
+# ---------------------------------------------------------------------------
+# Server side: fake modules + app boot (runs in the child process)
+# ---------------------------------------------------------------------------
+
+class FakeChain:
+    """Deterministic streaming model: waits `latency`, then emits `tokens` pieces at `tokens_per_sec`."""
+
+    def __init__(self, latency: float, tokens_per_sec: float, tokens: int):
+        self.latency = latency
+        self.token_gap = 1.0 / tokens_per_sec if tokens_per_sec > 0 else 0.0
+        self.tokens = tokens
+
+    async def astream(self, inputs):
+        await asyncio.sleep(self.latency)
+        for i in range(self.tokens):
+            if i:
+                await asyncio.sleep(self.token_gap)
+            yield f"tok{i} "
+
+    async def ainvoke(self, inputs):
+        return "".join([piece async for piece in self.astream(inputs)])
+
+
+def _install_fakes(args):
+    """Register stand-ins for the heavy modules in sys.modules before main.py imports them."""
+    llm_handler = types.ModuleType("llm_handler")
+    chain = FakeChain(args.llm_latency, args.tokens_per_sec, args.tokens)
+    llm_handler.get_chain = lambda llm_flag="gemini", query_category="", mobile=False: chain
+    llm_handler.create_chain = lambda llm_flag="gemini", query_category="", mobile=False: chain
+    llm_handler.warm_up_chains = lambda *a, **k: None
+
+    normalizer = types.ModuleType("llm_query_normalization")
+
+    def normalize_query_with_llm(user_input, context=None, llm_flag="gemini"):
+        time.sleep(args.norm_latency)  # runs in a worker thread, like the real sync invoke
+        return {
+            "category": args.category,
+            "normalized_input": user_input,
+            "sql_query": None,
+            "user_response": None,
+            "metadata": {},
+        }
+
+    normalizer.normalize_query_with_llm = normalize_query_with_llm
+
+    retrieval = types.ModuleType("retrieval_func")
+
+    def retrieve_and_rank(user_query, sql_query, category, **kwargs):
+        time.sleep(args.retrieval_latency)
+        return "Apollo Amazer 4G Life 185/65 R15: load index 88, speed rating H."
+
+    retrieval.retrieve_and_rank = retrieve_and_rank
+
+    # retrieval_func's lifecycle dependencies (the real ones unpickle BM25 and load the embedding model)
+    bm25 = types.ModuleType("bm25_retrieval")
+    vdb = types.ModuleType("retrieve_vdb_apollo")
+    vdb.embeddings = types.SimpleNamespace(embed_query=lambda text: [0.0])
+
+    db = types.ModuleType("db_functions")
+    db.history_rows = []
+
+    def save_chat_history_batch(rows):
+        db.history_rows.extend(rows)
+        return len(rows)
+
+    def get_db_connection():
+        raise RuntimeError("No database in the benchmark")
+
+    db.save_chat_history_batch = save_chat_history_batch
+    db.load_recent_chat_history_from_db = lambda user_id, limit=40: []
+    db.find_dealers = lambda loc: [{"name": "Bench Tyres", "address": "MG Road", "phone": "0000000000"}]
+    db.run_select = lambda sql: []
+    db.get_db_connection = get_db_connection
+
+    def _noop_helper(name):
+        # Any other helper the routers import becomes a no-op
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return lambda *a, **k: None
+
+    db.__getattr__ = _noop_helper
+
+    for module in (llm_handler, normalizer, retrieval, bm25, vdb, db):
+        sys.modules[module.__name__] = module
+
+
+def serve(args):
+    _install_fakes(args)
+    # main.py mounts build/static and writes logs/ relative to the working directory
+    workdir = tempfile.mkdtemp(prefix="bench_ws_")
+    os.makedirs(os.path.join(workdir, "build", "static"))
+    os.chdir(workdir)
+    sys.path.insert(0, AGENT_DIR)
+    # auth.py reads these at import; the benchmark never calls Google OAuth
+    os.environ.setdefault("GOOGLE_CLIENT_ID", "bench")
+    os.environ.setdefault("GOOGLE_CLIENT_SECRET", "bench")
+    # Exercise the (opt-in) vector-context stage so --retrieval-latency is part of the turn
+    os.environ.setdefault("APOLLO_VECTOR_CONTEXT", "true")
+
+    import logging
+    import uvicorn
+    import main as apollo_main
+
+    logging.disable(logging.INFO)  # the app logs every frame; keep the run I/O-light
+    uvicorn.run(apollo_main.app, host="127.0.0.1", port=args.port, log_level="warning", ws_max_size=1 << 20)
+
+
+# ---------------------------------------------------------------------------
+# Client side: drive N concurrent WebSocket clients
+# ---------------------------------------------------------------------------
+
+def _pct(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 60.0):
+    import websockets
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Benchmark server exited with code {proc.returncode}")
+        try:
+            async with websockets.connect(url, open_timeout=2):
+                return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Benchmark server not ready after {timeout}s")
+
+
+async def _client(url: str, client_id: int, messages: int, samples: list, errors: list):
+    import websockets
+
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            for m in range(messages):
+                question = f"What is the price and load index of Apollo Amazer 4G Life 185/65 R15 (bench {client_id}-{m})"
+                sent = time.perf_counter()
+                await ws.send(json.dumps({"user_id": f"bench{client_id}", "user_input": question}))
+                first = last = None
+                gaps = []
+                while True:
+                    frame = json.loads(await ws.recv())
+                    now = time.perf_counter()
+                    if "error" in frame:
+                        errors.append(frame["error"])
+                    if frame.get("chunk"):
+                        if first is None:
+                            first = now
+                        else:
+                            gaps.append(now - last)
+                        last = now
+                    if frame.get("end"):
+                        samples.append({"ttfc": (first or now) - sent, "e2e": now - sent, "gaps": gaps})
+                        break
+    except Exception as e:
+        errors.append(f"client {client_id}: {e!r}")
+
+
+async def run_level(url: str, clients: int, messages: int):
+    samples, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(url, c, messages, samples, errors) for c in range(clients)))
+    wall = time.perf_counter() - start
+
+    ttfc = [s["ttfc"] for s in samples]
+    e2e = [s["e2e"] for s in samples]
+    gaps = [g for s in samples for g in s["gaps"]]
+    return {
+        "clients": clients,
+        "messages": len(samples),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "ttfc_p50_ms": _ms(_pct(ttfc, 50)),
+        "ttfc_p95_ms": _ms(_pct(ttfc, 95)),
+        "ttfc_p99_ms": _ms(_pct(ttfc, 99)),
+        "gap_mean_ms": _ms(statistics.mean(gaps)) if gaps else 0.0,
+        "gap_p95_ms": _ms(_pct(gaps, 95)),
+        "gap_p99_ms": _ms(_pct(gaps, 99)),
+        "e2e_p50_ms": _ms(_pct(e2e, 50)),
+        "e2e_p95_ms": _ms(_pct(e2e, 95)),
+        "e2e_p99_ms": _ms(_pct(e2e, 99)),
+        "messages_per_sec": round(len(samples) / wall, 2) if wall else 0.0,
+        "wall_s": round(wall, 3),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def _server_args(args, port):
+    return [
+        sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+        "--llm-latency", str(args.llm_latency), "--tokens-per-sec", str(args.tokens_per_sec),
+        "--tokens", str(args.tokens), "--norm-latency", str(args.norm_latency),
+        "--retrieval-latency", str(args.retrieval_latency), "--category", args.category,
+    ]
+
+
+async def drive(args):
+    port = args.port or _free_port()
+    url = f"ws://127.0.0.1:{port}/ws/chat"
+    proc = subprocess.Popen(_server_args(args, port))
+    try:
+        await _wait_ready(url, proc)
+        results = []
+        for clients in args.clients:
+            res = await run_level(url, clients, args.messages)
+            results.append(res)
+            print(
+                f"clients={clients:4d} msgs={res['messages']:5d} err={res['errors']:3d} | "
+                f"TTFC p50={res['ttfc_p50_ms']:8.1f}ms p95={res['ttfc_p95_ms']:8.1f}ms | "
+                f"gap p95={res['gap_p95_ms']:7.1f}ms | e2e p50={res['e2e_p50_ms']:8.1f}ms "
+                f"p95={res['e2e_p95_ms']:8.1f}ms p99={res['e2e_p99_ms']:8.1f}ms | {res['messages_per_sec']:7.1f} msg/s"
+            )
+        return results
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for /ws/chat with a fake LLM and DB")
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--messages", type=int, default=5, help="questions per client per level")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--tokens", type=int, default=60, help="chunks per answer")
+    parser.add_argument("--norm-latency", type=float, default=0.2, help="fake normalizer seconds")
+    parser.add_argument("--retrieval-latency", type=float, default=0.05, help="fake retrieval seconds")
+    parser.add_argument("--category", default="product_info", help="category the fake normalizer returns")
+    parser.add_argument("--port", type=int, default=0, help="server port (default: a free one)")
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to this file")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    results = asyncio.run(drive(args))
+    if args.json_path:
+        config = {k: v for k, v in vars(args).items() if k not in ("serve", "json_path", "port")}
+        report = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "config": config,
+            "results": results,
+        }
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
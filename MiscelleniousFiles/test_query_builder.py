@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Test script for the local retrieval-query builder (RAG_MODE=single)
+Run from the repo root: python MiscelleniousFiles/test_query_builder.py (or with pytest)
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.query_builder import build_retrieval_query, extract_entities
+
+
+def test_size_is_not_a_model_qualifier():
+    """The width of a tyre size must not be read as a model qualifier"""
+    assert extract_entities("Alnac 4G 185/65 R15") == {"model": "Alnac 4G", "size": "185/65 R15"}
+
+
+def test_bare_city_is_not_a_vehicle():
+    """'in the city' is not the Honda City, so the carried size and vehicle survive"""
+    assert "vehicle" not in extract_entities("is it good in the city?")
+    assert extract_entities("tyres for my honda city")["vehicle"] == "Honda City"
+
+    query, carried = build_retrieval_query("is it good in the city?", [("Alnac 4G 185/65 R15 for my Swift", "x")])
+    print(f"Query: {query}")
+    print(f"Carried: {carried}")
+    assert carried == {"model": "Alnac 4G", "size": "185/65 R15", "vehicle": "Swift"}
+    assert "185/65 R15" in query and "Swift" in query
+
+
+def test_new_vehicle_drops_carried_size():
+    """Sizes are vehicle-specific: naming another vehicle stops the old size being carried"""
+    _, carried = build_retrieval_query("what fits a Creta?", [("Alnac 4G 185/65 R15 for my Swift", "x")])
+    assert carried == {"model": "Alnac 4G"}
+
+
+if __name__ == "__main__":
+    print("Testing query builder...")
+    print("=" * 50)
+    for test in (test_size_is_not_a_model_qualifier, test_bare_city_is_not_a_vehicle,
+                 test_new_vehicle_drops_carried_size):
+        test()
+        print(f"✅ {test.__name__}")
@@ -1,6 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from db_functions import get_db_connection  # Your function to get a MySQL connection
 import mysql.connector
+import query_fast_router
+from normalization_cache import normalization_cache
+from response_cache import response_cache
+import embedding_service
+from embedding_service import embedding_cache
 
 admin_router = APIRouter(prefix="/api/admin", tags=["Admin Dashboard"])
 
@@ -152,3 +157,50 @@ async def get_feedback(
         return {"success": True, "data": feedback}
     except mysql.connector.Error as err:
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
+
+@admin_router.get("/fast-path-stats")
+async def get_fast_path_stats():
+    """Bypass rate and estimated LLM latency saved by the rule-based normalizer fast path."""
+    return {"success": True, "data": query_fast_router.get_stats()}
+
+@admin_router.get("/normalization-cache/stats")
+async def get_normalization_cache_stats():
+    """Hit/miss counters and size of the normalization result cache."""
+    return {"success": True, "data": normalization_cache.stats()}
+
+@admin_router.post("/normalization-cache/flush")
+async def flush_normalization_cache():
+    """Drop every cached normalization result (e.g. after editing llm_query_prompts.py)."""
+    removed = normalization_cache.flush()
+    return {"success": True, "removed": removed}
+
+@admin_router.get("/response-cache/stats")
+async def get_response_cache_stats():
+    """Hit/miss counters and size of the full-answer cache."""
+    return {"success": True, "data": response_cache.stats()}
+
+@admin_router.post("/response-cache/flush")
+async def flush_response_cache():
+    """Drop every cached answer."""
+    removed = response_cache.flush()
+    return {"success": True, "removed": removed}
+
+@admin_router.get("/embedding-cache/stats")
+async def get_embedding_cache_stats():
+    """Memory/disk hit rates and sizes of the query-embedding cache, plus micro-batching counters."""
+    return {"success": True, "data": embedding_service.stats()}
+
+@admin_router.post("/embedding-cache/flush")
+async def flush_embedding_cache(disk: bool = Query(False, description="Also clear the on-disk store")):
+    """Drop the in-memory embedding cache (and the disk store with ?disk=true)."""
+    removed = embedding_cache.flush(disk=disk)
+    return {"success": True, "removed": removed}
+
+@admin_router.get("/session-stats")
+async def get_session_stats():
+    """Per-namespace session state counters (entries, evictions, bytes for the in-process backend)."""
+    from chat_handler import user_contexts, user_instructions, user_chat_history
+    return {
+        "success": True,
+        "data": [store.stats() for store in (user_chat_history, user_contexts, user_instructions)],
+    }
@@ -3,6 +3,7 @@ import pickle
 import glob
 import pandas as pd
 from rank_bm25 import BM25Okapi
+from sparse_bm25 import SparseBM25
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
@@ -162,5 +163,9 @@ try:
         pickle.dump(bm25, bm25_f)
         print(f"BM25 Index stored at {bm25_file}")
 
+    # Precomputed sparse copy loaded by bm25_retrieval (BM25_ENGINE=sparse)
+    SparseBM25.from_okapi(bm25).save(output_dir)
+    print(f"Sparse BM25 matrix stored in {output_dir}")
+
 except Exception as e:
     print(f"Error saving BM25 index or metadata: {e}")
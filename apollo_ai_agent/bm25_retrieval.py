@@ -2,11 +2,16 @@ import os
 import pickle
 import pandas as pd
 from rank_bm25 import BM25Okapi
+from sparse_bm25 import SparseBM25
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 #from query_normalizer import normalize_query
 
+# "sparse" (default) scores with the precomputed sparse matrix in sparse_bm25.py; "okapi" keeps
+# rank_bm25's BM25Okapi.get_scores. Both return the same results.
+BM25_ENGINE = os.getenv("BM25_ENGINE", "sparse").lower()
+
 # Initialize lemmatizer and stopwords
 lemmatizer = WordNetLemmatizer()
 stop_words = set(stopwords.words("english"))
@@ -80,15 +85,16 @@ def preprocess_text(text):
     return processed_tokens
 
 # Load Pre-created BM25 Index and Metadata
-def load_bm25_index(index_dir="./bm25_index"):
+def load_bm25_index(index_dir="./bm25_index", engine=None):
     """
     Load the BM25 index and metadata from pre-created files.
 
     Args:
         index_dir (str): Directory where BM25 index and metadata are stored.
+        engine (str): "sparse" or "okapi"; defaults to BM25_ENGINE.
 
     Returns:
-        tuple: Loaded BM25 index and metadata DataFrame.
+        tuple: Loaded BM25 index (SparseBM25 or BM25Okapi) and metadata DataFrame.
     """
     bm25_file = os.path.join(index_dir, "bm25.pkl")
     metadata_file = os.path.join(index_dir, "metadata.pkl")
@@ -96,11 +102,22 @@ def load_bm25_index(index_dir="./bm25_index"):
     if not os.path.exists(bm25_file) or not os.path.exists(metadata_file):
         raise FileNotFoundError(f"BM25 index or metadata not found in {index_dir}. Please ensure the index is created.")
 
+    with open(metadata_file, "rb") as meta_f:
+        metadata = pickle.load(meta_f)
+
+    engine = (engine or BM25_ENGINE).lower()
+    if engine == "sparse" and SparseBM25.saved(index_dir) and \
+            os.path.getmtime(os.path.join(index_dir, "bm25_sparse.npz")) >= os.path.getmtime(bm25_file):
+        return SparseBM25.load(index_dir), metadata
+
     with open(bm25_file, "rb") as bm25_f:
         bm25 = pickle.load(bm25_f)
 
-    with open(metadata_file, "rb") as meta_f:
-        metadata = pickle.load(meta_f)
+    if engine == "sparse":
+        # No (or a stale) sparse copy next to bm25.pkl: convert the pickled BM25Okapi in memory
+        bm25 = SparseBM25.from_okapi(bm25)
+    elif engine != "okapi":
+        raise ValueError(f"Unknown BM25_ENGINE '{engine}' (expected 'sparse' or 'okapi')")
 
     return bm25, metadata
 
@@ -111,7 +128,7 @@ def bm25_search(query, bm25, metadata, top_n=5):
 
     Args:
         query (str): User query.
-        bm25 (BM25Okapi): Pre-loaded BM25 index.
+        bm25 (SparseBM25 | BM25Okapi): Pre-loaded BM25 index.
         metadata (pd.DataFrame): Metadata DataFrame.
         top_n (int): Number of top results to retrieve.
 
@@ -120,12 +137,39 @@ def bm25_search(query, bm25, metadata, top_n=5):
     """
     query_tokens = preprocess_text(query)
     print("Query tokens:", query_tokens)
+    if isinstance(bm25, SparseBM25):
+        top_indices, top_scores = bm25.top_k(query_tokens, top_n)
+        results = metadata.iloc[top_indices].copy()
+        results["score"] = top_scores.astype(float)
+        return results
     scores = bm25.get_scores(query_tokens)
     top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_n]
     results = metadata.iloc[top_indices].copy()
     results["score"] = [scores[i] for i in top_indices]
     return results
 
+def bm25_search_batch(queries, bm25, metadata, top_n=5):
+    """
+    BM25 search for several queries at once (one sparse product with the sparse engine).
+
+    Args:
+        queries (list): User queries.
+        bm25 (SparseBM25 | BM25Okapi): Pre-loaded BM25 index.
+        metadata (pd.DataFrame): Metadata DataFrame.
+        top_n (int): Number of top results to retrieve per query.
+
+    Returns:
+        list: One results DataFrame per query, as bm25_search returns.
+    """
+    if not isinstance(bm25, SparseBM25):
+        return [bm25_search(query, bm25, metadata, top_n) for query in queries]
+    out = []
+    for top_indices, top_scores in bm25.top_k_batch([preprocess_text(q) for q in queries], top_n):
+        results = metadata.iloc[top_indices].copy()
+        results["score"] = top_scores.astype(float)
+        out.append(results)
+    return out
+
 # Enhanced BM25 Search
 def enhanced_bm25_search(user_query, bm25, metadata, word_list, top_n=5):
     """
@@ -133,7 +177,7 @@ def enhanced_bm25_search(user_query, bm25, metadata, word_list, top_n=5):
 
     Args:
         user_query (str): Raw user query.
-        bm25 (BM25Okapi): Pre-loaded BM25 index.
+        bm25 (SparseBM25 | BM25Okapi): Pre-loaded BM25 index.
         metadata (pd.DataFrame): Metadata DataFrame.
         word_list (list): List of valid domain-specific terms.
         top_n (int): Number of top results to retrieve.
@@ -157,6 +201,9 @@ def run_bm25_search(user_query, top_n=5):
     results = enhanced_bm25_search(user_query, bm25, metadata, word_list, top_n=top_n)
     return results
 
+def run_bm25_search_batch(user_queries, top_n=5):
+    return bm25_search_batch(user_queries, bm25, metadata, top_n=top_n)
+
 # # Example Usage
 # user_query = "3BHK apartments in Paras Dews"
 # #user_query = "3BHK apartments in whiteland urban resort"
@@ -2,35 +2,94 @@
 # normalization uses recent conversation context, user_location=None fallback.
 
 import json
+import os
 import time
 import asyncio
 import re
+import threading
 from fastapi import WebSocket, WebSocketDisconnect
 
 # Your loader bundles: retrieval, LLM handler, normalizer, DB helpers
 from helpers import load_heavy_modules
+from lifecycle import lifecycle, ComponentUnavailable
 from logger import apollo_logger
-
-# Load heavy modules once
+import query_fast_router
+from normalization_cache import normalization_cache, SIMILARITY_ENABLED as NORM_CACHE_NEAR_DUPLICATES
+from response_cache import response_cache, split_for_replay, CACHEABLE_CATEGORIES
+from history_writer import history_writer
+import embedding_service
+from session_backend import make_backend
+
+# Lazy handles: loaded by the startup warm-up or on first use (see lifecycle.py)
 retrieval_func, llm_handler, llm_query_normalization, db_functions = load_heavy_modules()
 
-# In-memory stores (DB is source of truth, but memory drives rapid context)
-user_contexts = {}        # optional normalized context for the normalizer (list/any)
-user_instructions = {}    # stored instruction strings (optional)
-user_chat_history = {}    # [{user: "...", assistant: "..."}] per user_id
+# Session state (DB is source of truth, but this drives rapid context).
+# SESSION_BACKEND picks in-process (default), SQLite or Redis; the shared ones let several workers/nodes
+# serve the same user. Missing or evicted histories are rehydrated from MySQL on the user's next turn.
+session_backend = make_backend()
+user_contexts = session_backend.namespace("user_contexts")            # optional normalized context for the normalizer (list/any)
+user_instructions = session_backend.namespace("user_instructions")    # stored instruction strings (optional)
+user_chat_history = session_backend.namespace("user_chat_history")    # [{user: "...", assistant: "..."}] per user_id
+MAX_HISTORY_EXCHANGES = 20
+
+# Vector context for product/recommendation answers without SQL rows. Opt-in: it adds a retrieval
+# stage (and changes the prompt context) compared with answering from SQL rows / the chain alone.
+VECTOR_CONTEXT = os.getenv("APOLLO_VECTOR_CONTEXT", "false").lower() in ("1", "true", "yes")
+# What retrieve_and_rank returns instead of context when nothing usable was found
+_RETRIEVAL_SENTINELS = (
+    "No documents were retrieved due to an error.",
+    "No highly relevant documents were found.",
+)
+
+# Speculative retrieval: start the likely lookup (vector context / dealers) while the normalizer runs
+SPECULATIVE_RETRIEVAL = os.getenv("APOLLO_SPECULATIVE_RETRIEVAL", "true").lower() in ("1", "true", "yes")
+SPECULATION_MIN_CONFIDENCE = 0.5
+# Cancelling an asyncio.to_thread task does not stop its worker thread: a mis-speculated lookup
+# still runs to completion. Cap how many can be in flight so they cannot pile up under load.
+SPECULATION_MAX_IN_FLIGHT = int(os.getenv("APOLLO_SPECULATION_MAX_IN_FLIGHT", "4"))
+_speculation_slots = threading.BoundedSemaphore(max(1, SPECULATION_MAX_IN_FLIGHT))
+RETRIEVAL_CATEGORIES = ("product_info", "recommendations")
+_SPECULATION_FOR_CATEGORY = {
+    "product_info": "retrieval",
+    "recommendations": "retrieval",
+    "dealer_locator": "dealers",
+}
+_NOT_SPECULATED = object()
+
+
+# Components every turn needs; retrieval_func is awaited only by the turns that retrieve
+TURN_COMPONENTS = ("db_functions", "llm_handler", "llm_query_normalization")
+
+
+# --------- Startup ---------
+
+# Pre-embed the most frequent historical queries once the vector store (and its model) is loaded
+lifecycle.on_ready("vector_db", lambda vdb: embedding_service.start_warm_up(vdb.embeddings))
+
+if NORM_CACHE_NEAR_DUPLICATES:
+    # Reuse the retrieval embedding model for near-duplicate normalization lookups, once it is loaded
+    lifecycle.on_ready(
+        "vector_db", lambda vdb: normalization_cache.set_embedder(vdb.embeddings.embed_query)
+    )
 
 
 # --------- Utilities ---------
 
+def _has_lookup_location(loc) -> bool:
+    """True when a location dict carries something the dealer lookup can use."""
+    return bool(loc) and isinstance(loc, dict) and bool(
+        loc.get("pincode") or loc.get("city") or (loc.get("latitude") and loc.get("longitude"))
+    )
+
 def _is_guest(user_id: str) -> bool:
     if not user_id:
         return True
     uid = user_id.lower()
     return uid.startswith("guest") or bool(re.match(r"^guest\d{10}$", uid))
 
-def _short_history(user_id: str, k: int = 3) -> str:
+def _short_history(history, k: int = 3) -> str:
     """Return last k exchanges as compact text for the LLM chain."""
-    hx = user_chat_history.get(user_id, [])[-k:]
+    hx = (history or [])[-k:]
     lines = []
     for ex in hx:
         u = ex.get("user", "").strip()
@@ -41,12 +100,12 @@ def _short_history(user_id: str, k: int = 3) -> str:
             lines.append(f"Assistant: {a}")
     return "\n".join(lines)
 
-def _history_for_normalizer(user_id: str, k: int = 5):
+def _history_for_normalizer(history, k: int = 5):
     """
     Return a light-weight list of recent exchanges for the normalizer.
     Keep raw strings — the normalizer can expand follow-ups (e.g., “And price?”).
     """
-    hx = user_chat_history.get(user_id, [])[-k:]
+    hx = (history or [])[-k:]
     out = []
     for ex in hx:
         if ex.get("user"):
@@ -105,31 +164,75 @@ def _render_dealers_list(dealers) -> str:
     lines.append("Would you like directions or a callback from one of them?")
     return "\n".join(lines)
 
-def _update_history(user_id: str, user_text: str, bot_text: str):
+async def _session(fn, *args):
+    """Run a session-backend call inline for the in-process store, in a thread for shared ones."""
+    if session_backend.blocking:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+async def _update_history(user_id: str, user_text: str, bot_text: str):
     ex = {"user": user_text or "", "assistant": bot_text or ""}
-    if user_id in user_chat_history:
-        user_chat_history[user_id].append(ex)
-    else:
-        user_chat_history[user_id] = [ex]
-    # Trim memory (last ~20 exchanges)
-    if len(user_chat_history[user_id]) > 20:
-        user_chat_history[user_id] = user_chat_history[user_id][-20:]
+    # Atomic append + trim to the last ~20 exchanges (safe with other workers writing the same user)
+    try:
+        await _session(user_chat_history.append_and_trim, user_id, ex, MAX_HISTORY_EXCHANGES)
+    except Exception as e:
+        apollo_logger.error(f"Session history update failed for user {user_id}: {e}", exc_info=True)
+
+def _rows_to_exchanges(rows):
+    """Pair DB rows [{role, message}] back into [{user, assistant}] exchanges."""
+    exchanges = []
+    for row in rows:
+        role, text = row.get("role"), row.get("message") or ""
+        if role == "user" or not exchanges or exchanges[-1]["assistant"]:
+            exchanges.append({"user": text if role == "user" else "", "assistant": ""})
+            if role == "user":
+                continue
+        exchanges[-1]["assistant"] = text
+    return exchanges[-MAX_HISTORY_EXCHANGES:]
+
+async def _load_history(user_id: str):
+    """Recent exchanges from the session backend, rehydrated from MySQL if not resident (new or evicted)."""
+    try:
+        history = await _session(user_chat_history.get_list, user_id)
+    except Exception as e:
+        apollo_logger.error(f"Session history read failed for user {user_id}: {e}", exc_info=True)
+        history = None
+    if history is not None:
+        return history
+    try:
+        rows = await asyncio.to_thread(
+            db_functions.load_recent_chat_history_from_db, user_id, MAX_HISTORY_EXCHANGES * 2
+        )
+    except Exception as e:
+        apollo_logger.error(f"History rehydration failed for user {user_id}: {e}", exc_info=True)
+        rows = []
+    history = _rows_to_exchanges(rows)
+    try:
+        # Store even an empty list so brand-new users do not hit the DB every turn
+        await _session(user_chat_history.set_list, user_id, history)
+    except Exception as e:
+        apollo_logger.error(f"Session history write failed for user {user_id}: {e}", exc_info=True)
+    if rows:
+        user_chat_history.count("rehydrations")
+        apollo_logger.info(f"Rehydrated {len(rows)} history rows for user {user_id}.")
+    return history
 
 async def _persist_history(user_id: str, user_text: str, bot_text: str):
     """
     Persist history for ALL users, including guests.
     Store as-is with the provided user_id (guest IDs help analytics too).
+    Rows go to the write-behind queue; the background writer batches them into MySQL.
     """
-    try:
-        db_functions.save_chat_history_to_db(user_id, "user", user_text or "")
-        db_functions.save_chat_history_to_db(user_id, "assistant", bot_text or "")
-    except Exception:
-        # Swallow DB errors to avoid breaking UX
-        pass
+    history_writer.enqueue(user_id, "user", user_text or "")
+    history_writer.enqueue(user_id, "assistant", bot_text or "")
 
-def _safe_json_send(ws: WebSocket, payload: dict):
-    """Send JSON with basic guard."""
-    return asyncio.create_task(ws.send_text(json.dumps(payload)))
+async def _safe_json_send(ws: WebSocket, payload: dict):
+    """
+    Send JSON and wait for the frame to be handed to the transport.
+    Awaiting the send (instead of firing a task) gives natural backpressure:
+    a slow client slows only its own stream, never the event loop.
+    """
+    await ws.send_text(json.dumps(payload))
 
 def _normalize_output_to_dict(result):
     """
@@ -204,6 +307,18 @@ async def chat_endpoint(websocket: WebSocket):
             user_input = (message.get("user_input") or "").strip()
             device_type = (message.get("device") or "").lower()
             apollo_logger.info(f"UserID: {user_id} | Device: {device_type} | UserInput: {user_input}")
+            mobile = device_type == "mobile"  # mobile-optimized prompt set (chains and cached answers)
+
+            # Heavy modules may still be warming up: wait for them off the event loop
+            try:
+                await lifecycle.ensure(*TURN_COMPONENTS)
+            except ComponentUnavailable as e:
+                apollo_logger.error(f"Turn for user {user_id} cannot be served: {e}")
+                await _safe_json_send(websocket, {
+                    "error": "⚠️ The assistant is temporarily unavailable. Please try again shortly.",
+                    "end": True
+                })
+                continue
 
             # Location: pass None if not available (futuristic, as requested)
             user_location = message.get("user_location", None)
@@ -212,8 +327,13 @@ async def chat_endpoint(websocket: WebSocket):
             apollo_logger.info(f"User location: {user_location}")
 
             # Build normalization context from recent conversation + any stored normalized context
-            history_for_norm = _history_for_normalizer(user_id, k=5)
-            prior_context = user_contexts.get(user_id, [])
+            history = await _load_history(user_id)
+            history_for_norm = _history_for_normalizer(history, k=5)
+            try:
+                prior_context = await _session(user_contexts.get, user_id, [])
+            except Exception as e:
+                apollo_logger.error(f"Session context read failed for user {user_id}: {e}", exc_info=True)
+                prior_context = []
             normalizer_context = {
                 "recent_history": history_for_norm,
                 "prior_context": prior_context
@@ -221,18 +341,37 @@ async def chat_endpoint(websocket: WebSocket):
             apollo_logger.info(f"Normalizer context built for user {user_id}.")
 
             # --- Normalize the query (category-first pipeline) ---
+            # Obvious turns (greetings, helpline, bare pincode/size) skip the LLM normalizer
+            speculation = {}
             try:
-                norm_result = llm_query_normalization.normalize_query_with_llm(
-                    user_input, normalizer_context, "gemini"
-                )
+                norm_result = query_fast_router.route(user_input, normalizer_context)
+                if norm_result is None:
+                    # Repeated questions (same text + same normalizer context) reuse a cached classification
+                    norm_result = await asyncio.to_thread(
+                        normalization_cache.get, user_input, history_for_norm, prior_context
+                    )
+                if norm_result is None:
+                    # LLM round trip ahead: start the likely downstream lookup alongside it
+                    speculation = _start_speculation(user_input, user_location)
+                    norm_start = time.perf_counter()
+                    norm_result = await asyncio.to_thread(
+                        llm_query_normalization.normalize_query_with_llm,
+                        user_input, normalizer_context, "gemini"
+                    )
+                    query_fast_router.record_llm_latency(time.perf_counter() - norm_start)
+                    # put() embeds the query when near-duplicate matching is on: keep it off the loop
+                    await asyncio.to_thread(
+                        normalization_cache.put, user_input, history_for_norm, norm_result, prior_context
+                    )
                 apollo_logger.info(f"Query normalized for user {user_id}.")
             except Exception as e:
+                _cancel_speculation(speculation)
                 apollo_logger.error(f"Normalization failed for user {user_id}: {e}", exc_info=True)
                 await _safe_json_send(websocket, {
                     "chunk": "Hello! I’m your Apollo Tyres assistant. How can I help you with tyre sizes, prices, specs, recommendations, or nearby dealers today?",
                     "end": True
                 })
-                _update_history(user_id, user_input, "")
+                await _update_history(user_id, user_input, "")
                 await _persist_history(user_id, user_input, "")
                 continue
 
@@ -241,10 +380,11 @@ async def chat_endpoint(websocket: WebSocket):
 
             # If the normalizer also provides an updated_context, update our memory
             if normalized.get("updated_context") is not None:
-                user_contexts[user_id] = normalized["updated_context"]
-                apollo_logger.info(f"Updated context for user {user_id}.")
-            else:
-                user_contexts.setdefault(user_id, [])
+                try:
+                    await _session(user_contexts.set, user_id, normalized["updated_context"])
+                    apollo_logger.info(f"Updated context for user {user_id}.")
+                except Exception as e:
+                    apollo_logger.error(f"Session context write failed for user {user_id}: {e}", exc_info=True)
 
             category = (normalized.get("category") or "greeting_clarification").strip().lower()
             normalized_input = normalized.get("normalized_input") or user_input
@@ -253,6 +393,9 @@ async def chat_endpoint(websocket: WebSocket):
             metadata = normalized.get("metadata") or {}
             apollo_logger.info(f"Routing category: {category}")
 
+            # Keep only the speculative lookup that matches the real category
+            _cancel_speculation(speculation, keep=_SPECULATION_FOR_CATEGORY.get(category))
+
             # --- Category routing ---
 
             # 1) Lead Capture — instant response + persist lead; no LLM
@@ -267,7 +410,7 @@ async def chat_endpoint(websocket: WebSocket):
                         apollo_logger.info(f"Lead saved for user {user_id}.")
                     except Exception as e:
                         apollo_logger.error(f"Failed to save lead for user {user_id}: {e}", exc_info=True)
-                _update_history(user_id, user_input, user_response or "")
+                await _update_history(user_id, user_input, user_response or "")
                 await _persist_history(user_id, user_input, user_response or "")
                 apollo_logger.info(f"Lead capture history updated for user {user_id}.")
                 await _safe_json_send(websocket, {"end": True, "full_response": user_response or ""})
@@ -278,7 +421,7 @@ async def chat_endpoint(websocket: WebSocket):
                 msg = user_response or "You can reach Apollo Tyres Customer Care at 1800-102-1838 or apolloquickservice@apollotyres.com."
                 await _safe_json_send(websocket, {"chunk": msg})
                 apollo_logger.info(f"Contact support message sent to user {user_id}.")
-                _update_history(user_id, user_input, msg)
+                await _update_history(user_id, user_input, msg)
                 await _persist_history(user_id, user_input, msg)
                 apollo_logger.info(f"Contact support history updated for user {user_id}.")
                 await _safe_json_send(websocket, {"end": True, "full_response": msg})
@@ -295,7 +438,11 @@ async def chat_endpoint(websocket: WebSocket):
                     effective_loc.get("latitude") and effective_loc.get("longitude")
                 )):
                     try:
-                        dealers = db_functions.find_dealers(effective_loc)
+                        dealers = _NOT_SPECULATED
+                        if effective_loc == user_location:
+                            dealers = await _claim_speculation(speculation, "dealers")
+                        if dealers is _NOT_SPECULATED:
+                            dealers = await asyncio.to_thread(db_functions.find_dealers, effective_loc)
                         apollo_logger.info(f"Dealers found for user {user_id}: {dealers}")
                         if not dealers:
                             dealer_reply = (
@@ -313,20 +460,20 @@ async def chat_endpoint(websocket: WebSocket):
                         )
                         apollo_logger.error(f"Dealer lookup failed for user {user_id}: {e}", exc_info=True)
                     await _safe_json_send(websocket, {"chunk": dealer_reply})
-                    _update_history(user_id, user_input, dealer_reply)
+                    await _update_history(user_id, user_input, dealer_reply)
                     await _persist_history(user_id, user_input, dealer_reply)
                     apollo_logger.info(f"Dealer locator history updated for user {user_id}.")
                     await _safe_json_send(websocket, {"end": True, "full_response": dealer_reply})
                     continue
                 else:
                     apollo_logger.info(f"Dealer locator missing location for user {user_id}, requesting pincode/city via LLM.")
-                    chain = llm_handler.create_chain(llm_flag="gemini", query_category="dealer_locator")
+                    chain = llm_handler.get_chain(llm_flag="gemini", query_category="dealer_locator", mobile=mobile)
                     await _stream_chain(
                         websocket,
                         chain,
                         question=normalized_input,
                         context="",
-                        chat_history=_short_history(user_id),
+                        chat_history=_short_history(history),
                         user_location=None,   # pass None explicitly
                         category="dealer_locator",
                         user_id=user_id,
@@ -345,20 +492,42 @@ async def chat_endpoint(websocket: WebSocket):
                     apollo_logger.error(f"Product info SQL failed for user {user_id}: {e}", exc_info=True)
                     context_text = ""
 
-            # 5) All other categories → LLM
+            # Vector context for product/recommendation answers (speculative result if it was started)
+            if VECTOR_CONTEXT and category in RETRIEVAL_CATEGORIES and not context_text:
+                context_text = await _retrieval_context(
+                    speculation, user_input, normalized_input, category, user_id
+                )
+            _cancel_speculation(speculation)
+
+            # 5) Context-free categories — replay a cached answer if we already generated one.
+            # Prompts interpolate the location, so only location-free turns read or fill the cache.
+            chain_location = None if user_location in (None, "", {}) else user_location
+            cacheable = category in CACHEABLE_CATEGORIES and chain_location is None
+            if cacheable:
+                cached_answer = response_cache.get(category, normalized_input, mobile=mobile)
+                if cached_answer:
+                    apollo_logger.info(f"Response cache hit for user {user_id}, category: {category}")
+                    await _replay_cached_answer(websocket, cached_answer, user_id, user_input)
+                    continue
+
+            # 6) All other categories → LLM
             apollo_logger.info(f"Routing to LLM for user {user_id}, category: {category}")
-            chain = llm_handler.create_chain(llm_flag="gemini", query_category=category)
-            await _stream_chain(
+            chain = llm_handler.get_chain(llm_flag="gemini", query_category=category, mobile=mobile)
+            chat_history_text = _short_history(history)
+            answer = await _stream_chain(
                 websocket,
                 chain,
                 question=normalized_input,
                 context=context_text,
-                chat_history=_short_history(user_id),
-                user_location=None if user_location in (None, "", {}) else user_location,
+                chat_history=chat_history_text,
+                user_location=chain_location,
                 category=category,
                 user_id=user_id,
                 original_input=user_input
             )
+            # Only answers generated without prior conversation are generic enough to reuse
+            if answer and cacheable and not chat_history_text:
+                response_cache.put(category, normalized_input, answer, mobile=mobile)
 
     except WebSocketDisconnect:
         apollo_logger.info(f"WebSocket disconnected for user {user_id}.")
@@ -367,6 +536,96 @@ async def chat_endpoint(websocket: WebSocket):
 
 # --------- Helpers used by the endpoint ---------
 
+def _start_speculation(user_input: str, user_location) -> dict:
+    """
+    Start the lookups the turn will most likely need, keyed on the raw input + fast-router guess.
+    Returns {"retrieval"|"dealers": Task}. Work runs in threads; a cancelled task is discarded, but
+    its thread finishes the lookup, so at most SPECULATION_MAX_IN_FLIGHT run at once.
+    """
+    if not SPECULATIVE_RETRIEVAL:
+        return {}
+    guess, confidence = query_fast_router.guess_category(user_input)
+    if guess is None or confidence < SPECULATION_MIN_CONFIDENCE:
+        return {}
+    tasks = {}
+    if VECTOR_CONTEXT and guess in RETRIEVAL_CATEGORIES and lifecycle.ready("retrieval_func"):
+        # Never speculate on a cold retrieval stack: loading it here would block the event loop
+        task = _spawn_speculative(retrieval_func.retrieve_and_rank, user_input, None, guess)
+        if task:
+            tasks["retrieval"] = task
+    elif guess == "dealer_locator" and _has_lookup_location(user_location):
+        task = _spawn_speculative(db_functions.find_dealers, user_location)
+        if task:
+            tasks["dealers"] = task
+    if tasks:
+        apollo_logger.info(f"Speculative lookups started for guess '{guess}' ({confidence:.2f}): {list(tasks)}")
+    return tasks
+
+def _spawn_speculative(fn, *args):
+    """Run fn(*args) in a thread if a speculation slot is free; the slot is released when the thread ends."""
+    if not _speculation_slots.acquire(blocking=False):
+        apollo_logger.info("Speculation skipped: too many speculative lookups in flight.")
+        return None
+
+    def run():
+        try:
+            return fn(*args)
+        finally:
+            _speculation_slots.release()
+
+    return asyncio.create_task(asyncio.to_thread(run))
+
+def _cancel_speculation(tasks: dict, keep: str = None):
+    """Cancel every speculative task except `keep`."""
+    for name in list(tasks):
+        if name != keep:
+            tasks.pop(name).cancel()
+
+async def _claim_speculation(tasks: dict, name: str):
+    """Await and return a speculative result, or _NOT_SPECULATED if absent/failed."""
+    task = tasks.pop(name, None)
+    if task is None:
+        return _NOT_SPECULATED
+    try:
+        return await task
+    except Exception as e:
+        apollo_logger.error(f"Speculative '{name}' lookup failed: {e}", exc_info=True)
+        return _NOT_SPECULATED
+
+def _same_query(raw: str, normalized: str) -> bool:
+    """
+    True when the normalizer kept the query's meaning close to the raw text, so a lookup keyed
+    on the raw text is still valid (follow-ups like "price?" get expanded and fail this check).
+    """
+    raw_tokens = set(re.findall(r"[a-z0-9]+", (raw or "").lower()))
+    norm_tokens = set(re.findall(r"[a-z0-9]+", (normalized or "").lower()))
+    if not norm_tokens:
+        return True
+    return len(norm_tokens & raw_tokens) / len(norm_tokens) >= 0.6
+
+async def _retrieval_context(speculation: dict, user_input: str, normalized_input: str, category: str, user_id: str) -> str:
+    """Vector-retrieval context for the answer chain, reusing the speculative run when valid."""
+    context = _NOT_SPECULATED
+    if _same_query(user_input, normalized_input):
+        context = await _claim_speculation(speculation, "retrieval")
+        if context is not _NOT_SPECULATED:
+            apollo_logger.info(f"Using speculative retrieval for user {user_id}.")
+    _cancel_speculation(speculation)
+    if context is _NOT_SPECULATED:
+        try:
+            await lifecycle.ensure("retrieval_func")
+            context = await asyncio.to_thread(
+                retrieval_func.retrieve_and_rank, normalized_input, None, category
+            )
+        except Exception as e:
+            apollo_logger.error(f"Retrieval failed for user {user_id}: {e}", exc_info=True)
+            context = ""
+    if context in _RETRIEVAL_SENTINELS:
+        # Failure/empty markers are not context; keep them out of the prompt
+        apollo_logger.info(f"No vector context for user {user_id}: {context}")
+        return ""
+    return context or ""
+
 async def _stream_chain(
     websocket: WebSocket,
     chain,
@@ -380,8 +639,11 @@ async def _stream_chain(
 ):
     """
     Run the chain and stream chunks to the client; update memory & DB at the end.
+    Uses chain.astream so token generation never blocks the event loop for other sockets.
+    Returns the full response, or None if the chain failed.
     """
     full_response = ""
+    failed = False
     apollo_logger.info(f"Starting LLM chain for user {user_id}, category: {category}")
     try:
         inputs = {
@@ -392,16 +654,34 @@ async def _stream_chain(
             "category": category or "",
         }
         apollo_logger.info(f"LLM chain inputs for user {user_id}: {inputs}")
-        for piece in chain.stream(inputs):
+        async for piece in chain.astream(inputs):
             clean_piece = _strip_triple_ticks(piece)
+            if not clean_piece:
+                continue
             full_response += clean_piece
             await _safe_json_send(websocket, {"chunk": clean_piece})
-            await asyncio.sleep(0.05)
+    except WebSocketDisconnect:
+        # Client went away mid-stream; keep what we generated and let the endpoint exit
+        apollo_logger.info(f"Client disconnected during streaming for user {user_id}.")
+        await _update_history(user_id, original_input, full_response)
+        await _persist_history(user_id, original_input, full_response)
+        raise
     except Exception as e:
+        failed = True
         err = f"⚠️ AI response error: {str(e)}"
         apollo_logger.error(f"LLM chain error for user {user_id}: {e}", exc_info=True)
         await _safe_json_send(websocket, {"error": err})
-    _update_history(user_id, original_input, full_response)
+    await _update_history(user_id, original_input, full_response)
     await _persist_history(user_id, original_input, full_response)
     apollo_logger.info(f"LLM chain completed for user {user_id}. Response: {full_response[:200]}")
     await _safe_json_send(websocket, {"end": True, "full_response": full_response})
+    return None if failed else full_response
+
+
+async def _replay_cached_answer(websocket: WebSocket, answer: str, user_id: str, original_input: str):
+    """Send a cached answer through the same chunk/end frames the live stream uses."""
+    for piece in split_for_replay(answer):
+        await _safe_json_send(websocket, {"chunk": piece})
+    await _update_history(user_id, original_input, answer)
+    await _persist_history(user_id, original_input, answer)
+    await _safe_json_send(websocket, {"end": True, "full_response": answer})
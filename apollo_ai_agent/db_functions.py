@@ -75,7 +75,7 @@ def load_chat_history_from_db(user_id):
         cursor = conn.cursor(dictionary=True)
         cursor.execute("""
             SELECT role, message FROM user_chat_history
-            WHERE user_id = %s ORDER BY timestamp ASC
+            WHERE user_id = %s ORDER BY timestamp ASC, id ASC
         """, (user_id,))
         rows = cursor.fetchall()
         conn.close()
@@ -86,6 +86,23 @@ def load_chat_history_from_db(user_id):
         print(f"⚠️ Error loading chat history: {e}")
     return chat_history
 
+def load_recent_chat_history_from_db(user_id, limit=40):
+    """Return the latest `limit` chat rows for user_id (oldest first) as [{role, message}]."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT role, message FROM (
+                SELECT id, role, message, timestamp FROM user_chat_history
+                WHERE user_id = %s ORDER BY timestamp DESC, id DESC LIMIT %s
+            ) recent ORDER BY timestamp ASC, id ASC
+        """, (user_id, limit))
+        rows = cursor.fetchall()
+        cursor.close()
+        return [{"role": row["role"], "message": row["message"]} for row in rows]
+    finally:
+        conn.close()
+
 def save_chat_history_to_db(user_id, role, message, session_id="default_session"):
     """Store chat history into MySQL for a given user_id."""
     try:
@@ -101,6 +118,29 @@ def save_chat_history_to_db(user_id, role, message, session_id="default_session"
     except Exception as e:
         print(f"❌ Error saving chat history: {e}")
 
+def save_chat_history_batch(rows):
+    """
+    Store many chat history rows in one multi-row INSERT + commit.
+    rows: iterable of (user_id, session_id, role, message, timestamp). Raises on failure so callers can retry.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+        params = [value for row in rows for value in row]
+        cursor.execute(f"""
+            INSERT INTO user_chat_history (user_id, session_id, role, message, timestamp)
+            VALUES {placeholders}
+        """, params)
+        conn.commit()
+        cursor.close()
+        return len(rows)
+    finally:
+        conn.close()
+
 def save_user_query(user_id, user_input, category, normalized_input, sql_query, updated_context, context, full_response):
     """Save user interaction to the `user_queries` table, avoiding duplicates."""
     
@@ -222,8 +262,7 @@ def store_user_in_db(user_id, name, email, mobile, city, interests, password=Non
 
 
         
-# Ensure tables exist on import
-create_tables()
+# Tables are created by the lifecycle manager at startup (lifecycle.py), not on import
 
 ### JWT and React additions
 import os
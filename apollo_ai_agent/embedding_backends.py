@@ -0,0 +1,185 @@
+# embedding_backends.py — selectable sentence-embedding backends (PyTorch or quantized ONNX Runtime)
+# EMBEDDING_BACKEND=torch (default) keeps langchain's HuggingFaceEmbeddings. EMBEDDING_BACKEND=onnx
+# runs the same sentence-transformer through ONNX Runtime instead: exported once to ONNX,
+# dynamically quantized to int8 weights, then served by a CPU session with a fixed thread count.
+# No PyTorch is needed at serve time, and it uses less RAM with faster CPU inference. The pipeline
+# is the same (tokenizer -> transformer -> mean pooling -> L2 normalize), so the vectors stay
+# close to fp32. Run MiscelleniousFiles/bench_onnx_embeddings.py to check agreement on the
+# catalog before switching, and rebuild the vector stores with the same backend afterwards.
+#   python embedding_backends.py export --model sentence-transformers/all-mpnet-base-v2
+#   python embedding_backends.py embed "Apollo Alnac 4G sizes"
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+MODEL_FILE = "model.onnx"
+META_FILE = "embedding_config.json"
+
+
+def default_threads() -> int:
+    """CPUs this process may run on (respects taskset/cgroup affinity), capped at 8."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return max(1, min(8, cpus))
+
+
+def onnx_model_dir(model_name: str, quantize: bool = True) -> str:
+    base = model_name.rstrip("/").rsplit("/", 1)[-1]
+    return os.path.join("onnx_models", f"{base}-{'int8' if quantize else 'fp32'}")
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    LangChain Embeddings backed by an ONNX Runtime session over an exported sentence-transformer.
+    Texts are sorted by length before batching so each batch pads to similar lengths; the output
+    order matches the input.
+    """
+
+    def __init__(self, model_dir: str, threads: Optional[int] = None, batch_size: int = 32):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, META_FILE)) as f:
+            self.config = json.load(f)
+        self.model_dir = model_dir
+        self.batch_size = batch_size
+        self.max_seq_length = self.config.get("max_seq_length", 384)
+        self.normalize = self.config.get("normalize", True)
+        self.variant = f"onnx-{'int8' if self.config.get('quantized') else 'fp32'}"
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or int(os.getenv("EMBEDDING_ONNX_THREADS", "0")) or default_threads()
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.threads = options.intra_op_num_threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, MODEL_FILE), options, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np"
+        )
+        feeds = {name: encoded[name].astype(np.int64) for name in self._inputs if name in encoded}
+        hidden = self.session.run(None, feeds)[0]
+        # Mean pooling over real tokens, as the sentence-transformers Pooling layer does
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            vectors = self._encode([texts[i] for i in idx])
+            if out.shape[1] == 0:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[idx] = vectors
+        return out.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def make_embedding_model(model_name: str, backend: Optional[str] = None):
+    """The embedding model for model_name on the configured backend (EMBEDDING_BACKEND)."""
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend == "onnx":
+        return OnnxEmbeddings(os.getenv("EMBEDDING_ONNX_DIR") or onnx_model_dir(model_name))
+    if backend != "torch":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}' (expected 'torch' or 'onnx')")
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+def export_onnx(model_name: str, out_dir: str, quantize: bool = True, max_seq_length: int = 384,
+                opset: int = 17) -> str:
+    """Export the transformer of a sentence-transformer to ONNX (optionally int8-quantized)."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["Apollo Alnac 4G 185/65 R15"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    dynamic = {n: {0: "batch", 1: "sequence"} for n in input_names}
+    dynamic["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32_path = os.path.join(out_dir, "model_fp32.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[n] for n in input_names), fp32_path,
+            input_names=input_names, output_names=["last_hidden_state"],
+            dynamic_axes=dynamic, opset_version=opset, do_constant_folding=True,
+        )
+    model_path = os.path.join(out_dir, MODEL_FILE)
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        # int8 weights for MatMul/Gemm; activations are quantized on the fly per batch
+        quantize_dynamic(fp32_path, model_path, weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+    else:
+        shutil.move(fp32_path, model_path)
+
+    tokenizer.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, META_FILE), "w") as f:
+        json.dump({
+            "model_name": model_name, "quantized": quantize, "max_seq_length": max_seq_length,
+            "pooling": "mean", "normalize": True, "opset": opset,
+        }, f, indent=2)
+    return model_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python embedding_backends.py", description="Embedding backends")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="export a sentence-transformer to ONNX (int8 by default)")
+    export.add_argument("--model", default="sentence-transformers/all-mpnet-base-v2")
+    export.add_argument("--out", default=None, help="default: onnx_models/<model>-int8")
+    export.add_argument("--no-quantize", action="store_true")
+    export.add_argument("--max-seq-length", type=int, default=384)
+    embed = sub.add_parser("embed", help="embed one text with the configured backend")
+    embed.add_argument("text")
+    embed.add_argument("--model", default="sentence-transformers/all-mpnet-base-v2")
+    embed.add_argument("--backend", default=None, choices=["torch", "onnx"])
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        out = args.out or onnx_model_dir(args.model, quantize=not args.no_quantize)
+        start = time.perf_counter()
+        path = export_onnx(args.model, out, quantize=not args.no_quantize, max_seq_length=args.max_seq_length)
+        print(f"Exported {args.model} to {path} ({os.path.getsize(path) / 1e6:.1f} MB) "
+              f"in {time.perf_counter() - start:.1f}s")
+    elif args.command == "embed":
+        model = make_embedding_model(args.model, args.backend)
+        start = time.perf_counter()
+        vector = model.embed_query(args.text)
+        print(f"{len(vector)} dims, norm {np.linalg.norm(vector):.4f}, "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms: {np.round(vector[:5], 4).tolist()} ...")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
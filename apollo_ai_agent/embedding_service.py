@@ -0,0 +1,546 @@
+# embedding_service.py — shared query-embedding model with a two-tier cache
+# Encoding the query with all-mpnet-base-v2 on CPU is the largest retrieval cost, and every
+# retrieve_vdb_* module loaded its own copy of the model. get_embeddings() returns one
+# CachedEmbeddings per model name. Its embed_query() goes through:
+#   1. an in-process LRU (EMBEDDING_CACHE_SIZE vectors)
+#   2. a WAL-mode SQLite file shared by every worker on the box (EMBEDDING_CACHE_PATH; "" disables)
+#   3. the model, with the result written to both tiers
+# Concurrent misses are encoded together by an EmbeddingBatcher (one forward pass per micro-batch).
+# Keys are (model name, normalized query). Normalization is whitespace collapsing and
+# lower-casing; the mpnet tokenizer lower-cases anyway. The normalized text is what gets
+# embedded, so a cached vector is exactly what the model would return for that key.
+# warm_up() pre-embeds the most frequent historical queries from user_queries and
+# user_chat_history, either at startup (EMBEDDING_CACHE_WARM_UP=<n>) or from the CLI:
+#   python embedding_service.py warm-up --limit 1000
+#   python embedding_service.py stats
+
+import argparse
+import asyncio
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from embedding_backends import make_embedding_model
+from logger import logger, error_logger
+
+DEFAULT_MODEL = "sentence-transformers/all-mpnet-base-v2"
+
+
+def normalize_query_text(text: str) -> str:
+    return re.sub(r"\s+", " ", (text or "").strip()).lower()
+
+
+class EmbeddingCache:
+    """
+    Memory LRU in front of an optional SQLite store. Vectors are float32 blobs. Disk hits refresh
+    last_used at most once per TOUCH_INTERVAL, and the store is trimmed to max_disk_entries (least
+    recently used first) every EVICT_EVERY writes.
+    """
+
+    TOUCH_INTERVAL = 60.0
+    EVICT_EVERY = 200
+
+    def __init__(self, max_entries: int = 4096, path: Optional[str] = "embedding_cache.db",
+                 max_disk_entries: int = 200000):
+        self.max_entries = max_entries
+        self.path = path or None
+        self.max_disk_entries = max_disk_entries
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._disk_writes = 0
+        self._stats = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0,
+            "disk_evictions": 0, "disk_errors": 0, "encodes": 0, "encode_seconds": 0.0,
+        }
+        if self.path:
+            try:
+                self._init_schema()
+            except sqlite3.Error as e:
+                error_logger.error(f"Embedding cache: disk tier disabled ({self.path}): {e}")
+                self.path = None
+
+    # ---- disk tier ----
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS query_embeddings (
+                model TEXT NOT NULL,
+                text_key TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_key)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_query_embeddings_last_used ON query_embeddings (last_used)")
+
+    def _disk_get(self, model: str, key: str) -> Optional[np.ndarray]:
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT vector, last_used FROM query_embeddings WHERE model = ? AND text_key = ?", (model, key)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[1] > self.TOUCH_INTERVAL:
+                conn.execute(
+                    "UPDATE query_embeddings SET last_used = ? WHERE model = ? AND text_key = ?", (now, model, key)
+                )
+            return np.frombuffer(row[0], dtype=np.float32)
+        except sqlite3.Error as e:
+            self._count("disk_errors")
+            error_logger.error(f"Embedding cache read failed: {e}")
+            return None
+
+    def _disk_put_many(self, model: str, items: Sequence[Tuple[str, np.ndarray]]):
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO query_embeddings (model, text_key, vector, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(model, key, vec.astype(np.float32).tobytes(), now, now) for key, vec in items]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            self._count("disk_errors")
+            error_logger.error(f"Embedding cache write failed: {e}")
+            return
+        with self._lock:
+            before = self._disk_writes
+            self._disk_writes += len(items)
+            due = before // self.EVICT_EVERY != self._disk_writes // self.EVICT_EVERY
+        if due:
+            self.evict_disk()
+
+    def evict_disk(self) -> int:
+        """Drop the least recently used rows above max_disk_entries."""
+        if not self.path:
+            return 0
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                (count,) = conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()
+                excess = count - self.max_disk_entries
+                removed = 0
+                if excess > 0:
+                    removed = conn.execute("""
+                        DELETE FROM query_embeddings WHERE rowid IN (
+                            SELECT rowid FROM query_embeddings ORDER BY last_used LIMIT ?
+                        )
+                    """, (excess,)).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            self._count("disk_errors")
+            error_logger.error(f"Embedding cache eviction failed: {e}")
+            return 0
+        if removed:
+            self._count("disk_evictions", removed)
+        return removed
+
+    # ---- memory tier ----
+
+    def _count(self, counter: str, n=1):
+        with self._lock:
+            self._stats[counter] += n
+
+    def _remember(self, model: str, key: str, vec: np.ndarray):
+        with self._lock:
+            self._entries[(model, key)] = vec
+            self._entries.move_to_end((model, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    # ---- public API (keys are already normalized) ----
+
+    def get(self, model: str, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vec = self._entries.get((model, key))
+            if vec is not None:
+                self._entries.move_to_end((model, key))
+                self._stats["memory_hits"] += 1
+                return vec
+        vec = self._disk_get(model, key) if self.path else None
+        if vec is not None:
+            self._remember(model, key, vec)
+            self._count("disk_hits")
+            return vec
+        self._count("misses")
+        return None
+
+    def put_many(self, model: str, items: Sequence[Tuple[str, np.ndarray]]):
+        items = [(key, np.asarray(vec, dtype=np.float32)) for key, vec in items]
+        for key, vec in items:
+            self._remember(model, key, vec)
+        self._count("stores", len(items))
+        if self.path and items:
+            self._disk_put_many(model, items)
+
+    def contains(self, model: str, key: str) -> bool:
+        """Membership test that does not touch the hit/miss counters."""
+        with self._lock:
+            if (model, key) in self._entries:
+                return True
+        if not self.path:
+            return False
+        try:
+            return self._conn().execute(
+                "SELECT 1 FROM query_embeddings WHERE model = ? AND text_key = ?", (model, key)
+            ).fetchone() is not None
+        except sqlite3.Error:
+            return False
+
+    def record_encode(self, count: int, seconds: float):
+        with self._lock:
+            self._stats["encodes"] += count
+            self._stats["encode_seconds"] += seconds
+
+    def flush(self, disk: bool = False) -> int:
+        """Drop the memory tier (and the disk tier with disk=True); returns memory entries removed."""
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+        if disk and self.path:
+            self._conn().execute("DELETE FROM query_embeddings")
+        logger.info(f"Embedding cache flushed ({removed} memory entries{', disk cleared' if disk else ''}).")
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["size"] = len(self._entries)
+        lookups = s["memory_hits"] + s["disk_hits"] + s["misses"]
+        s["hit_rate"] = round((s["memory_hits"] + s["disk_hits"]) / lookups, 4) if lookups else 0.0
+        s["memory_hit_rate"] = round(s["memory_hits"] / lookups, 4) if lookups else 0.0
+        s["avg_encode_ms"] = round(s["encode_seconds"] / s["encodes"] * 1000, 2) if s["encodes"] else None
+        s["encode_seconds"] = round(s["encode_seconds"], 3)
+        s["max_entries"] = self.max_entries
+        s["disk_path"] = self.path
+        if self.path:
+            try:
+                (s["disk_entries"],) = self._conn().execute("SELECT COUNT(*) FROM query_embeddings").fetchone()
+            except sqlite3.Error:
+                s["disk_entries"] = None
+        return s
+
+
+class EmbeddingBatcher:
+    """
+    Cross-request micro-batching. Callers (retrieval runs in asyncio.to_thread workers) submit
+    texts and block on per-text futures. A collector thread takes the first waiting text, gathers
+    more for up to max_wait seconds or max_batch texts, and hands the batch to a pool of `workers`
+    encode threads. It only collects while a worker is free, so under load the next batch fills
+    up while the current forward pass runs. Duplicate texts in a batch are encoded once.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], List[np.ndarray]], max_batch: int = 32,
+                 max_wait: float = 0.005, workers: int = 1, name: str = "embedding-batcher"):
+        self.encode_fn = encode_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self._queue: "queue.Queue[Tuple[str, Future, float]]" = queue.Queue()
+        self._free = threading.Semaphore(workers)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "encoded": 0, "max_batch_seen": 0,
+                       "queue_wait_seconds": 0.0, "failures": 0}
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._collect, name=f"{self.name}-collector", daemon=True)
+                    self._thread.start()
+
+    def submit(self, texts: Sequence[str]) -> List[Future]:
+        if self._closed:
+            raise RuntimeError(f"{self.name} is closed")
+        self._ensure_started()
+        now = time.perf_counter()
+        futures = []
+        for text in texts:
+            future = Future()
+            self._queue.put((text, future, now))
+            futures.append(future)
+        with self._lock:
+            self._stats["requests"] += len(futures)
+        return futures
+
+    def embed(self, texts: Sequence[str], timeout: Optional[float] = None) -> List[np.ndarray]:
+        """Blocking: one vector per text, encoded together with whatever else is waiting."""
+        return [f.result(timeout) for f in self.submit(texts)]
+
+    async def aembed(self, texts: Sequence[str]) -> List[np.ndarray]:
+        return list(await asyncio.gather(*(asyncio.wrap_future(f) for f in self.submit(texts))))
+
+    def _collect(self):
+        while True:
+            self._free.acquire()
+            item = self._queue.get()
+            if item is None:
+                self._free.release()
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # finish this batch, then stop
+                    break
+                batch.append(item)
+            self._pool.submit(self._run, batch)
+
+    def _run(self, batch: List[Tuple[str, Future, float]]):
+        started = time.perf_counter()
+        try:
+            unique = list(dict.fromkeys(text for text, _, _ in batch))
+            try:
+                vectors = dict(zip(unique, self.encode_fn(unique)))
+            except Exception as e:
+                with self._lock:
+                    self._stats["failures"] += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                return
+            for text, future, _ in batch:
+                future.set_result(vectors[text])
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["encoded"] += len(unique)
+                self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], len(batch))
+                self._stats["queue_wait_seconds"] += sum(started - queued for _, _, queued in batch)
+        finally:
+            self._free.release()
+
+    def close(self):
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+        self._pool.shutdown(wait=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            s = dict(self._stats)
+        served = s["requests"] - self._queue.qsize()
+        s["avg_batch_size"] = round(served / s["batches"], 2) if s["batches"] else None
+        s["avg_queue_wait_ms"] = round(s["queue_wait_seconds"] / served * 1000, 2) if served > 0 else None
+        s["queue_wait_seconds"] = round(s["queue_wait_seconds"], 3)
+        s["max_batch"] = self.max_batch
+        s["max_wait_ms"] = self.max_wait * 1000
+        return s
+
+
+class CachedEmbeddings:
+    """
+    Drop-in for HuggingFaceEmbeddings where Chroma and the retrieve_vdb_* modules use it.
+    embed_query goes through the cache, and cache misses go through the batcher when one is set.
+    embed_documents (index building) goes straight to the model.
+    """
+
+    def __init__(self, model_name: str, cache: EmbeddingCache, model, batcher_options: Optional[Dict] = None):
+        self.model_name = model_name
+        self.cache = cache
+        self.model = model
+        self.batcher = (
+            EmbeddingBatcher(self._encode, name=f"embed-{model_name.rsplit('/', 1)[-1]}", **batcher_options)
+            if batcher_options is not None else None
+        )
+
+    def _encode(self, texts: List[str]) -> List[np.ndarray]:
+        start = time.perf_counter()
+        vectors = self.model.embed_documents(texts)
+        self.cache.record_encode(len(texts), time.perf_counter() - start)
+        return [np.asarray(v, dtype=np.float32) for v in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: Sequence[str]) -> List[List[float]]:
+        """Cached embeddings for several queries; the misses are encoded in one model call."""
+        keys = [normalize_query_text(t) for t in texts]
+        found: Dict[str, np.ndarray] = {}
+        for key in keys:
+            if key not in found:
+                vec = self.cache.get(self.model_name, key)
+                if vec is not None:
+                    found[key] = vec
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            encoded = self.batcher.embed(missing) if self.batcher is not None else self._encode(missing)
+            self.cache.put_many(self.model_name, list(zip(missing, encoded)))
+            found.update(zip(missing, encoded))
+        return [found[key].tolist() for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self.embed_query, text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+
+# Process-wide cache and one wrapper (one loaded model) per model name
+embedding_cache = EmbeddingCache(
+    max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "4096")),
+    path=os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db"),
+    max_disk_entries=int(os.getenv("EMBEDDING_CACHE_MAX_DISK_ENTRIES", "200000")),
+)
+_embeddings: Dict[str, CachedEmbeddings] = {}
+_embeddings_lock = threading.Lock()
+
+# Historical queries to pre-embed when the vector store comes up (0 disables)
+WARM_UP_LIMIT = int(os.getenv("EMBEDDING_CACHE_WARM_UP", "500"))
+
+# Cross-request micro-batching of cache misses (EMBEDDING_BATCHING=false encodes each request alone)
+BATCHER_OPTIONS = {
+    "max_batch": int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32")),
+    "max_wait": float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5")) / 1000.0,
+    "workers": int(os.getenv("EMBEDDING_BATCH_WORKERS", "1")),
+} if os.getenv("EMBEDDING_BATCHING", "true").lower() in ("1", "true", "yes") else None
+
+
+def get_embeddings(model_name: str = DEFAULT_MODEL) -> CachedEmbeddings:
+    """The shared cached wrapper for model_name; the first call loads the model (EMBEDDING_BACKEND)."""
+    with _embeddings_lock:
+        if model_name not in _embeddings:
+            start = time.perf_counter()
+            model = make_embedding_model(model_name)
+            # ONNX vectors are close to but not identical with fp32 ones: cache them under their own key
+            variant = getattr(model, "variant", None)
+            cache_model = f"{model_name}@{variant}" if variant else model_name
+            logger.info(f"Embedding model '{cache_model}' loaded in {time.perf_counter() - start:.2f}s.")
+            _embeddings[model_name] = CachedEmbeddings(cache_model, embedding_cache, model, BATCHER_OPTIONS)
+        return _embeddings[model_name]
+
+
+def stats() -> Dict:
+    """Cache counters plus per-model batcher counters."""
+    with _embeddings_lock:
+        batchers = {name: e.batcher.stats() for name, e in _embeddings.items() if e.batcher is not None}
+    return {"cache": embedding_cache.stats(), "batchers": batchers}
+
+
+# ---------------------------------------------------------------------------
+# Warm-up from query history
+# ---------------------------------------------------------------------------
+
+def historical_queries(limit: int = 500) -> List[str]:
+    """Most frequent past queries: normalized inputs (what retrieval embeds) plus raw user messages."""
+    import db_functions
+
+    counts: Dict[str, int] = {}
+    conn = db_functions.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        for sql in (
+            """
+            SELECT normalized_input, COUNT(*) AS n FROM user_queries
+            WHERE normalized_input <> '' GROUP BY normalized_input ORDER BY n DESC LIMIT %s
+            """,
+            """
+            SELECT message, COUNT(*) AS n FROM user_chat_history
+            WHERE role = 'user' GROUP BY message ORDER BY n DESC LIMIT %s
+            """,
+        ):
+            cursor.execute(sql, (limit,))
+            for text, n in cursor.fetchall():
+                key = normalize_query_text(text)
+                if key:
+                    counts[key] = counts.get(key, 0) + int(n)
+        cursor.close()
+    finally:
+        conn.close()
+    return [text for text, _ in sorted(counts.items(), key=lambda kv: -kv[1])[:limit]]
+
+
+def warm_up(embeddings: CachedEmbeddings = None, limit: int = 500, batch_size: int = 32) -> Dict:
+    """Pre-embed the top `limit` historical queries that are not cached yet."""
+    embeddings = embeddings or get_embeddings()
+    start = time.perf_counter()
+    texts = historical_queries(limit)
+    todo = [t for t in texts if not embeddings.cache.contains(embeddings.model_name, t)]
+    for i in range(0, len(todo), batch_size):
+        batch = todo[i:i + batch_size]
+        embeddings.cache.put_many(embeddings.model_name, list(zip(batch, embeddings._encode(batch))))
+    result = {
+        "candidates": len(texts), "already_cached": len(texts) - len(todo), "embedded": len(todo),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    logger.info(f"Embedding cache warm-up: {result}")
+    return result
+
+
+def start_warm_up(embeddings: CachedEmbeddings, limit: int = WARM_UP_LIMIT):
+    """Run warm_up() in a daemon thread (startup must not wait on MySQL or the encoding)."""
+    if limit <= 0 or not isinstance(embeddings, CachedEmbeddings):
+        return
+
+    def _run():
+        try:
+            warm_up(embeddings, limit)
+        except Exception as e:
+            error_logger.error(f"Embedding cache warm-up failed: {e}", exc_info=True)
+
+    threading.Thread(target=_run, name="embedding-warm-up", daemon=True).start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python embedding_service.py", description="Query-embedding cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+    warm = sub.add_parser("warm-up", help="pre-embed the most frequent historical queries")
+    warm.add_argument("--limit", type=int, default=1000)
+    warm.add_argument("--model", default=DEFAULT_MODEL)
+    sub.add_parser("stats", help="show cache counters and disk size")
+    args = parser.parse_args(argv)
+
+    if args.command == "warm-up":
+        print(warm_up(get_embeddings(args.model), args.limit))
+    elif args.command == "stats":
+        print(stats())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
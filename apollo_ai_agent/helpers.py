@@ -13,11 +13,15 @@ def cache_data(*args, **kwargs):
 
 @cache_resource
 def load_heavy_modules():
-    import retrieval_func
-    import llm_handler
-    import llm_query_normalization
-    import db_functions
-    return retrieval_func, llm_handler, llm_query_normalization, db_functions
+    # Lazy stand-ins: nothing heavy is imported here. The lifecycle manager loads each module on first
+    # use or during the background warm-up (see lifecycle.py).
+    from lifecycle import lifecycle
+    return (
+        lifecycle.lazy("retrieval_func"),
+        lifecycle.lazy("llm_handler"),
+        lifecycle.lazy("llm_query_normalization"),
+        lifecycle.lazy("db_functions"),
+    )
 
 @cache_data(show_spinner=False)
 def load_image_cached(path, size=None):
@@ -0,0 +1,161 @@
+# history_writer.py — write-behind queue for chat history rows
+# chat_handler enqueues rows and returns immediately; a background task flushes them to MySQL in
+# multi-row INSERTs when the batch is full or the flush interval elapses. DB latency never reaches
+# the user-facing path. Memory is bounded by max_queue; on shutdown everything pending is flushed.
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from logger import logger, error_logger
+
+Row = Tuple[str, str, str, str, datetime]
+
+
+class HistoryWriter:
+    def __init__(
+        self,
+        flush_fn: Callable[[List[Row]], int],
+        max_batch: int = 200,
+        flush_interval: float = 0.5,
+        max_queue: int = 10000,
+        max_retries: int = 5,
+        base_backoff: float = 0.5,
+        max_backoff: float = 10.0,
+    ):
+        self._flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._stats = {"enqueued": 0, "written": 0, "batches": 0, "retries": 0, "failed": 0, "dropped": 0}
+
+    # ---- lifecycle ----
+
+    def start(self):
+        """Start the background flusher on the running event loop (idempotent)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"History writer started (batch={self.max_batch}, interval={self.flush_interval}s).")
+
+    async def stop(self, timeout: float = 30.0):
+        """Flush everything still queued, then stop the flusher."""
+        if self._task is None:
+            return
+        self._stopping = True
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            error_logger.error(f"History writer did not drain within {timeout}s; {self._queue.qsize()} rows lost.")
+            self._task.cancel()
+        self._task = None
+        logger.info(f"History writer stopped: {self.stats()}")
+
+    # ---- producer side ----
+
+    def enqueue(self, user_id: str, role: str, message: str, session_id: str = "default_session") -> bool:
+        """Queue one row without blocking. Returns False if the queue is full and the row was dropped."""
+        if self._task is None or self._task.done():
+            self.start()
+        try:
+            self._queue.put_nowait((user_id, session_id, role, message or "", datetime.now()))
+            self._stats["enqueued"] += 1
+            return True
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+            error_logger.error(f"History queue full ({self.max_queue}); dropped {role} row for {user_id}.")
+            return False
+
+    # ---- consumer side ----
+
+    async def _next_batch(self) -> List[Row]:
+        loop = asyncio.get_running_loop()
+        batch: List[Row] = []
+        try:
+            batch.append(await asyncio.wait_for(self._queue.get(), timeout=self.flush_interval))
+        except asyncio.TimeoutError:
+            return batch
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.max_batch:
+            # Take whatever is already queued, then wait out the rest of the interval
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0 or self._stopping:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: List[Row]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await asyncio.to_thread(self._flush_fn, batch)
+                self._stats["written"] += len(batch)
+                self._stats["batches"] += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    error_logger.error(f"History batch of {len(batch)} rows failed after {attempt + 1} attempts: {e}")
+                    if len(batch) > 1:
+                        await self._write_rows(batch)
+                    else:
+                        self._stats["failed"] += 1
+                    return
+                self._stats["retries"] += 1
+                delay = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+                error_logger.error(f"History batch write failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+
+    async def _write_rows(self, batch: List[Row]):
+        """Insert a failed batch one row at a time, so only the rows that still fail are dropped."""
+        for row in batch:
+            try:
+                await asyncio.to_thread(self._flush_fn, [row])
+                self._stats["written"] += 1
+            except Exception as e:
+                self._stats["failed"] += 1
+                error_logger.error(f"History {row[2]} row for {row[0]} dropped: {e}")
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            if batch:
+                await self._write(batch)
+            elif self._stopping and self._queue.empty():
+                return
+
+    def stats(self):
+        s = dict(self._stats)
+        s["queued"] = self._queue.qsize() if self._queue is not None else 0
+        s["running"] = self._task is not None and not self._task.done()
+        return s
+
+
+def _flush_to_mysql(rows: List[Row]) -> int:
+    # Imported lazily so importing this module never touches MySQL
+    import db_functions
+    return db_functions.save_chat_history_batch(rows)
+
+
+# Process-wide writer used by chat_handler (started on app startup, drained on shutdown)
+history_writer = HistoryWriter(
+    _flush_to_mysql,
+    max_batch=int(os.getenv("HISTORY_WRITER_BATCH", "200")),
+    flush_interval=float(os.getenv("HISTORY_WRITER_INTERVAL", "0.5")),
+    max_queue=int(os.getenv("HISTORY_WRITER_MAX_QUEUE", "10000")),
+)
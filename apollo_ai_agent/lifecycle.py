@@ -0,0 +1,229 @@
+# lifecycle.py — lazy loading, background warm-up and readiness for the heavy modules
+# Importing the app used to import retrieval_func (BM25 unpickle + all-mpnet-base-v2 + Chroma),
+# llm_handler, the normalizer and db_functions (CREATE TABLEs against MySQL) before the worker could
+# accept a connection; one missing dependency killed the whole process. Each of those is now a
+# Component: loaded on first use or by the background warm-up started at app startup, whichever
+# comes first, with its state, load time and error kept for /health/ready and the startup report.
+# A failed component is retried on the next use after RETRY_AFTER seconds; the rest keep working.
+
+import asyncio
+import importlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from logger import logger, error_logger
+
+PENDING, LOADING, READY, FAILED = "pending", "loading", "ready", "failed"
+
+
+class ComponentUnavailable(RuntimeError):
+    """A component failed to load (the original error is chained)."""
+
+
+class Component:
+    def __init__(self, name: str, loader: Callable[[], Any], depends_on: Sequence[str] = ()):
+        self.name = name
+        self.loader = loader
+        self.depends_on = tuple(depends_on)
+        self.value = None
+        self.state = PENDING
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self.failed_at: Optional[float] = None
+        self.lock = threading.Lock()
+        self.on_ready: List[Callable[[Any], None]] = []
+
+
+class LifecycleManager:
+    RETRY_AFTER = 30.0
+
+    def __init__(self):
+        self._components: Dict[str, Component] = {}
+        self._warm_up_task: Optional[asyncio.Task] = None
+        # name -> the in-flight loop-side load; every ensure() of that component awaits the same future
+        self._loads: Dict[str, asyncio.Future] = {}
+        self._started_at = time.perf_counter()
+        self.warm_up_seconds: Optional[float] = None
+
+    # ---- registry ----
+
+    def register(self, name: str, loader: Callable[[], Any], depends_on: Sequence[str] = ()):
+        self._components[name] = Component(name, loader, depends_on)
+
+    def on_ready(self, name: str, callback: Callable[[Any], None]):
+        """Run callback(value) once the component is loaded (immediately if it already is)."""
+        comp = self._components[name]
+        with comp.lock:
+            if comp.state != READY:
+                comp.on_ready.append(callback)
+                return
+        callback(comp.value)
+
+    def lazy(self, name: str) -> "LazyModule":
+        return LazyModule(self, name)
+
+    # ---- loading ----
+
+    def ready(self, name: str) -> bool:
+        return self._components[name].state == READY
+
+    def get(self, name: str) -> Any:
+        """Return the loaded component, loading it (and its dependencies) in this thread if needed."""
+        comp = self._components[name]
+        if comp.state == READY:
+            return comp.value
+        for dep in comp.depends_on:
+            self.get(dep)
+        with comp.lock:
+            if comp.state == READY:
+                return comp.value
+            if comp.state == FAILED and time.monotonic() - comp.failed_at < self.RETRY_AFTER:
+                raise ComponentUnavailable(f"{name} failed to load: {comp.error}")
+            comp.state = LOADING
+            start = time.perf_counter()
+            try:
+                value = comp.loader()
+            except Exception as e:
+                comp.state, comp.error, comp.failed_at = FAILED, f"{type(e).__name__}: {e}", time.monotonic()
+                comp.seconds = time.perf_counter() - start
+                error_logger.error(f"Component '{name}' failed to load after {comp.seconds:.2f}s: {comp.error}")
+                raise ComponentUnavailable(f"{name} failed to load: {comp.error}") from e
+            comp.value, comp.seconds, comp.error = value, time.perf_counter() - start, None
+            comp.state = READY
+            callbacks, comp.on_ready = comp.on_ready, []
+        logger.info(f"Component '{name}' ready in {comp.seconds:.2f}s.")
+        for callback in callbacks:
+            try:
+                callback(value)
+            except Exception as e:
+                error_logger.error(f"on_ready hook for '{name}' failed: {e}", exc_info=True)
+        return value
+
+    def _load_future(self, name: str) -> asyncio.Future:
+        """The shared future loading `name`: one executor thread per component, however many awaiters."""
+        future = self._loads.get(name)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(None, self.get, name)
+            self._loads[name] = future
+            future.add_done_callback(lambda f: self._load_done(name, f))
+        return future
+
+    def _load_done(self, name: str, future: asyncio.Future):
+        self._loads.pop(name, None)
+        if not future.cancelled():
+            future.exception()  # already recorded on the component; awaiters get it, nobody else needs to
+
+    async def ensure(self, *names: str):
+        """
+        Await the components without blocking the event loop. Concurrent callers wait on one shared
+        future per component instead of each parking an executor thread on the component's lock.
+        """
+        for name in names:
+            if self.ready(name):
+                continue
+            # Dependencies first, so the loader thread never waits on a dependency another thread is loading
+            await self.ensure(*self._components[name].depends_on)
+            # shield: one caller giving up (websocket closed) must not cancel the load for the others
+            await asyncio.shield(self._load_future(name))
+
+    # ---- background warm-up ----
+
+    def start_warm_up(self, names: Iterable[str] = None):
+        """Load components in registration order in a background task; startup does not wait."""
+        if self._warm_up_task is not None and not self._warm_up_task.done():
+            return
+        order = list(names) if names is not None else list(self._components)
+        self._warm_up_task = asyncio.get_running_loop().create_task(self._warm_up(order))
+
+    async def _warm_up(self, names: List[str]):
+        start = time.perf_counter()
+        for name in names:
+            try:
+                await self.ensure(name)
+            except ComponentUnavailable:
+                pass  # recorded on the component; keep warming the others
+            except Exception as e:
+                error_logger.error(f"Warm-up of '{name}' crashed: {e}", exc_info=True)
+        self.warm_up_seconds = time.perf_counter() - start
+        logger.info(self.startup_report())
+
+    async def stop(self):
+        if self._warm_up_task is not None and not self._warm_up_task.done():
+            self._warm_up_task.cancel()
+
+    # ---- reporting ----
+
+    def status(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "state": c.state,
+                "seconds": round(c.seconds, 3) if c.seconds is not None else None,
+                "error": c.error,
+            }
+            for name, c in self._components.items()
+        }
+
+    def all_ready(self, names: Iterable[str] = None) -> bool:
+        return all(self.ready(n) for n in (names if names is not None else self._components))
+
+    def startup_report(self) -> str:
+        lines = [f"Startup report (warm-up {self.warm_up_seconds or 0:.2f}s, "
+                 f"{time.perf_counter() - self._started_at:.2f}s since import):"]
+        for name, s in self.status().items():
+            took = f"{s['seconds']:.2f}s" if s["seconds"] is not None else "-"
+            lines.append(f"  {name:<24} {s['state']:<8} {took:>8}" + (f"  {s['error']}" if s["error"] else ""))
+        return "\n".join(lines)
+
+
+class LazyModule:
+    """Module stand-in: the first attribute access loads the component (blocking; see ensure())."""
+
+    def __init__(self, manager: LifecycleManager, name: str):
+        object.__setattr__(self, "_manager", manager)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr: str):
+        return getattr(self._manager.get(self._name), attr)
+
+    def __repr__(self):
+        return f"<lazy component '{self._name}' ({self._manager.status()[self._name]['state']})>"
+
+
+# ---------------------------------------------------------------------------
+# The app's heavy components, in warm-up order (cheapest and most widely needed first)
+# ---------------------------------------------------------------------------
+
+def _import(name: str):
+    return importlib.import_module(name)
+
+
+def _load_db_functions():
+    db_functions = _import("db_functions")
+    db_functions.create_tables()
+    return db_functions
+
+
+def _load_llm_handler():
+    llm_handler = _import("llm_handler")
+    # Build LLM clients + per-category chains so the first message skips construction
+    llm_handler.warm_up_chains()
+    return llm_handler
+
+
+lifecycle = LifecycleManager()
+lifecycle.register("db_functions", _load_db_functions)
+lifecycle.register("llm_handler", _load_llm_handler)
+lifecycle.register("llm_query_normalization", lambda: _import("llm_query_normalization"))
+lifecycle.register("bm25_retrieval", lambda: _import("bm25_retrieval"))
+# Same backend switch as retrieval_func: Chroma, or exact search over the exported matrix
+VDB_BACKEND = os.getenv("APOLLO_VDB_BACKEND", "chroma").lower()
+lifecycle.register("vector_db", lambda: _import("retrieve_vdb_numpy" if VDB_BACKEND == "numpy" else "retrieve_vdb_apollo"))
+lifecycle.register("retrieval_func", lambda: _import("retrieval_func"),
+                   depends_on=("bm25_retrieval", "vector_db"))
+
+# Components /health/ready waits for (comma-separated; default: all of them)
+READY_COMPONENTS = [
+    n.strip() for n in os.getenv("APOLLO_READY_COMPONENTS", ",".join(lifecycle.status())).split(",") if n.strip()
+]
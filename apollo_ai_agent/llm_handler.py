@@ -1,6 +1,7 @@
 # llm_handler.py — category-only prompt selection with user_location + streaming
 
-from typing import Optional
+import threading
+from typing import Dict, Optional, Tuple
 
 from langchain_core.prompts import (
     SystemMessagePromptTemplate,
@@ -22,12 +23,26 @@ from llm_prompts_mobile import get_prompt_mobile_content
 # Load environment variables (expects GOOGLE_API_KEY if using Gemini)
 load_dotenv("./../.env", override=True)
 
+# Categories routed by chat_handler (see llm_prompts.get_prompt_for_category)
+CHAIN_CATEGORIES = (
+    "product_info",
+    "recommendations",
+    "dealer_locator",
+    "contact_support",
+    "lead_capture",
+    "warranty",
+    "greeting_clarification",
+    "unrelated",
+    "contextual_query",
+)
 
-def _get_llm(llm_flag: str = "gemini"):
-    """
-    Return an LLM instance suitable for streaming.
-    """
-    flag = (llm_flag or "gemini").lower()
+# Process-wide caches: one LLM client per flag, one chain per (llm_flag, category, mobile)
+_llm_clients: Dict[str, object] = {}
+_chain_registry: Dict[Tuple[str, str, bool], object] = {}
+_registry_lock = threading.Lock()
+
+
+def _build_llm(flag: str):
     if flag == "groq":
         # Deterministic, support-style answers
         return ChatGroq(temperature=0.1, model_name="deepseek-r1-distill-llama-70b")
@@ -40,6 +55,43 @@ def _get_llm(llm_flag: str = "gemini"):
     )
 
 
+def _get_llm(llm_flag: str = "gemini"):
+    """
+    Return the shared LLM instance for this flag (suitable for streaming).
+    The client keeps its HTTP/gRPC channel, so reusing it avoids a reconnect per message.
+    """
+    flag = (llm_flag or "gemini").lower()
+    llm = _llm_clients.get(flag)
+    if llm is None:
+        with _registry_lock:
+            llm = _llm_clients.get(flag)
+            if llm is None:
+                llm = _build_llm(flag)
+                _llm_clients[flag] = llm
+                logger.info(f"LLM client created for flag '{flag}'.")
+    return llm
+
+
+# Human template — keep it generic; the category-specific system prompt does the heavy lifting
+HUMAN_TEMPLATE = """
+You are the Apollo Tyres AI Agent. Answer with brand-specific, helpful content and honor any formatting hints from the user.
+
+### Inputs
+- Previous Conversation:
+{chat_history}
+
+### Context
+{context}
+
+### Question
+{question}
+
+### Answer
+"""
+
+_HUMAN_PROMPT = HumanMessagePromptTemplate.from_template(HUMAN_TEMPLATE)
+
+
 def create_chain(
     llm_flag: str = "gemini",
     query_category: Optional[str] = None,
@@ -66,24 +118,8 @@ def create_chain(
 
     system = SystemMessagePromptTemplate.from_template(system_prompt)
 
-    # 3) Human template — keep it generic; your category-specific system prompt does the heavy lifting
-    human_template = """
-You are the Apollo Tyres AI Agent. Answer with brand-specific, helpful content and honor any formatting hints from the user.
-
-### Inputs
-- Previous Conversation:
-{chat_history}
-
-### Context
-{context}
-
-### Question
-{question}
-
-### Answer
-"""
-
-    human = HumanMessagePromptTemplate.from_template(human_template)
+    # 3) Human template — parsed once at import and shared by every chain
+    human = _HUMAN_PROMPT
 
     # 4) Build chat prompt and chain; StrOutputParser() allows incremental streaming in chat_handler
     chat_prompt = ChatPromptTemplate(messages=[system, human])
@@ -91,6 +127,46 @@ You are the Apollo Tyres AI Agent. Answer with brand-specific, helpful content a
     logger.info(f"Chain created for category '{category}' and llm_flag '{llm_flag}'.")
     return chain
 
+
+def get_chain(
+    llm_flag: str = "gemini",
+    query_category: Optional[str] = None,
+    mobile: bool = False,
+):
+    """
+    Return the prebuilt chain for (llm_flag, category, mobile), building it on first use.
+    This is the per-message entry point; create_chain() stays available for one-off chains.
+    """
+    flag = (llm_flag or "gemini").lower()
+    category = (query_category or "contextual_query").strip().lower()
+    if category not in CHAIN_CATEGORIES:
+        category = "contextual_query"
+    key = (flag, category, bool(mobile))
+
+    chain = _chain_registry.get(key)
+    if chain is None:
+        chain = create_chain(llm_flag=flag, query_category=category, mobile=bool(mobile))
+        with _registry_lock:
+            chain = _chain_registry.setdefault(key, chain)
+    return chain
+
+
+def warm_up_chains(llm_flags=("gemini",), mobile_variants=(False, True)):
+    """
+    Build every registered chain up front (call once at startup).
+    Returns the number of chains in the registry.
+    """
+    start_time = time.time()
+    for flag in llm_flags:
+        for mobile in mobile_variants:
+            for category in CHAIN_CATEGORIES:
+                try:
+                    get_chain(llm_flag=flag, query_category=category, mobile=mobile)
+                except Exception as e:
+                    error_logger.error(f"Chain warm-up failed for ({flag}, {category}, mobile={mobile}): {e}", exc_info=True)
+    logger.info(f"Chain registry warmed: {len(_chain_registry)} chains in {time.time() - start_time:.2f}s")
+    return len(_chain_registry)
+
 # Example usage:
 # logger.info("Sending prompt to LLM: %s", prompt)
 # error_logger.error("LLM error: %s", str(e))
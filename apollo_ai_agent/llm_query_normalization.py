@@ -4,6 +4,7 @@
 import os
 import json
 import re
+from functools import lru_cache
 from typing import Any, Dict, List, Optional
 
 from dotenv import load_dotenv
@@ -75,7 +76,9 @@ def _default_result() -> Dict[str, Any]:
     }
 
 
+@lru_cache(maxsize=4)
 def _get_llm(model_name: str = "gemini-2.0-flash", temperature: float = 0.1) -> ChatGoogleGenerativeAI:
+    # Cached so every normalization reuses one client (and its pooled connection)
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         raise RuntimeError("GOOGLE_API_KEY is not set in the environment.")
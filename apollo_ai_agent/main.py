@@ -4,9 +4,12 @@ import time
 import logging
 from datetime import datetime
 from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from chat_handler import chat_endpoint
+from lifecycle import lifecycle, READY_COMPONENTS
+from history_writer import history_writer
 from chat_history import chat_history_router
 from feedback import feedback_router
 from admin_router import admin_router
@@ -35,6 +38,39 @@ app.include_router(chat_history_router)
 # Include the mobile‐submission endpoint
 app.include_router(agent_router)
 
+# -------------------
+# Startup Warm-up
+# -------------------
+@app.on_event("startup")
+async def warm_up_components():
+    # Heavy modules (DB tables, LLM chains, normalizer, BM25, embeddings + Chroma) load in a background
+    # task, so the worker accepts traffic right away; a turn waits only for the components it uses
+    lifecycle.start_warm_up()
+    logger.info("Component warm-up started in the background.")
+
+@app.on_event("shutdown")
+async def stop_warm_up():
+    await lifecycle.stop()
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness probe: 200 once APOLLO_READY_COMPONENTS are loaded, 503 (with per-component state) until then."""
+    ready = lifecycle.all_ready(READY_COMPONENTS)
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "required": READY_COMPONENTS, "components": lifecycle.status(),
+                 "warm_up_seconds": lifecycle.warm_up_seconds}
+    )
+
+@app.on_event("startup")
+async def start_history_writer():
+    history_writer.start()
+
+@app.on_event("shutdown")
+async def stop_history_writer():
+    # Guaranteed flush of queued chat history before the worker exits
+    await history_writer.stop()
+
 # -------------------
 # Middleware to Log Incoming API Requests
 # -------------------
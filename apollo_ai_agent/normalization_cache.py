@@ -0,0 +1,210 @@
+# normalization_cache.py — bounded LRU + TTL cache of normalize_query_with_llm results
+# Key: case/whitespace-normalized input + fingerprint of the whole normalizer context (recent history
+# and the stored prior_context), so a follow-up never reuses another conversation's normalization.
+# Optional near-duplicate lookup: embed the input and reuse an entry above a cosine threshold, but
+# only when both texts name the same numbers (sizes, pincodes) and catalog tokens in the same order.
+
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from logger import logger, error_logger
+
+# Never cache these (lead_capture carries phone numbers / emails)
+UNCACHEABLE_CATEGORIES = {"lead_capture"}
+
+# Product lines and vehicles: "Alnac" vs "Amazer" or "Swift" vs "Creta" embed close but normalize apart
+CATALOG_TOKENS = frozenset((
+    "amazer", "alnac", "apterra", "aspire", "acelere", "altrust", "alpha", "actizip", "actigrip",
+    "endurace", "endutrax", "endumile", "amar", "xt", "loadstar", "krishak", "tramplus", "vredestein",
+    "maruti", "suzuki", "hyundai", "tata", "mahindra", "honda", "toyota", "kia", "mg", "renault",
+    "nissan", "skoda", "volkswagen", "ford", "jeep", "bmw", "audi", "mercedes", "royal", "enfield",
+    "bajaj", "hero", "tvs", "yamaha", "leyland", "eicher",
+    "swift", "dzire", "baleno", "brezza", "ertiga", "alto", "wagonr", "ciaz", "creta", "venue",
+    "verna", "nexon", "punch", "harrier", "safari", "tiago", "altroz", "thar", "scorpio", "bolero",
+    "city", "amaze", "innova", "fortuner", "seltos", "sonet", "hector", "kwid", "duster", "magnite",
+    "ecosport", "compass", "classic", "pulsar", "splendor",
+))
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case, collapse whitespace, drop trailing punctuation."""
+    text = re.sub(r"\s+", " ", (text or "").strip().lower())
+    return text.rstrip(" ?!.")
+
+
+def context_fingerprint(recent_history: Optional[List[Dict[str, Any]]], prior_context: Any = None) -> str:
+    """Stable short hash of the recent exchanges and prior context passed to the normalizer."""
+    if not recent_history and not prior_context:
+        return "-"
+    parts = [
+        f"{(item.get('role') or '').lower()}:{normalize_text(item.get('content') or '')}"
+        for item in recent_history or []
+    ]
+    if prior_context:
+        parts.append(json.dumps(prior_context, sort_keys=True, default=str))
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def guard_tokens(text_key: str) -> Tuple[str, ...]:
+    """Numbers and catalog tokens of a normalized text; near matches must agree on them exactly."""
+    return tuple(
+        t for t in _TOKEN_RE.findall(text_key) if t in CATALOG_TOKENS or any(c.isdigit() for c in t)
+    )
+
+
+class NormalizationCache:
+    """Thread-safe LRU + TTL cache with hit/miss counters."""
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl_seconds: float = 3600.0,
+        similarity_threshold: float = 0.95,
+        embed_fn: Optional[Callable[[str], List[float]]] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._embed_fn = embed_fn
+        # key -> (stored_at, result, embedding, guard tokens)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any], Optional[np.ndarray], Tuple[str, ...]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "near_hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "stores": 0}
+
+    # ---- configuration ----
+
+    def set_embedder(self, embed_fn: Optional[Callable[[str], List[float]]], threshold: Optional[float] = None):
+        """Enable (or disable with None) near-duplicate lookup."""
+        self._embed_fn = embed_fn
+        if threshold is not None:
+            self.similarity_threshold = threshold
+
+    # ---- internals ----
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        if self._embed_fn is None or not text:
+            return None
+        try:
+            vec = np.asarray(self._embed_fn(text), dtype=np.float32)
+            norm = float(np.linalg.norm(vec))
+            return vec / norm if norm > 0 else None
+        except Exception as e:
+            error_logger.error(f"Normalization cache embedding failed: {e}")
+            return None
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - stored_at > self.ttl_seconds
+
+    def _purge_expired_locked(self, now: float):
+        for key in [k for k, (ts, _, _, _) in self._entries.items() if self._expired(ts, now)]:
+            del self._entries[key]
+            self._stats["expirations"] += 1
+
+    # ---- public API ----
+
+    def get(self, user_input: str, recent_history: Optional[List[Dict[str, Any]]] = None,
+            prior_context: Any = None) -> Optional[Dict[str, Any]]:
+        text_key = normalize_text(user_input)
+        fp = context_fingerprint(recent_history, prior_context)
+        key = (text_key, fp)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, result, _, _ = entry
+                if not self._expired(stored_at, now):
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return copy.deepcopy(result)
+                del self._entries[key]
+                self._stats["expirations"] += 1
+            has_candidates = self._embed_fn is not None and any(k[1] == fp for k in self._entries)
+
+        if has_candidates:
+            query_vec = self._embed(text_key)
+            if query_vec is not None:
+                # "185/65 R15" vs "195/65 R15" embed above the threshold but need their own sql/entities
+                guard = guard_tokens(text_key)
+                with self._lock:
+                    best_key, best_score = None, -1.0
+                    for k, (stored_at, _, vec, entry_guard) in self._entries.items():
+                        if k[1] != fp or vec is None or entry_guard != guard or self._expired(stored_at, now):
+                            continue
+                        score = float(np.dot(query_vec, vec))
+                        if score > best_score:
+                            best_key, best_score = k, score
+                    if best_key is not None and best_score >= self.similarity_threshold:
+                        self._entries.move_to_end(best_key)
+                        self._stats["near_hits"] += 1
+                        logger.info(f"Normalization cache near-hit ({best_score:.3f}): '{text_key}' ~ '{best_key[0]}'")
+                        return copy.deepcopy(self._entries[best_key][1])
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, user_input: str, recent_history: Optional[List[Dict[str, Any]]], result: Dict[str, Any],
+            prior_context: Any = None):
+        if not isinstance(result, dict):
+            return
+        category = (result.get("category") or "").strip().lower()
+        # Skip PII-bearing results and the normalizer's error fallback (empty normalized_input)
+        if category in UNCACHEABLE_CATEGORIES or not result.get("normalized_input"):
+            return
+        text_key = normalize_text(user_input)
+        if not text_key:
+            return
+        key = (text_key, context_fingerprint(recent_history, prior_context))
+        vec = self._embed(text_key)
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (now, copy.deepcopy(result), vec, guard_tokens(text_key))
+            self._entries.move_to_end(key)
+            self._stats["stores"] += 1
+            if len(self._entries) > self.max_entries:
+                self._purge_expired_locked(now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def flush(self) -> int:
+        """Drop every entry; returns how many were removed."""
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+        logger.info(f"Normalization cache flushed ({removed} entries).")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+            s["size"] = len(self._entries)
+        lookups = s["hits"] + s["near_hits"] + s["misses"]
+        s["hit_rate"] = round((s["hits"] + s["near_hits"]) / lookups, 4) if lookups else 0.0
+        s["max_entries"] = self.max_entries
+        s["ttl_seconds"] = self.ttl_seconds
+        s["similarity_enabled"] = self._embed_fn is not None
+        s["similarity_threshold"] = self.similarity_threshold
+        return s
+
+
+# Process-wide instance used by chat_handler / admin_router
+normalization_cache = NormalizationCache(
+    max_entries=int(os.getenv("NORMALIZATION_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("NORMALIZATION_CACHE_TTL", "3600")),
+    similarity_threshold=float(os.getenv("NORMALIZATION_CACHE_SIMILARITY", "0.95")),
+)
+
+# Near-duplicate matching needs an embedding model; chat_handler wires it up when enabled
+SIMILARITY_ENABLED = os.getenv("NORMALIZATION_CACHE_NEAR_DUPLICATES", "false").lower() in ("1", "true", "yes")
@@ -0,0 +1,318 @@
+# query_fast_router.py — deterministic pre-classifier ahead of normalize_query_with_llm
+# Handles the obvious turns (greetings, helpline asks, bare pincodes, bare tyre sizes, phone/email)
+# with compiled regexes + a keyword trie. Anything below the confidence threshold falls through to the LLM.
+
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from llm_query_prompts import TOLL_FREE, SUPPORT_EMAIL
+from logger import logger
+
+# Inputs at or above this confidence skip the LLM normalizer entirely
+BYPASS_THRESHOLD = 0.9
+
+# Ignore anything long — multi-intent questions belong to the LLM
+MAX_FAST_PATH_TOKENS = 12
+
+CATEGORIES = (
+    "product_info",
+    "recommendations",
+    "dealer_locator",
+    "contact_support",
+    "lead_capture",
+    "warranty",
+    "greeting_clarification",
+    "unrelated",
+)
+
+GREETING_RESPONSE = (
+    "Hello! I’m your Apollo Tyres assistant. I can help with sizes, prices (MRP), specs, "
+    "recommendations, nearby dealers, and warranty. For example: “MRP of Alnac 4G 185/70 R15”, "
+    "“Best Apollo for Swift city use”, or “Nearest dealer in 122002”."
+)
+CONTACT_SUPPORT_RESPONSE = (
+    f"You can reach Apollo Tyres Customer Care at {TOLL_FREE} (toll-free) or {SUPPORT_EMAIL}."
+)
+
+
+# ---------- Compiled patterns ----------
+
+_PINCODE_RE = re.compile(r"(?<!\d)([1-9]\d{5})(?!\d)")
+_PINCODE_ONLY_RE = re.compile(r"^\s*(?:my\s+)?(?:pin\s*code|pincode|pin|zip)?\s*(?:is)?\s*[:\-#]?\s*([1-9]\d{5})\s*[.!?]?\s*$", re.I)
+_TYRE_SIZE_RE = re.compile(
+    r"(?<!\d)(\d{3})\s*[/\s-]?\s*(\d{2})\s*[/\s-]?\s*(z?r)?\s*[/\s-]?\s*(\d{2})(?!\d)", re.I
+)
+_TYRE_SIZE_ONLY_RE = re.compile(
+    r"^\s*(?:tyre\s+|tire\s+)?(?:size\s+)?(\d{3})\s*[/\s-]?\s*(\d{2})\s*[/\s-]?\s*(z?r)?\s*[/\s-]?\s*(\d{2})\s*(?:tyres?|tires?)?\s*[.?!]?\s*$",
+    re.I,
+)
+_MOBILE_RE = re.compile(r"(?<!\d)(?:\+?91[\s-]?)?([6-9]\d{4}[\s-]?\d{5})(?!\d)")
+_EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+# ---------- Keyword trie ----------
+
+class KeywordTrie:
+    """Token-level trie: finds every (phrase → category, weight) match in a token list."""
+
+    def __init__(self):
+        self._root: Dict[str, Any] = {}
+
+    def add(self, phrase: str, category: str, weight: float):
+        node = self._root
+        for tok in _TOKEN_RE.findall(phrase.lower()):
+            node = node.setdefault(tok, {})
+        node["$"] = (category, weight, phrase)
+
+    def find_all(self, tokens: List[str]) -> List[Tuple[str, float, int, int]]:
+        """Return (category, weight, start, end) for every phrase occurrence."""
+        matches = []
+        for start in range(len(tokens)):
+            node = self._root
+            for end in range(start, len(tokens)):
+                node = node.get(tokens[end])
+                if node is None:
+                    break
+                if "$" in node:
+                    category, weight, _ = node["$"]
+                    matches.append((category, weight, start, end + 1))
+        return matches
+
+
+_KEYWORDS = {
+    "greeting_clarification": (
+        ("hi", 1.0), ("hii", 1.0), ("hiii", 1.0), ("hello", 1.0), ("hey", 1.0), ("hiya", 1.0),
+        ("namaste", 1.0), ("good morning", 1.0), ("good afternoon", 1.0), ("good evening", 1.0),
+        ("gm", 1.0), ("yo", 0.8), ("thanks", 0.9), ("thank you", 0.9), ("thankyou", 0.9),
+    ),
+    "contact_support": (
+        ("customer care", 1.0), ("customer care number", 1.0), ("customer service", 1.0),
+        ("helpline", 1.0), ("help line", 1.0), ("toll free", 1.0), ("tollfree", 1.0),
+        ("contact number", 1.0), ("phone number", 0.8), ("support number", 1.0),
+        ("support email", 1.0), ("email id", 0.7), ("call centre", 1.0), ("call center", 1.0),
+        ("complaint", 0.8), ("escalate", 0.8), ("talk to a human", 1.0), ("speak to someone", 1.0),
+    ),
+    "dealer_locator": (
+        ("dealer", 0.9), ("dealers", 0.9), ("dealership", 0.9), ("retailer", 0.8), ("showroom", 0.8),
+        ("shop", 0.6), ("store", 0.6), ("near me", 0.8), ("nearby", 0.6), ("nearest", 0.7),
+        ("where can i buy", 0.8),
+    ),
+    "warranty": (
+        ("warranty", 0.85), ("guarantee", 0.7), ("claim", 0.6), ("warranty claim", 0.9),
+        ("road hazard", 0.8), ("pothole", 0.6),
+    ),
+    "recommendations": (
+        ("best tyre", 0.8), ("best tyres", 0.8), ("suggest", 0.7), ("recommend", 0.7),
+        ("which tyre", 0.7), ("which tyres", 0.7), ("should i buy", 0.7),
+    ),
+    "product_info": (
+        ("price", 0.6), ("mrp", 0.7), ("cost", 0.5), ("size", 0.5), ("sizes", 0.5), ("specs", 0.6),
+        ("load index", 0.7), ("speed rating", 0.7), ("tyre pressure", 0.7), ("alnac", 0.6),
+        ("amazer", 0.6), ("apterra", 0.6), ("aspire", 0.6), ("alnac 4g", 0.7),
+    ),
+}
+
+_trie = KeywordTrie()
+for _category, _phrases in _KEYWORDS.items():
+    for _phrase, _weight in _phrases:
+        _trie.add(_phrase, _category, _weight)
+
+# Filler words allowed alongside a greeting/support phrase without lowering confidence
+_FILLER = {
+    "apollo", "tyres", "tyre", "tires", "tire", "there", "team", "bot", "sir", "madam", "please", "pls",
+    "the", "a", "is", "what", "whats", "what's", "your", "you", "give", "me", "share", "of", "for",
+    "need", "want", "i", "can", "get", "number", "no", "id", "email", "mail", "all", "everyone",
+    "again", "ji", "bro", "so", "much", "very", "lot", "ok", "okay", "and",
+}
+
+
+# ---------- Metrics ----------
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Any] = {
+    "total": 0,
+    "bypassed": 0,
+    "llm_latency_ema_s": None,
+    "per_category": {c: {"bypassed": 0, "latency_saved_s": 0.0} for c in CATEGORIES},
+}
+
+
+def record_llm_latency(seconds: float, alpha: float = 0.2):
+    """Feed a measured LLM normalizer latency (used to estimate time saved per bypass)."""
+    with _stats_lock:
+        ema = _stats["llm_latency_ema_s"]
+        _stats["llm_latency_ema_s"] = seconds if ema is None else (alpha * seconds + (1 - alpha) * ema)
+
+
+def _record(category: Optional[str]):
+    with _stats_lock:
+        _stats["total"] += 1
+        if category is None:
+            return
+        _stats["bypassed"] += 1
+        bucket = _stats["per_category"].setdefault(category, {"bypassed": 0, "latency_saved_s": 0.0})
+        bucket["bypassed"] += 1
+        bucket["latency_saved_s"] += _stats["llm_latency_ema_s"] or 0.0
+
+
+def get_stats() -> Dict[str, Any]:
+    """Bypass rate and estimated normalizer latency saved, overall and per category."""
+    with _stats_lock:
+        total = _stats["total"]
+        ema = _stats["llm_latency_ema_s"]
+        per_category = {
+            c: {"bypassed": v["bypassed"], "latency_saved_s": round(v["latency_saved_s"], 3)}
+            for c, v in _stats["per_category"].items()
+        }
+        return {
+            "total": total,
+            "bypassed": _stats["bypassed"],
+            "bypass_rate": round(_stats["bypassed"] / total, 4) if total else 0.0,
+            "avg_llm_latency_ms": round(ema * 1000, 1) if ema is not None else None,
+            "latency_saved_s": round(sum(v["latency_saved_s"] for v in per_category.values()), 3),
+            "per_category": per_category,
+        }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats["total"] = 0
+        _stats["bypassed"] = 0
+        for bucket in _stats["per_category"].values():
+            bucket["bypassed"] = 0
+            bucket["latency_saved_s"] = 0.0
+
+
+# ---------- Classification ----------
+
+def normalize_tyre_size(text: str) -> Optional[str]:
+    """'20555R16' / '205/55R16' / '205 55 16' → '205/55 R16' (None if no size present)."""
+    m = _TYRE_SIZE_RE.search(text or "")
+    if not m:
+        return None
+    width, aspect, construction, rim = m.groups()
+    construction = (construction or "R").upper()
+    return f"{width}/{aspect} {construction}{rim}"
+
+
+def _result(category: str, normalized_input: str, user_response: Optional[str] = None,
+            updated_context: Optional[list] = None, metadata: Optional[dict] = None) -> Dict[str, Any]:
+    return {
+        "category": category,
+        "normalized_input": normalized_input,
+        "sql_query": None,
+        "user_response": user_response,
+        "updated_context": updated_context or [],
+        "metadata": metadata or {},
+    }
+
+
+def classify(user_input: str) -> Tuple[Optional[str], float, Optional[Dict[str, Any]]]:
+    """
+    Score the raw input against the rules.
+    Returns (category, confidence, result_dict). result_dict is shaped like the LLM normalizer's output
+    and is only provided for rules confident enough to answer on their own.
+    """
+    text = (user_input or "").strip()
+    if not text:
+        return "greeting_clarification", 1.0, _result("greeting_clarification", "", GREETING_RESPONSE)
+
+    tokens = _TOKEN_RE.findall(text.lower())
+    if len(tokens) > MAX_FAST_PATH_TOKENS:
+        return None, 0.0, None
+
+    # 1) Bare pincode → dealer lookup for that pincode
+    m = _PINCODE_ONLY_RE.match(text)
+    if m:
+        pincode = m.group(1)
+        location = {"pincode": pincode}
+        return "dealer_locator", 0.97, _result(
+            "dealer_locator", f"Nearest Apollo dealer in {pincode}",
+            updated_context=[{"location": location}], metadata={"location": location},
+        )
+
+    # 2) Bare tyre size → product info for that size
+    if _TYRE_SIZE_ONLY_RE.match(text):
+        size = normalize_tyre_size(text)
+        return "product_info", 0.95, _result("product_info", f"Apollo tyres in size {size}")
+
+    # 3) Phone number / email shared → lead capture (reply handled by the lead flow)
+    mobile = _MOBILE_RE.search(text)
+    email = _EMAIL_RE.search(text)
+    if mobile or email:
+        lead = {}
+        if mobile:
+            lead["mobile"] = re.sub(r"[\s-]", "", mobile.group(1))
+        if email:
+            lead["email"] = email.group(0)
+        return "lead_capture", 0.92, _result("lead_capture", text, metadata={"lead": lead})
+
+    # 4) Keyword trie scoring
+    matches = _trie.find_all(tokens)
+    scores: Dict[str, float] = {}
+    covered = set()
+    for category, weight, start, end in matches:
+        scores[category] = max(scores.get(category, 0.0), weight)
+        covered.update(range(start, end))
+
+    # A size anywhere in the text is a strong product signal
+    if _TYRE_SIZE_RE.search(text):
+        scores["product_info"] = max(scores.get("product_info", 0.0), 0.7)
+        covered.update(i for i, t in enumerate(tokens) if t.isdigit() or re.fullmatch(r"z?r\d{2}", t))
+    if not scores:
+        return None, 0.0, None
+
+    # "hi, price of alnac 4g" is a product question, not a greeting
+    if len(scores) > 1:
+        scores.pop("greeting_clarification", None)
+    best = max(scores, key=scores.get)
+    confidence = scores[best]
+
+    # Competing intents lower confidence (e.g. "hi, price of alnac 4g")
+    rivals = [s for c, s in scores.items() if c != best]
+    if rivals:
+        confidence -= 0.5 * max(rivals)
+
+    # Unexplained words lower confidence; filler words are fine
+    leftover = [t for i, t in enumerate(tokens) if i not in covered and t not in _FILLER]
+    confidence -= 0.15 * len(leftover)
+
+    # Dealer asks with a pincode in them are unambiguous
+    pincode = _PINCODE_RE.search(text)
+    if best == "dealer_locator" and pincode:
+        location = {"pincode": pincode.group(1)}
+        return best, 0.95, _result(
+            best, f"Nearest Apollo dealer in {pincode.group(1)}",
+            updated_context=[{"location": location}], metadata={"location": location},
+        )
+
+    confidence = max(0.0, min(1.0, confidence))
+    if best == "greeting_clarification":
+        return best, confidence, _result(best, text.strip(" !.?").capitalize(), GREETING_RESPONSE)
+    if best == "contact_support":
+        return best, confidence, _result(best, "Apollo customer care number", CONTACT_SUPPORT_RESPONSE)
+    # Other categories need the LLM to clean up the query; expose the guess only
+    return best, confidence, None
+
+
+def route(user_input: str, conversation_context: Any = None,
+          threshold: float = BYPASS_THRESHOLD) -> Optional[Dict[str, Any]]:
+    """
+    Return a normalizer-shaped result when the rules are confident, else None (→ call the LLM).
+    Short follow-ups ("price?") depend on history, so they never get here with enough confidence.
+    """
+    category, confidence, result = classify(user_input)
+    if result is None or confidence < threshold:
+        _record(None)
+        return None
+    _record(category)
+    logger.info(f"Fast-path routed '{user_input}' → {category} (confidence {confidence:.2f})")
+    return result
+
+
+def guess_category(user_input: str) -> Tuple[Optional[str], float]:
+    """Cheap best guess (any confidence) for callers that want to act before the LLM answers."""
+    category, confidence, _ = classify(user_input)
+    return category, confidence
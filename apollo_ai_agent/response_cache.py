@@ -0,0 +1,111 @@
+# response_cache.py — full-answer cache for context-free categories
+# Answers for warranty / greeting_clarification are effectively static per normalized question, so we
+# keep the generated text and replay it instead of calling Gemini again. (contact_support never reaches
+# the LLM: it gets an instant reply.)
+# Key: (category, normalized_input, mobile prompt set, prompt version). Editing a prompt changes its
+# version hash, so stale answers are never served after a prompt change. The prompts interpolate the
+# user's location, which is not part of the key: callers only use the cache for turns without one.
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from llm_prompts import get_prompt_content
+from llm_prompts_mobile import get_prompt_mobile_content
+from logger import logger
+
+CACHEABLE_CATEGORIES = {"warranty", "greeting_clarification"}
+
+# Replay granularity: words per {"chunk": ...} frame
+REPLAY_WORDS_PER_CHUNK = 8
+
+
+@lru_cache(maxsize=64)
+def prompt_version(category: str, mobile: bool = False) -> str:
+    """Short hash of the system prompt text used for this category / prompt set."""
+    prompt = get_prompt_mobile_content(category) if mobile else get_prompt_content(category)
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+def _normalize_question(text: str) -> str:
+    return re.sub(r"\s+", " ", (text or "").strip().lower()).rstrip(" ?!.")
+
+
+def split_for_replay(text: str, words_per_chunk: int = REPLAY_WORDS_PER_CHUNK) -> List[str]:
+    """Split an answer into word groups (whitespace preserved) so "".join(chunks) == text."""
+    pieces = re.findall(r"\s*\S+\s*", text or "")
+    return ["".join(pieces[i:i + words_per_chunk]) for i in range(0, len(pieces), words_per_chunk)]
+
+
+class ResponseCache:
+    """Thread-safe LRU + TTL store of final answers."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 6 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str, bool, str], Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0}
+
+    def _key(self, category: str, normalized_input: str, mobile: bool):
+        category = (category or "").strip().lower()
+        return (category, _normalize_question(normalized_input), bool(mobile), prompt_version(category, bool(mobile)))
+
+    def get(self, category: str, normalized_input: str, mobile: bool = False) -> Optional[str]:
+        if (category or "").strip().lower() not in CACHEABLE_CATEGORIES:
+            return None
+        key = self._key(category, normalized_input, mobile)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, answer = entry
+                if self.ttl_seconds <= 0 or now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return answer
+                del self._entries[key]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, category: str, normalized_input: str, answer: str, mobile: bool = False):
+        if (category or "").strip().lower() not in CACHEABLE_CATEGORIES or not (answer or "").strip():
+            return
+        key = self._key(category, normalized_input, mobile)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), answer)
+            self._entries.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        logger.info(f"Response cached for category '{key[0]}': '{key[1][:60]}'")
+
+    def flush(self) -> int:
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+            s["size"] = len(self._entries)
+        lookups = s["hits"] + s["misses"]
+        s["hit_rate"] = round(s["hits"] / lookups, 4) if lookups else 0.0
+        s["max_entries"] = self.max_entries
+        s["ttl_seconds"] = self.ttl_seconds
+        return s
+
+
+# Process-wide instance used by chat_handler / admin_router
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", str(6 * 3600))),
+)
@@ -1,6 +1,10 @@
+import os
 import pandas as pd
 from bm25_retrieval import run_bm25_search  # BM25 search function
-from retrieve_vdb_apollo import retrieve_from_vector_db  # Chroma vector DB retrieval function
+if os.getenv("APOLLO_VDB_BACKEND", "chroma").lower() == "numpy":
+    from retrieve_vdb_numpy import retrieve_from_vector_db  # exact search over the exported vector index
+else:
+    from retrieve_vdb_apollo import retrieve_from_vector_db  # Chroma vector DB retrieval function
 from retrieve_mysql import execute_query  # MySQL retrieval function
 
 def rank_results(bm25_results, vdb_results, mysql_results, bm25_weight=0.5, vdb_weight=0.3, mysql_weight=0.2):
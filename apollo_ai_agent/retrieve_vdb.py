@@ -1,5 +1,5 @@
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from embedding_service import get_embeddings
 import os
 import re
 import logging
@@ -20,7 +20,8 @@ if not os.path.exists(persist_directory):
 # embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
 # embeddings = HuggingFaceEmbeddings(model_name="multi-qa-mpnet-base-dot-v1")
 # embeddings = HuggingFaceEmbeddings(model_name="all-mpnet-base-v2")
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
+# Shared model; query embeddings are cached in memory and on disk (embedding_service.py)
+embeddings = get_embeddings("sentence-transformers/all-mpnet-base-v2")
 
 # Initialize the Chroma vector database
 try:
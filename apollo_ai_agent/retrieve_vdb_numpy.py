@@ -0,0 +1,118 @@
+from embedding_service import get_embeddings
+import os
+import logging
+import numpy as np
+
+from vector_index import VectorIndex, normalize_rows
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Exported index (python vector_index.py export --chroma ./chroma_tyres_db --out ./tyres_vector_index)
+index_directory = os.getenv("APOLLO_VECTOR_INDEX_DIR", "./tyres_vector_index")
+# Keep a float16 export as float16 in memory (half the RAM, slower search); default upcasts on load
+keep_float16 = os.getenv("APOLLO_VECTOR_INDEX_KEEP_FLOAT16", "false").lower() in ("1", "true", "yes")
+
+if not os.path.exists(index_directory):
+    raise FileNotFoundError(f"Vector index not found at {index_directory}. Export it with vector_index.py first.")
+
+# Same model as the Chroma store, so query vectors live in the same space as the exported rows.
+# Shared model; query embeddings are cached in memory and on disk (embedding_service.py)
+embeddings = get_embeddings("sentence-transformers/all-mpnet-base-v2")
+
+try:
+    vector_index = VectorIndex.load(index_directory, upcast=not keep_float16)
+    logging.info(
+        f"Vector index loaded from '{index_directory}': {len(vector_index)} x {vector_index.dim} "
+        f"{vector_index.matrix.dtype}."
+    )
+except Exception as e:
+    raise RuntimeError(f"Failed to load the vector index: {e}")
+
+
+def preprocess_query(query):
+    """
+    Preprocess the query before embedding (kept identical to retrieve_vdb_apollo).
+
+    Args:
+        query (str): The user query.
+
+    Returns:
+        str: Preprocessed query.
+    """
+    return query.strip()
+
+
+def _to_results(indices, similarities, min_score_threshold):
+    """
+    Build result dicts for one query. "score" is the squared L2 distance between the unit vectors
+    (2 - 2 * cosine), which is what Chroma returns for this collection, so the threshold and
+    rank_results behave exactly as with retrieve_vdb_apollo. "similarity" is the cosine.
+    """
+    results = []
+    for i, sim in zip(indices, similarities):
+        doc = vector_index.documents[i]
+        score = max(0.0, 2.0 - 2.0 * float(sim))
+        if score > min_score_threshold:
+            results.append({
+                "content": doc["content"],
+                "metadata": doc["metadata"],
+                "score": score,
+                "similarity": float(sim),
+            })
+    return results
+
+
+def retrieve_from_vector_db(query, top_k=5, min_score_threshold=0.1):
+    """
+    Retrieve relevant documents from the in-memory vector index.
+
+    Args:
+        query (str): User query.
+        top_k (int): Number of top results to retrieve.
+        min_score_threshold (float): Minimum score (Chroma distance) for relevant results.
+
+    Returns:
+        list: List of retrieved documents with metadata and scores.
+    """
+    try:
+        preprocessed_query = preprocess_query(query)
+        logging.info(f"Performing exact search for query: '{preprocessed_query}' with top_k={top_k}")
+        query_vector = np.asarray(embeddings.embed_query(preprocessed_query), dtype=np.float32)
+        indices, similarities = vector_index.search(query_vector, top_k)
+        filtered_results = _to_results(indices[0], similarities[0], min_score_threshold)
+
+        if not filtered_results:
+            logging.warning("No documents found matching the minimum score threshold.")
+
+        return filtered_results
+
+    except Exception as e:
+        logging.error(f"Error during vector search: {e}")
+        return []
+
+
+def retrieve_batch_from_vector_db(queries, top_k=5, min_score_threshold=0.1):
+    """
+    Batched retrieve_from_vector_db: cached embeddings (misses encoded in one call) and one matrix product.
+
+    Args:
+        queries (list): User queries.
+        top_k (int): Number of top results per query.
+        min_score_threshold (float): Minimum score (Chroma distance) for relevant results.
+
+    Returns:
+        list: One result list per query, in input order.
+    """
+    if not queries:
+        return []
+    try:
+        query_vectors = normalize_rows(embeddings.embed_queries([preprocess_query(q) for q in queries]))
+        indices, similarities = vector_index.search(query_vectors, top_k)
+        return [
+            _to_results(row_indices, row_sims, min_score_threshold)
+            for row_indices, row_sims in zip(indices, similarities)
+        ]
+    except Exception as e:
+        logging.error(f"Error during batched vector search: {e}")
+        return [[] for _ in queries]
@@ -1,7 +1,7 @@
 import os
 import re
 import logging
-from langchain_huggingface import HuggingFaceEmbeddings
+from embedding_service import get_embeddings
 from langchain_chroma import Chroma
 
 # Setup logging
@@ -15,7 +15,8 @@ if not os.path.exists(persist_directory):
     raise FileNotFoundError(f"Vector database not found at {persist_directory}. Please create it first.")
 
 # Initialize the embedding model
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
+# Shared model; query embeddings are cached in memory and on disk (embedding_service.py)
+embeddings = get_embeddings("sentence-transformers/all-mpnet-base-v2")
 
 # Initialize the Chroma vector database
 try:
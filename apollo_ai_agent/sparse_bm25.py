@@ -0,0 +1,191 @@
+# sparse_bm25.py — BM25 scoring as one sparse matrix product instead of rank_bm25's Python loops
+# BM25Okapi.get_scores walks every document in Python for every query token, and bm25_search then
+# sorted all N scores to keep 5. Here the per-(term, document) BM25 weight
+#     idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(d) / avgdl))
+# is precomputed once into a CSR term-document matrix (one row per term). A query is a sparse
+# vector of term counts (a repeated token counts twice, as in rank_bm25), so its scores are one
+# row-slice product. Top-k only looks at the documents that contain a query term (argpartition),
+# then pads with zero-score documents in index order, which is exactly what the old stable sort
+# returned. IDF (including the epsilon floor for negative IDFs), k1, b and avgdl follow BM25Okapi,
+# and from_okapi() converts a pickled BM25Okapi index unchanged.
+#   python sparse_bm25.py convert ./bm25_index       (bm25.pkl -> bm25_sparse.npz + bm25_vocab.json)
+
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+MATRIX_FILE = "bm25_sparse.npz"
+VOCAB_FILE = "bm25_vocab.json"
+
+
+class SparseBM25:
+    def __init__(self, term_doc: sparse.csr_matrix, vocab: Dict[str, int], params: Dict = None):
+        self.term_doc = term_doc  # (n_terms, n_docs) precomputed BM25 weights
+        self.vocab = vocab
+        self.params = params or {}
+
+    @property
+    def corpus_size(self) -> int:
+        return self.term_doc.shape[1]
+
+    # ---- building ----
+
+    @classmethod
+    def from_counts(cls, counts: sparse.spmatrix, vocab: Dict[str, int], k1: float = 1.5, b: float = 0.75,
+                    epsilon: float = 0.25, idf: np.ndarray = None, dtype=np.float32) -> "SparseBM25":
+        """
+        counts: (n_docs, n_terms) raw term frequencies. idf defaults to BM25Okapi's formula;
+        pass it explicitly to reuse an existing index's values.
+        """
+        counts = sparse.csr_matrix(counts, dtype=np.float64)
+        counts.sum_duplicates()
+        n_docs = counts.shape[0]
+        doc_len = np.asarray(counts.sum(axis=1)).ravel()
+        avgdl = doc_len.sum() / n_docs if n_docs else 0.0
+        if idf is None:
+            df = np.bincount(counts.indices, minlength=counts.shape[1]).astype(np.float64)
+            idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+            present = df > 0
+            average_idf = idf[present].mean() if present.any() else 0.0
+            idf[present & (idf < 0)] = epsilon * average_idf
+
+        tf = counts.data
+        norm = k1 * (1 - b + b * doc_len / avgdl) if avgdl else np.full(n_docs, k1 * (1 - b))
+        row_of_entry = np.repeat(np.arange(n_docs), np.diff(counts.indptr))
+        weights = counts.copy()
+        weights.data = idf[counts.indices] * tf * (k1 + 1) / (tf + norm[row_of_entry])
+        term_doc = sparse.csr_matrix(weights.T, dtype=dtype)
+        term_doc.eliminate_zeros()
+        return cls(term_doc, vocab, {"k1": k1, "b": b, "epsilon": epsilon, "avgdl": float(avgdl)})
+
+    @classmethod
+    def from_corpus(cls, corpus: Sequence[Sequence[str]], **kwargs) -> "SparseBM25":
+        """Build from tokenized documents, as BM25Okapi(corpus) would."""
+        vocab: Dict[str, int] = {}
+        rows, cols = [], []
+        for d, tokens in enumerate(corpus):
+            for token in tokens:
+                rows.append(d)
+                cols.append(vocab.setdefault(token, len(vocab)))
+        counts = sparse.coo_matrix(
+            (np.ones(len(rows)), (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))),
+            shape=(len(corpus), len(vocab)),
+        )
+        return cls.from_counts(counts, vocab, **kwargs)
+
+    @classmethod
+    def from_okapi(cls, bm25, dtype=np.float32) -> "SparseBM25":
+        """Convert a rank_bm25.BM25Okapi index, keeping its IDF values, k1, b and avgdl."""
+        vocab: Dict[str, int] = {}
+        rows, cols, data = [], [], []
+        for d, freqs in enumerate(bm25.doc_freqs):
+            for token, tf in freqs.items():
+                rows.append(d)
+                cols.append(vocab.setdefault(token, len(vocab)))
+                data.append(tf)
+        idf = np.zeros(len(vocab))
+        for token, col in vocab.items():
+            idf[col] = bm25.idf.get(token) or 0
+        counts = sparse.csr_matrix((data, (rows, cols)), shape=(bm25.corpus_size, len(vocab)))
+        engine = cls.from_counts(counts, vocab, k1=bm25.k1, b=bm25.b, epsilon=bm25.epsilon, idf=idf, dtype=dtype)
+        return engine
+
+    # ---- persistence ----
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        sparse.save_npz(os.path.join(directory, MATRIX_FILE), self.term_doc)
+        with open(os.path.join(directory, VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump({"vocab": self.vocab, "params": self.params}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str) -> "SparseBM25":
+        term_doc = sparse.load_npz(os.path.join(directory, MATRIX_FILE)).tocsr()
+        with open(os.path.join(directory, VOCAB_FILE), encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(term_doc, data["vocab"], data.get("params"))
+
+    @staticmethod
+    def saved(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, MATRIX_FILE)) and os.path.exists(os.path.join(directory, VOCAB_FILE))
+
+    # ---- scoring ----
+
+    def _query_matrix(self, queries: Sequence[Sequence[str]]) -> sparse.csr_matrix:
+        rows, cols = [], []
+        for q, tokens in enumerate(queries):
+            for token in tokens:
+                col = self.vocab.get(token)
+                if col is not None:
+                    rows.append(q)
+                    cols.append(col)
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=self.term_doc.dtype), (rows, cols)),
+            shape=(len(queries), len(self.vocab)),
+        )
+
+    def get_scores(self, query_tokens: Sequence[str]) -> np.ndarray:
+        """Dense scores for every document (same values as BM25Okapi.get_scores)."""
+        return np.asarray((self._query_matrix([query_tokens]) @ self.term_doc).todense()).ravel()
+
+    def _top_k_row(self, docs: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if len(docs) > k:
+            keep = np.argpartition(-scores, k - 1)[:k]
+            # argpartition may cut through a tie at the k-th score: take every doc tied with it
+            kth = scores[keep].min()
+            keep = np.flatnonzero(scores >= kth)
+            docs, scores = docs[keep], scores[keep]
+        order = np.lexsort((docs, -scores))[:k]  # score desc, then document index asc
+        docs, scores = docs[order], scores[order]
+        if len(docs) < k:
+            # Documents without any query term score 0; the old stable sort listed them by index
+            missing = k - len(docs)
+            taken = set(docs.tolist())
+            pad = [d for d in range(min(self.corpus_size, k + len(taken))) if d not in taken][:missing]
+            docs = np.concatenate([docs, np.asarray(pad, dtype=docs.dtype)])
+            scores = np.concatenate([scores, np.zeros(len(pad), dtype=scores.dtype)])
+        return docs, scores
+
+    def top_k_batch(self, queries: Sequence[Sequence[str]], k: int = 5) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """(doc indices, scores) per tokenized query, best first; one sparse product for the batch."""
+        k = min(k, self.corpus_size)
+        result = (self._query_matrix(queries) @ self.term_doc).tocsr()
+        out = []
+        for q in range(len(queries)):
+            start, end = result.indptr[q], result.indptr[q + 1]
+            docs = result.indices[start:end].astype(np.int64)
+            scores = result.data[start:end]
+            out.append(self._top_k_row(docs, scores, k))
+        return out
+
+    def top_k(self, query_tokens: Sequence[str], k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        return self.top_k_batch([query_tokens], k)[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python sparse_bm25.py", description="Sparse BM25 engine")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert", help="convert <dir>/bm25.pkl (BM25Okapi) into the sparse format")
+    convert.add_argument("index_dir", nargs="?", default="./bm25_index")
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        start = time.perf_counter()
+        with open(os.path.join(args.index_dir, "bm25.pkl"), "rb") as f:
+            okapi = pickle.load(f)
+        engine = SparseBM25.from_okapi(okapi)
+        engine.save(args.index_dir)
+        print(f"Converted {engine.corpus_size} documents x {len(engine.vocab)} terms "
+              f"({engine.term_doc.nnz} weights) in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
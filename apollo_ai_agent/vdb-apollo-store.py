@@ -6,12 +6,13 @@ import pickle
 import pandas as pd
 import nltk
 from langchain.schema import Document
-from langchain_huggingface import HuggingFaceEmbeddings
+from embedding_backends import make_embedding_model
 from langchain_chroma import Chroma
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 import numpy as np
+from vector_index import export_from_chroma
 
 # ────────────────────────────────────────────────────────────────────────────────
 # Download required NLTK resources if missing
@@ -102,7 +103,8 @@ csv_dir = "./data/"
 csv_pattern = os.path.join(csv_dir, "apolloTyres_combined_cleaned.csv")
 
 # Initialize embeddings
-embeddings = HuggingFaceEmbeddings(model_name="all-mpnet-base-v2")
+# EMBEDDING_BACKEND picks PyTorch or quantized ONNX; serve with the backend the store was built with
+embeddings = make_embedding_model("all-mpnet-base-v2")
 
 # Optionally reset
 reset_vector_database(persist_directory, embeddings)
@@ -138,6 +140,11 @@ vectordb = Chroma.from_documents(
 )
 print(f"Stored {len(documents)} documents in Chroma at '{persist_directory}'.")
 
+# Export the same vectors for the in-memory exact-search backend (APOLLO_VDB_BACKEND=numpy)
+vector_index_directory = "./tyres_vector_index"
+export_from_chroma(vectordb, vector_index_directory, model_name="all-mpnet-base-v2", source=persist_directory)
+print(f"Exported vector index to '{vector_index_directory}'.")
+
 # (Optional) Save the raw summaries for later inspection
 summary_file = os.path.join(persist_directory, "tyre_summaries.pkl")
 with open(summary_file, "wb") as f:
@@ -6,7 +6,7 @@ import shutil
 import fitz  # PyMuPDF for PDF processing
 from docx import Document as DocxDocument  # python-docx for Word files
 from langchain.schema import Document
-from langchain_huggingface import HuggingFaceEmbeddings
+from embedding_backends import make_embedding_model
 from langchain_chroma import Chroma
 
 # Function: Clean text
@@ -83,7 +83,8 @@ pdf_pattern = os.path.join(data_dir, "*.pdf")
 docx_pattern = os.path.join(data_dir, "*.docx")
 
 # Initialize Embeddings
-embeddings = HuggingFaceEmbeddings(model_name="all-mpnet-base-v2")
+# EMBEDDING_BACKEND picks PyTorch or quantized ONNX; serve with the backend the store was built with
+embeddings = make_embedding_model("all-mpnet-base-v2")
 
 # Reset Vector DB
 reset_vector_database(persist_directory, embeddings)
@@ -7,7 +7,7 @@ import json
 import pandas as pd
 import nltk
 from langchain.schema import Document
-from langchain_huggingface import HuggingFaceEmbeddings
+from embedding_backends import make_embedding_model
 from langchain_chroma import Chroma
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
@@ -112,7 +112,8 @@ csv_dir = "./data/"
 csv_pattern = os.path.join(csv_dir, "all*21Apr25*_context_json.csv")
 
 # Initialize Embeddings
-embeddings = HuggingFaceEmbeddings(model_name="all-mpnet-base-v2")
+# EMBEDDING_BACKEND picks PyTorch or quantized ONNX; serve with the backend the store was built with
+embeddings = make_embedding_model("all-mpnet-base-v2")
 
 # Reset Vector DB
 reset_vector_database(persist_directory, embeddings)
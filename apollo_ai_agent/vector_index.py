@@ -0,0 +1,160 @@
+# vector_index.py — exact nearest-neighbour search over an in-memory embedding matrix
+# The tyre catalog is a few thousand rows, so a brute-force scan over one contiguous matrix is
+# faster than Chroma's client -> SQLite metadata -> HNSW path, and exact. On disk an index is a
+# directory with:
+#   embeddings.npy   (n, dim) float32 or float16, rows L2-normalized; memory-mapped on load
+#   documents.json   [{"content": ..., "metadata": {...}}, ...] in row order
+#   index.json       model name, dtype, row count, dimension, source
+# Build one from the Chroma store written by vdb-apollo-store.py (same vectors, so same ranking):
+#   python vector_index.py export --chroma ./chroma_tyres_db --out ./tyres_vector_index [--dtype float16]
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+EMBEDDINGS_FILE = "embeddings.npy"
+DOCUMENTS_FILE = "documents.json"
+INDEX_FILE = "index.json"
+DTYPES = {"float32": np.float32, "float16": np.float16}
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    """
+    Cosine top-k over a row-normalized matrix. A float16 matrix kept as float16 (load(upcast=False))
+    is scored in float32 blocks of BLOCK_ROWS rows, so the float32 copy never exceeds one block;
+    that halves resident memory but converts the whole matrix on every search.
+    """
+
+    BLOCK_ROWS = 65536
+
+    def __init__(self, matrix: np.ndarray, documents: List[Dict], info: Optional[Dict] = None):
+        if len(matrix) != len(documents):
+            raise ValueError(f"{len(matrix)} vectors but {len(documents)} documents")
+        self.matrix = matrix
+        self.documents = documents
+        self.info = info or {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True, upcast: bool = True) -> "VectorIndex":
+        """
+        float32 files are memory-mapped (pages shared by every worker on the box). float16 files
+        are upcast to float32 once here unless upcast=False: half the disk, same search speed.
+        """
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            info = json.load(f)
+        with open(os.path.join(directory, DOCUMENTS_FILE), encoding="utf-8") as f:
+            documents = json.load(f)
+        matrix = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r" if mmap else None)
+        if upcast and matrix.dtype != np.float32:
+            matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        return cls(matrix, documents, info)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, EMBEDDINGS_FILE), np.ascontiguousarray(self.matrix))
+        with open(os.path.join(directory, DOCUMENTS_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.documents, f, ensure_ascii=False)
+        info = dict(self.info, count=len(self), dim=self.dim, dtype=str(self.matrix.dtype))
+        with open(os.path.join(directory, INDEX_FILE), "w") as f:
+            json.dump(info, f, indent=2)
+
+    @classmethod
+    def build(cls, vectors, documents: List[Dict], dtype: str = "float32", **info) -> "VectorIndex":
+        matrix = np.ascontiguousarray(normalize_rows(vectors).astype(DTYPES[dtype]))
+        return cls(matrix, documents, info)
+
+    def similarities(self, queries: np.ndarray) -> np.ndarray:
+        """(n_queries, n_rows) cosine similarities; queries must already be normalized float32."""
+        if self.matrix.dtype == np.float32:
+            return queries @ self.matrix.T
+        out = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), self.BLOCK_ROWS):
+            block = np.asarray(self.matrix[start:start + self.BLOCK_ROWS], dtype=np.float32)
+            out[:, start:start + len(block)] = queries @ block.T
+        return out
+
+    def search(self, query_vectors, top_k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k rows for one query vector or a batch. Returns (indices, similarities), each of shape
+        (n_queries, k), best first.
+        """
+        queries = normalize_rows(query_vectors)
+        k = min(top_k, len(self))
+        if k <= 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        sims = self.similarities(queries)
+        if k < len(self):
+            # Unordered top k per row, then sort only those k
+            part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        else:
+            part = np.broadcast_to(np.arange(len(self)), sims.shape)
+        part_sims = np.take_along_axis(sims, part, axis=1)
+        order = np.argsort(-part_sims, axis=1, kind="stable")
+        return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_sims, order, axis=1)
+
+
+def export_from_chroma(vector_db, out_dir: str, dtype: str = "float32", model_name: str = None,
+                       source: str = None) -> VectorIndex:
+    """Copy the vectors, texts and metadata of a langchain Chroma store into a VectorIndex."""
+    data = vector_db.get(include=["embeddings", "documents", "metadatas"])
+    documents = [
+        {"content": text, "metadata": meta or {}}
+        for text, meta in zip(data["documents"], data["metadatas"])
+    ]
+    index = VectorIndex.build(np.asarray(data["embeddings"]), documents, dtype=dtype,
+                              model=model_name, source=source)
+    index.save(out_dir)
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python vector_index.py", description="In-memory vector index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="export a Chroma store to an index directory")
+    export.add_argument("--chroma", default="./chroma_tyres_db")
+    export.add_argument("--out", default="./tyres_vector_index")
+    export.add_argument("--dtype", choices=sorted(DTYPES), default="float32")
+    export.add_argument("--model", default="sentence-transformers/all-mpnet-base-v2")
+    info = sub.add_parser("info", help="describe an index directory")
+    info.add_argument("directory", nargs="?", default="./tyres_vector_index")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        from langchain_chroma import Chroma
+
+        start = time.perf_counter()
+        index = export_from_chroma(Chroma(persist_directory=args.chroma), args.out, args.dtype,
+                                   model_name=args.model, source=args.chroma)
+        size_mb = index.matrix.nbytes / 1e6
+        print(f"Exported {len(index)} x {index.dim} {args.dtype} vectors ({size_mb:.1f} MB) "
+              f"to {args.out} in {time.perf_counter() - start:.2f}s")
+    elif args.command == "info":
+        index = VectorIndex.load(args.directory, upcast=False)
+        print(json.dumps(dict(index.info, matrix_mb=round(index.matrix.nbytes / 1e6, 2)), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
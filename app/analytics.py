@@ -65,99 +65,132 @@ def execute_query(query: str, params: tuple = None, fetch: bool = True, connecti
         if close_connection and connection and connection.is_connected():
             connection.close()
 
-def record_user_event(user_id: str, session_id: str, event_type: str, event_data: Dict = None):
-    if not user_id:
-        print("Warning: No user_id provided for analytics event")
-        return
+def upsert_user(connection, user_id: str, timestamp: str):
+    """Create the users row on first sight, otherwise bump last_active_at."""
+    # Check if user exists
+    user = execute_query(
+        "SELECT * FROM users WHERE user_id = %s",
+        (user_id,),
+        fetch=True,
+        connection=connection
+    )
+
+    if not user:
+        print(f"Creating new user: {user_id}")
+        # Create new user with all counters initialized to 0
+        execute_query(
+            """
+            INSERT INTO users 
+              (user_id, first_seen_at, last_active_at, total_sessions, total_messages, total_duration, total_conversations, is_active)
+            VALUES (%s, %s, %s, 0, 0, 0, 0, TRUE)
+            """,
+            (user_id, timestamp, timestamp),
+            fetch=False,
+            connection=connection
+        )
+    else:
+        # Always update last_active_at for any event
+        execute_query(
+            """
+            UPDATE users 
+            SET last_active_at = %s
+            WHERE user_id = %s
+            """,
+            (timestamp, user_id),
+            fetch=False,
+            connection=connection
+        )
 
-    timestamp = datetime.now().isoformat()
-    page_url = event_data.get('page_url') if event_data else None
-    duration = event_data.get('duration') if event_data else 0
+def apply_user_event(connection, user_id: str, session_id: str, event_type: str, event_data: Dict = None,
+                     timestamp: str = None, ensure_user: bool = True) -> Optional[str]:
+    """
+    Apply one analytics event on `connection` without committing, so several events can share a
+    transaction. `timestamp` defaults to now; `ensure_user=False` skips the users upsert when the
+    caller already did it. Returns the conversation_id for question_asked / bot_response.
+    """
+    timestamp = timestamp or datetime.now().isoformat()
+    event_data = event_data or {}
+    page_url = event_data.get('page_url')
+    conversation_id = None
+
+    if ensure_user:
+        upsert_user(connection, user_id, timestamp)
+
+    # Update user stats based on event type
+    if event_type == "session_start":
+        print(f"Recording session start for user {user_id}")
+        # Only update user stats, do NOT create session or conversation here
+        execute_query(
+            """
+            UPDATE users 
+              SET total_sessions = total_sessions + 1,
+                  is_active = TRUE,
+                  last_page_url = %s
+            WHERE user_id = %s
+            """,
+            (page_url, user_id),
+            fetch=False,
+            connection=connection
+        )
 
-    connection = None
-    try:
-        print(f"Recording analytics event: {event_type} for user {user_id} session {session_id}")
-        connection = get_db_connection()
-        connection.autocommit = False  # Enable transaction mode
+    elif event_type == "question_asked":
+        print(f"Recording question for user {user_id}: {event_data.get('question', '')[:50]}...")
         
-        # Check if user exists
-        user = execute_query(
-            "SELECT * FROM users WHERE user_id = %s",
-            (user_id,),
+        # Check if session exists
+        session = execute_query(
+            "SELECT * FROM sessions WHERE session_id = %s",
+            (session_id,),
             fetch=True,
             connection=connection
         )
-
-        if not user:
-            print(f"Creating new user: {user_id}")
-            # Create new user with all counters initialized to 0
+        
+        conversation_id = None
+        if not session:
+            print(f"Creating new session: {session_id}")
+            # Create new session with start_time = event_data['timestamp'] if available
+            session_start_time = event_data.get('timestamp') if event_data and event_data.get('timestamp') else timestamp
             execute_query(
                 """
-                INSERT INTO users 
-                  (user_id, first_seen_at, last_active_at, total_sessions, total_messages, total_duration, total_conversations, is_active)
-                VALUES (%s, %s, %s, 0, 0, 0, 0, TRUE)
+                INSERT INTO sessions 
+                  (session_id, user_id, start_time, page_url, message_count, status) 
+                VALUES (%s, %s, %s, %s, 0, 'active')
                 """,
-                (user_id, timestamp, timestamp),
+                (session_id, user_id, session_start_time, page_url),
                 fetch=False,
                 connection=connection
             )
-        else:
-            # Always update last_active_at for any event
+            # Create new conversation for this session
+            conversation_id = str(uuid.uuid4())
             execute_query(
                 """
-                UPDATE users 
-                SET last_active_at = %s
-                WHERE user_id = %s
+                INSERT INTO conversations 
+                  (conversation_id, session_id, user_id, start_time, status)
+                VALUES (%s, %s, %s, %s, 'active')
                 """,
-                (timestamp, user_id),
+                (conversation_id, session_id, user_id, session_start_time),
                 fetch=False,
                 connection=connection
             )
-
-        # Update user stats based on event type
-        if event_type == "session_start":
-            print(f"Recording session start for user {user_id}")
-            # Only update user stats, do NOT create session or conversation here
-            execute_query(
+            print(f"Created new conversation: {conversation_id}")
+        else:
+            # Get the active conversation
+            conversation = execute_query(
                 """
-                UPDATE users 
-                  SET total_sessions = total_sessions + 1,
-                      is_active = TRUE,
-                      last_page_url = %s
-                WHERE user_id = %s
+                SELECT conversation_id 
+                FROM conversations 
+                WHERE session_id = %s AND status = 'active'
+                ORDER BY start_time DESC
+                LIMIT 1
                 """,
-                (page_url, user_id),
-                fetch=False,
-                connection=connection
-            )
-
-        elif event_type == "question_asked":
-            print(f"Recording question for user {user_id}: {event_data.get('question', '')[:50]}...")
-            
-            # Check if session exists
-            session = execute_query(
-                "SELECT * FROM sessions WHERE session_id = %s",
                 (session_id,),
                 fetch=True,
                 connection=connection
             )
-            
-            conversation_id = None
-            if not session:
-                print(f"Creating new session: {session_id}")
-                # Create new session with start_time = event_data['timestamp'] if available
-                session_start_time = event_data.get('timestamp') if event_data and event_data.get('timestamp') else timestamp
-                execute_query(
-                    """
-                    INSERT INTO sessions 
-                      (session_id, user_id, start_time, page_url, message_count, status) 
-                    VALUES (%s, %s, %s, %s, 0, 'active')
-                    """,
-                    (session_id, user_id, session_start_time, page_url),
-                    fetch=False,
-                    connection=connection
-                )
-                # Create new conversation for this session
+            if conversation:
+                conversation_id = conversation[0]['conversation_id']
+                print(f"Using existing conversation: {conversation_id}")
+            else:
+                # Create new conversation if none exists
                 conversation_id = str(uuid.uuid4())
                 execute_query(
                     """
@@ -165,72 +198,44 @@ def record_user_event(user_id: str, session_id: str, event_type: str, event_data
                       (conversation_id, session_id, user_id, start_time, status)
                     VALUES (%s, %s, %s, %s, 'active')
                     """,
-                    (conversation_id, session_id, user_id, session_start_time),
+                    (conversation_id, session_id, user_id, timestamp),
                     fetch=False,
                     connection=connection
                 )
                 print(f"Created new conversation: {conversation_id}")
-            else:
-                # Get the active conversation
-                conversation = execute_query(
-                    """
-                    SELECT conversation_id 
-                    FROM conversations 
-                    WHERE session_id = %s AND status = 'active'
-                    ORDER BY start_time DESC
-                    LIMIT 1
-                    """,
-                    (session_id,),
-                    fetch=True,
-                    connection=connection
-                )
-                if conversation:
-                    conversation_id = conversation[0]['conversation_id']
-                    print(f"Using existing conversation: {conversation_id}")
-                else:
-                    # Create new conversation if none exists
-                    conversation_id = str(uuid.uuid4())
-                    execute_query(
-                        """
-                        INSERT INTO conversations 
-                          (conversation_id, session_id, user_id, start_time, status)
-                        VALUES (%s, %s, %s, %s, 'active')
-                        """,
-                        (conversation_id, session_id, user_id, timestamp),
-                        fetch=False,
-                        connection=connection
-                    )
-                    print(f"Created new conversation: {conversation_id}")
+        
+        # Insert the user's question
+        if conversation_id:
+            message_id = str(uuid.uuid4())
+            execute_query(
+                """
+                INSERT INTO messages 
+                (message_id, conversation_id, user_id, message_type, content, timestamp)
+                VALUES (%s, %s, %s, 'user', %s, %s)
+                """,
+                (message_id, conversation_id, user_id, event_data.get('question', ''), timestamp),
+                fetch=False,
+                connection=connection
+            )
+            print(f"Inserted user message: {message_id}")
             
-            # Insert the user's question
-            if conversation_id:
-                message_id = str(uuid.uuid4())
-                execute_query(
-                    """
-                    INSERT INTO messages 
-                    (message_id, conversation_id, user_id, message_type, content, timestamp)
-                    VALUES (%s, %s, %s, 'user', %s, %s)
-                    """,
-                    (message_id, conversation_id, user_id, event_data.get('question', ''), timestamp),
-                    fetch=False,
-                    connection=connection
+            # Update user message count
+            execute_query(
+                """
+                UPDATE users 
+                SET total_messages = total_messages + 1
+                WHERE user_id = %s
+                """,
+                (user_id,),
+                fetch=False,
+                connection=connection
                 )
-                print(f"Inserted user message: {message_id}")
-                
-                # Update user message count
-                execute_query(
-                    """
-                    UPDATE users 
-                    SET total_messages = total_messages + 1
-                    WHERE user_id = %s
-                    """,
-                    (user_id,),
-                    fetch=False,
-                    connection=connection
-                    )
 
-        elif event_type == "bot_response":
-            print(f"Recording bot response for user {user_id}")
+    elif event_type == "bot_response":
+        print(f"Recording bot response for user {user_id}")
+        # Same-transaction callers already know the conversation from question_asked
+        conversation_id = event_data.get("conversation_id")
+        if not conversation_id:
             # Find the active conversation for this session
             conv = execute_query(
                 """
@@ -245,98 +250,114 @@ def record_user_event(user_id: str, session_id: str, event_type: str, event_data
                 fetch=True,
                 connection=connection
             )
-            if conv:
-                conversation_id = conv[0]["conversation_id"]
-                # Insert the bot's response
-                message_id = str(uuid.uuid4())
-                execute_query(
-                    """
-                    INSERT INTO messages 
-                      (message_id, conversation_id, user_id, message_type, content, timestamp)
-                    VALUES (%s, %s, %s, 'bot', %s, %s)
-                    """,
-                    (message_id, conversation_id, user_id, event_data.get("response", ""), timestamp),
-                    fetch=False,
-                    connection=connection
-                )
-                print(f"Inserted bot message: {message_id}")
-            else:
-                print(f"Warning: No active conversation found for session {session_id}")
+            conversation_id = conv[0]["conversation_id"] if conv else None
+        if conversation_id:
+            # Insert the bot's response
+            message_id = str(uuid.uuid4())
+            execute_query(
+                """
+                INSERT INTO messages 
+                  (message_id, conversation_id, user_id, message_type, content, timestamp, response_time, ttft)
+                VALUES (%s, %s, %s, 'bot', %s, %s, %s, %s)
+                """,
+                (message_id, conversation_id, user_id, event_data.get("response", ""), timestamp,
+                 event_data.get("response_time"), event_data.get("ttft")),
+                fetch=False,
+                connection=connection
+            )
+            print(f"Inserted bot message: {message_id}")
+        else:
+            print(f"Warning: No active conversation found for session {session_id}")
 
-        elif event_type == "session_end":
-            print(f"Recording session end for user {user_id}")
-            # 1) Find the active conversation
-            conv = execute_query(
+    elif event_type == "session_end":
+        print(f"Recording session end for user {user_id}")
+        # 1) Find the active conversation
+        conv = execute_query(
+            """
+            SELECT conversation_id
+              FROM conversations
+             WHERE session_id = %s
+               AND status = 'active'
+             ORDER BY start_time DESC
+             LIMIT 1
+            """,
+            (session_id,),
+            fetch=True,
+            connection=connection
+        )
+        if conv:
+            conversation_id = conv[0]["conversation_id"]
+            # 2) Compute the duration in seconds, set conversation to "completed"
+            execute_query(
                 """
-                SELECT conversation_id
+                UPDATE conversations
+                  SET end_time = %s,
+                      status   = 'completed',
+                      duration = TIMESTAMPDIFF(SECOND, start_time, %s)
+                 WHERE conversation_id = %s
+                """,
+                (timestamp, timestamp, conversation_id),
+                fetch=False,
+                connection=connection
+            )
+            # 3) Retrieve that duration we just computed
+            result = execute_query(
+                """
+                SELECT duration
                   FROM conversations
-                 WHERE session_id = %s
-                   AND status = 'active'
-                 ORDER BY start_time DESC
-                 LIMIT 1
+                 WHERE conversation_id = %s
                 """,
-                (session_id,),
+                (conversation_id,),
                 fetch=True,
                 connection=connection
             )
-            if conv:
-                conversation_id = conv[0]["conversation_id"]
-                # 2) Compute the duration in seconds, set conversation to "completed"
-                execute_query(
-                    """
-                    UPDATE conversations
-                      SET end_time = %s,
-                          status   = 'completed',
-                          duration = TIMESTAMPDIFF(SECOND, start_time, %s)
-                     WHERE conversation_id = %s
-                    """,
-                    (timestamp, timestamp, conversation_id),
-                    fetch=False,
-                    connection=connection
-                )
-                # 3) Retrieve that duration we just computed
-                result = execute_query(
-                    """
-                    SELECT duration
-                      FROM conversations
-                     WHERE conversation_id = %s
-                    """,
-                    (conversation_id,),
-                    fetch=True,
-                    connection=connection
-                )
-                if result:
-                    session_duration = result[0]["duration"] or 0
-                else:
-                    session_duration = 0
-                # 4) Update the user row:
-                execute_query(
-                    """
-                    UPDATE users
-                      SET is_active = FALSE,
-                          last_active_at = %s,
-                          total_duration = total_duration + %s,
-                          total_conversations = total_conversations + 1
-                    WHERE user_id = %s
-                    """,
-                    (timestamp, session_duration, user_id),
-                    fetch=False,
-                    connection=connection
-                )
-
-        elif event_type == "user_identified":
+            if result:
+                session_duration = result[0]["duration"] or 0
+            else:
+                session_duration = 0
+            # 4) Update the user row:
             execute_query(
                 """
-                UPDATE users 
-                SET last_active_at = %s,
-                    user_type = 'returning'
+                UPDATE users
+                  SET is_active = FALSE,
+                      last_active_at = %s,
+                      total_duration = total_duration + %s,
+                      total_conversations = total_conversations + 1
                 WHERE user_id = %s
                 """,
-                (timestamp, user_id),
+                (timestamp, session_duration, user_id),
                 fetch=False,
                 connection=connection
             )
 
+    elif event_type == "user_identified":
+        execute_query(
+            """
+            UPDATE users 
+            SET last_active_at = %s,
+                user_type = 'returning'
+            WHERE user_id = %s
+            """,
+            (timestamp, user_id),
+            fetch=False,
+            connection=connection
+        )
+
+    return conversation_id
+
+def record_user_event(user_id: str, session_id: str, event_type: str, event_data: Dict = None):
+    """Record one event in its own connection and transaction (see analytics_writer for the per-turn path)."""
+    if not user_id:
+        print("Warning: No user_id provided for analytics event")
+        return
+
+    connection = None
+    try:
+        print(f"Recording analytics event: {event_type} for user {user_id} session {session_id}")
+        connection = get_db_connection()
+        connection.autocommit = False  # Enable transaction mode
+        apply_user_event(connection, user_id, session_id, event_type, event_data)
+
         # Commit the transaction
         if connection:
             connection.commit()
@@ -0,0 +1,292 @@
+# analytics_writer.py — write-behind analytics for the websocket chat loop
+# The websocket handler used to open a MySQL connection per write (page URL, user id, location,
+# question, conversation lookup, bot response, message count): 6-9 connections and round trips
+# per message, all on the event loop before or after the answer. It now builds one TurnRecord per
+# question/answer and enqueues it; a single background task applies each record in ONE transaction
+# on a long-lived connection, off the request path. Records are applied in arrival order, so
+# session_start -> turns -> session_end stay ordered per session.
+
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Optional
+
+from mysql.connector import Error
+
+from . import analytics
+
+
+class TurnRecord:
+    """Everything one question/answer turn writes to the analytics tables."""
+
+    __slots__ = (
+        "user_id", "session_id", "question", "asked_at", "answer", "answered_at",
+        "response_time", "ttft", "page_url", "identified_from", "location",
+    )
+
+    def __init__(self, user_id: str, session_id: str, question: str, asked_at: datetime,
+                 page_url: str = None, identified_from: str = None, location: dict = None):
+        self.user_id = user_id
+        self.session_id = session_id
+        self.question = question
+        self.asked_at = asked_at
+        self.page_url = page_url
+        self.identified_from = identified_from  # previous (anonymous) user_id when the client identified itself
+        self.location = location
+        self.answer = None  # stays None when answering failed: the question is still recorded
+        self.answered_at = None
+        self.response_time = None
+        self.ttft = None
+
+    def answered(self, answer: str, response_time: float, ttft: float = None):
+        self.answer = answer
+        self.answered_at = datetime.now()
+        self.response_time = response_time
+        self.ttft = ttft
+
+
+def _update_session(connection, session_id: str, page_url: str = None, user_id: str = None,
+                    location: dict = None, answered_at: datetime = None):
+    """All changed session columns in one statement."""
+    sets, params = [], []
+    if page_url:
+        sets.append("page_url = %s")
+        params.append(page_url)
+    if user_id:
+        sets.append("user_id = %s")
+        params.append(user_id)
+    if location:
+        sets.append("location_data = %s")
+        params.append(json.dumps(location))
+    if answered_at is not None:
+        # Count each answered interaction as 1
+        sets.append("message_count = message_count + 1")
+        sets.append("last_message_time = %s")
+        params.append(answered_at.isoformat())
+    if sets:
+        analytics.execute_query(
+            f"UPDATE sessions SET {', '.join(sets)} WHERE session_id = %s",
+            tuple(params) + (session_id,),
+            fetch=False,
+            connection=connection
+        )
+
+
+def _apply_identified(connection, user_id: str, session_id: str, previous_id: str, timestamp: str):
+    analytics.apply_user_event(
+        connection, user_id, session_id, "user_identified", {"previous_id": previous_id}, timestamp,
+        ensure_user=False
+    )
+
+
+def apply_turn(connection, turn: TurnRecord):
+    """Apply one turn on `connection` (caller commits): user upsert once, one conversation lookup."""
+    asked = turn.asked_at.isoformat()
+    analytics.upsert_user(connection, turn.user_id, asked)
+    if turn.identified_from:
+        _apply_identified(connection, turn.user_id, turn.session_id, turn.identified_from, asked)
+    # Creates the session and conversation on the first turn, so the UPDATE below always has a row
+    conversation_id = analytics.apply_user_event(
+        connection, turn.user_id, turn.session_id, "question_asked",
+        {"question": turn.question, "timestamp": asked, "page_url": turn.page_url}, asked, ensure_user=False
+    )
+    if turn.answer is not None:
+        analytics.apply_user_event(
+            connection, turn.user_id, turn.session_id, "bot_response",
+            {"response": turn.answer, "conversation_id": conversation_id,
+             "response_time": turn.response_time, "ttft": turn.ttft},
+            turn.answered_at.isoformat(), ensure_user=False
+        )
+    _update_session(
+        connection, turn.session_id,
+        page_url=turn.page_url,
+        user_id=turn.user_id if turn.identified_from else None,
+        location=turn.location,
+        answered_at=turn.answered_at if turn.answer is not None else None
+    )
+
+
+def apply_session_update(connection, user_id: str, session_id: str, page_url: str, identified_from: str,
+                         timestamp: str):
+    """Page URL / identity change sent without a question, applied right away as before."""
+    if identified_from:
+        analytics.upsert_user(connection, user_id, timestamp)
+        _apply_identified(connection, user_id, session_id, identified_from, timestamp)
+    _update_session(connection, session_id, page_url=page_url, user_id=user_id if identified_from else None)
+
+
+def apply_session_end(connection, user_id: str, session_id: str, ended_at: datetime, duration: float,
+                      total_messages: int):
+    analytics.execute_query(
+        """
+        UPDATE sessions
+        SET end_time = %s,
+            duration = %s,
+            status = 'completed'
+        WHERE session_id = %s
+        """,
+        (ended_at.isoformat(), duration, session_id),
+        fetch=False,
+        connection=connection
+    )
+    analytics.apply_user_event(
+        connection, user_id, session_id, "session_end",
+        {"timestamp": ended_at.isoformat(), "total_messages": total_messages, "duration": duration},
+        ended_at.isoformat()
+    )
+
+
+class AnalyticsWriter:
+    def __init__(self, max_queue: int = 10000, max_retries: int = 3, base_backoff: float = 0.5,
+                 max_backoff: float = 10.0):
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._connection = None  # only touched by the consumer, one job at a time
+        self._stats = {
+            "enqueued": 0, "applied": 0, "retries": 0, "failed": 0, "dropped": 0, "connections_opened": 0,
+        }
+
+    # ---- lifecycle ----
+
+    def start(self):
+        """Start the background consumer on the running event loop (idempotent)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        print(f"Analytics writer started (max_queue={self.max_queue})")
+
+    async def stop(self, timeout: float = 30.0):
+        """Apply everything still queued, then stop the consumer and close the connection."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"Analytics writer did not drain within {timeout}s; {self._queue.qsize()} records lost")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await asyncio.to_thread(self._close)
+        print(f"Analytics writer stopped: {self.stats()}")
+
+    # ---- producer side (never blocks, never touches MySQL) ----
+
+    def _put(self, job: tuple) -> bool:
+        if self._task is None or self._task.done():
+            self.start()
+        try:
+            self._queue.put_nowait(job)
+            self._stats["enqueued"] += 1
+            return True
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+            print(f"Analytics queue full ({self.max_queue}); dropped {job[0]} record")
+            return False
+
+    def enqueue_turn(self, turn: TurnRecord) -> bool:
+        return self._put(("turn", turn))
+
+    def enqueue_event(self, user_id: str, session_id: str, event_type: str, event_data: dict = None) -> bool:
+        """Single event (session_start, error) applied with analytics.apply_user_event."""
+        if not user_id:
+            return False
+        return self._put(("event", (user_id, session_id, event_type, event_data or {}, datetime.now().isoformat())))
+
+    def enqueue_session_update(self, user_id: str, session_id: str, page_url: str = None,
+                               identified_from: str = None) -> bool:
+        """Session page URL and/or user id change that did not come with a question."""
+        if not page_url and not identified_from:
+            return False
+        return self._put(("session_update", (user_id, session_id, page_url, identified_from, datetime.now().isoformat())))
+
+    def enqueue_session_end(self, user_id: str, session_id: str, ended_at: datetime, duration: float,
+                            total_messages: int) -> bool:
+        return self._put(("session_end", (user_id, session_id, ended_at, duration, total_messages)))
+
+    # ---- consumer side ----
+
+    def _get_connection(self):
+        if self._connection is not None:
+            try:
+                if self._connection.is_connected():
+                    return self._connection
+            except Error:
+                pass
+            self._close()
+        self._connection = analytics.get_db_connection()
+        self._connection.autocommit = False
+        self._stats["connections_opened"] += 1
+        return self._connection
+
+    def _close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Error:
+                pass
+            self._connection = None
+
+    def _apply(self, kind: str, payload):
+        """Apply one queued record in one transaction (runs in a worker thread)."""
+        connection = self._get_connection()
+        try:
+            if kind == "turn":
+                apply_turn(connection, payload)
+            elif kind == "session_update":
+                apply_session_update(connection, *payload)
+            elif kind == "session_end":
+                apply_session_end(connection, *payload)
+            else:
+                user_id, session_id, event_type, event_data, timestamp = payload
+                analytics.apply_user_event(connection, user_id, session_id, event_type, event_data, timestamp)
+            connection.commit()
+        except Exception:
+            try:
+                connection.rollback()
+            except Error:
+                # Connection is gone; the retry opens a fresh one
+                self._close()
+            raise
+
+    async def _run(self):
+        while True:
+            kind, payload = await self._queue.get()
+            try:
+                for attempt in range(self.max_retries + 1):
+                    try:
+                        await asyncio.to_thread(self._apply, kind, payload)
+                        self._stats["applied"] += 1
+                        break
+                    except Exception as e:
+                        if attempt == self.max_retries:
+                            self._stats["failed"] += 1
+                            print(f"Analytics {kind} record failed after {attempt + 1} attempts: {e}")
+                            break
+                        self._stats["retries"] += 1
+                        delay = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+                        print(f"Analytics {kind} write failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+                        await asyncio.sleep(delay)
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        s = dict(self._stats)
+        s["queued"] = self._queue.qsize() if self._queue is not None else 0
+        s["running"] = self._task is not None and not self._task.done()
+        return s
+
+
+# Process-wide writer used by the chat router (started on app startup, drained on shutdown)
+analytics_writer = AnalyticsWriter(
+    max_queue=int(os.getenv("ANALYTICS_WRITER_MAX_QUEUE", "10000")),
+    max_retries=int(os.getenv("ANALYTICS_WRITER_RETRIES", "3")),
+)
@@ -14,5 +14,7 @@ class Settings:
     DB_USER = os.getenv("DB_USER", "nirbhay")
     DB_PASSWORD = os.getenv("DB_PASSWORD", "Nirbhay@123")
     DB_NAME = os.getenv("DB_NAME", "chatbot_analytics")
+    # "condense": LLM rewrites follow-ups before retrieval (two calls); "single": local query, one call
+    RAG_MODE = os.getenv("RAG_MODE", "condense")
 
 settings = Settings()
\ No newline at end of file
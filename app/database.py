@@ -92,4 +92,32 @@ def update_sessions_table():
             
         print("Sessions table schema updated successfully")
     except Error as e:
-        print(f"Error updating sessions table: {e}")
\ No newline at end of file
+        print(f"Error updating sessions table: {e}")
+
+def update_messages_table():
+    try:
+        columns = execute_query("""
+            SELECT COLUMN_NAME 
+            FROM INFORMATION_SCHEMA.COLUMNS 
+            WHERE TABLE_NAME = 'messages' 
+            AND TABLE_SCHEMA = DATABASE()
+        """)
+        existing_columns = [col['COLUMN_NAME'] for col in columns]
+
+        # Seconds from question to full answer, set on bot messages
+        if 'response_time' not in existing_columns:
+            execute_query("""
+                ALTER TABLE messages
+                ADD COLUMN response_time FLOAT NULL
+            """, fetch=False)
+
+        # Seconds from question to the first streamed token, set on bot messages
+        if 'ttft' not in existing_columns:
+            execute_query("""
+                ALTER TABLE messages
+                ADD COLUMN ttft FLOAT NULL
+            """, fetch=False)
+
+        print("Messages table schema updated successfully")
+    except Error as e:
+        print(f"Error updating messages table: {e}")
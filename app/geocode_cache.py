@@ -0,0 +1,203 @@
+# geocode_cache.py — persistent reverse-geocoding cache keyed on quantized coordinates
+# Replaces geocoding_cache.json, which was rewritten in full on every miss (not atomic, not safe
+# with several workers) and keyed on 6-decimal coordinates (two users in one building rarely
+# shared an entry). Entries are keyed by geohash cell (GEOCODE_CACHE_PRECISION, default 6 ≈
+# 1.2 x 0.6 km) in a WAL-mode SQLite file shared by every worker on the box:
+#   - each write is one atomic statement; readers never see a half-written cache
+#   - at most max_entries rows; the least recently used ones are evicted
+#   - "no city found" results are cached too, but expire after negative_ttl so they are retried
+#   - hit/miss counters for the hit rate
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(latitude: float, longitude: float, precision: int = 6) -> str:
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    chars, bits, ch, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if longitude >= mid:
+                ch, lng_lo = (ch << 1) | 1, mid
+            else:
+                ch, lng_hi = ch << 1, mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                ch, lat_lo = (ch << 1) | 1, mid
+            else:
+                ch, lat_hi = ch << 1, mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(chars)
+
+
+class GeocodeCache:
+    """
+    WAL-mode SQLite file; each thread gets its own connection. Hits refresh last_used at most once
+    per TOUCH_INTERVAL so a hot cell does not turn every read into a write.
+    """
+
+    TOUCH_INTERVAL = 60.0
+    EVICT_EVERY = 100  # writes between size checks
+
+    def __init__(self, path: str = "geocoding_cache.db", precision: int = 6, max_entries: int = 50000,
+                 negative_ttl: float = 24 * 3600):
+        self.path = path
+        self.precision = precision
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "expired": 0, "writes": 0, "evictions": 0}
+        self._init_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocode_cache (
+                cell TEXT PRIMARY KEY,
+                city TEXT,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_geocode_cache_last_used ON geocode_cache (last_used)")
+
+    def _count(self, counter: str, n: int = 1):
+        with self._lock:
+            self._stats[counter] += n
+
+    def key(self, latitude: float, longitude: float) -> str:
+        return geohash(latitude, longitude, self.precision)
+
+    def get(self, latitude: float, longitude: float) -> Tuple[bool, Optional[str]]:
+        """(found, city). city is None for a cached negative result; found is False on a miss."""
+        cell = self.key(latitude, longitude)
+        conn = self._conn()
+        row = conn.execute("SELECT city, created_at, last_used FROM geocode_cache WHERE cell = ?", (cell,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return False, None
+        city, created_at, last_used = row
+        now = time.time()
+        if city is None and self.negative_ttl >= 0 and now - created_at > self.negative_ttl:
+            conn.execute("DELETE FROM geocode_cache WHERE cell = ? AND city IS NULL", (cell,))
+            self._count("expired")
+            self._count("misses")
+            return False, None
+        if now - last_used > self.TOUCH_INTERVAL:
+            conn.execute("UPDATE geocode_cache SET last_used = ? WHERE cell = ?", (now, cell))
+        self._count("hits" if city is not None else "negative_hits")
+        return True, city
+
+    def put(self, latitude: float, longitude: float, city: Optional[str]):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO geocode_cache (cell, city, created_at, last_used) VALUES (?, ?, ?, ?)",
+            (self.key(latitude, longitude), city, now, now)
+        )
+        self._count("writes")
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop the least recently used rows above max_entries."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            (count,) = conn.execute("SELECT COUNT(*) FROM geocode_cache").fetchone()
+            excess = count - self.max_entries
+            removed = 0
+            if excess > 0:
+                removed = conn.execute("""
+                    DELETE FROM geocode_cache WHERE cell IN (
+                        SELECT cell FROM geocode_cache ORDER BY last_used LIMIT ?
+                    )
+                """, (excess,)).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if removed:
+            self._count("evictions", removed)
+        return removed
+
+    def import_json(self, json_path: str) -> int:
+        """One-time import of the old geocoding_cache.json ({"lat,lng": city}) into an empty cache."""
+        conn = self._conn()
+        if not os.path.exists(json_path) or conn.execute("SELECT 1 FROM geocode_cache LIMIT 1").fetchone():
+            return 0
+        try:
+            with open(json_path) as f:
+                legacy = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Skipping geocoding cache import from {json_path}: {e}")
+            return 0
+        now = time.time()
+        rows = {}
+        for key, city in legacy.items():
+            try:
+                lat, lng = (float(v) for v in key.split(","))
+            except ValueError:
+                continue
+            # Several old keys fall into one cell; prefer a positive result
+            cell = self.key(lat, lng)
+            if city or cell not in rows:
+                rows[cell] = city
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO geocode_cache (cell, city, created_at, last_used) VALUES (?, ?, ?, ?)",
+                [(cell, city, now, now) for cell, city in rows.items()]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        print(f"Imported {len(rows)} geocoding cache cells from {json_path}")
+        return len(rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+        lookups = s["hits"] + s["negative_hits"] + s["misses"]
+        s["hit_rate"] = round((s["hits"] + s["negative_hits"]) / lookups, 4) if lookups else 0.0
+        try:
+            (s["entries"],) = self._conn().execute("SELECT COUNT(*) FROM geocode_cache").fetchone()
+        except sqlite3.Error:
+            s["entries"] = None
+        s["precision"] = self.precision
+        return s
+
+
+def make_cache() -> GeocodeCache:
+    return GeocodeCache(
+        path=os.getenv("GEOCODE_CACHE_PATH", "geocoding_cache.db"),
+        precision=int(os.getenv("GEOCODE_CACHE_PRECISION", "6")),
+        max_entries=int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", "50000")),
+        negative_ttl=float(os.getenv("GEOCODE_CACHE_NEGATIVE_TTL", str(24 * 3600))),
+    )
@@ -1,57 +1,90 @@
+import os
 import requests
-import json
+import asyncio
+from requests.adapters import HTTPAdapter
 from typing import Optional, Dict, Any
 import time
+from .offline_geocoder import OfflineGeocoder, in_india_bounds
+from .geocode_cache import make_cache
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
+NOMINATIM_TIMEOUT = 5
+# The offline dataset answers in-process; Nominatim is only asked when this is on and offline has no city.
+# On by default: the bundled seed set only covers ~50 km around ~200 cities. Turn it off (0) once the
+# pincode-level dataset is installed.
+NOMINATIM_FALLBACK = os.getenv("GEOCODING_NOMINATIM_FALLBACK", "1") == "1"
 
 class GeocodingService:
-    """Service to convert coordinates to city names using free geocoding APIs"""
-    
-    def __init__(self):
-        self.cache = {}
-        self.cache_file = "geocoding_cache.json"
-        self.load_cache()
+    """Service to convert coordinates to city names: offline dataset first, Nominatim as optional fallback"""
     
-    def load_cache(self):
-        """Load cached geocoding results from file"""
-        try:
-            with open(self.cache_file, 'r') as f:
-                self.cache = json.load(f)
-        except FileNotFoundError:
-            self.cache = {}
+    def __init__(self, nominatim_fallback: bool = NOMINATIM_FALLBACK):
+        self.offline = self._load_offline()
+        self.nominatim_fallback = nominatim_fallback
+        # Nominatim results, keyed by geohash cell and shared by all workers (see geocode_cache.py)
+        self.cache = make_cache()
+        self.cache.import_json("geocoding_cache.json")
+        # One pooled HTTP session: keep-alive to Nominatim instead of a new TLS handshake per lookup
+        self._http = requests.Session()
+        self._http.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=16))
+        self._http.headers['User-Agent'] = 'ApolloTyresChatbot/1.0 (https://apollotyres.com; contact@apollotyres.com)'
+        # cache_key -> task resolving it, so concurrent lookups for one spot share a single request
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {"lookups": 0, "offline_hits": 0, "memo_hits": 0, "shared": 0, "requests": 0}
     
-    def save_cache(self):
-        """Save cached geocoding results to file"""
+    @staticmethod
+    def _load_offline() -> Optional[OfflineGeocoder]:
         try:
-            with open(self.cache_file, 'w') as f:
-                json.dump(self.cache, f)
+            return OfflineGeocoder.load()
         except Exception as e:
-            print(f"Error saving geocoding cache: {e}")
+            print(f"Offline geocoder unavailable, regions fall back to India/International: {e}")
+            return None
+    
+    def _offline_lookup(self, latitude: float, longitude: float) -> Dict[str, Any]:
+        if self.offline is None:
+            return {}
+        return self.offline.lookup(latitude, longitude)
+    
+    def cache_key(self, latitude: float, longitude: float) -> str:
+        """Quantized key: nearby coordinates (same geohash cell) share cache, memo and in-flight entries"""
+        return self.cache.key(latitude, longitude)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "cache": self.cache.stats()}
     
     def get_city_from_coordinates(self, latitude: float, longitude: float) -> Optional[str]:
         """
-        Convert coordinates to city name using free geocoding APIs
+        Convert coordinates to city name: offline dataset first, then (if enabled) Nominatim
         Returns city name or None if not found
         """
-        # Create cache key
-        cache_key = f"{latitude:.6f},{longitude:.6f}"
-        
+        self.stats["lookups"] += 1
+        city = self._offline_lookup(latitude, longitude).get("city")
+        if city:
+            self.stats["offline_hits"] += 1
+            return city
+        if not self.nominatim_fallback:
+            return None
+        return self._nominatim_city(latitude, longitude)
+    
+    def _nominatim_city(self, latitude: float, longitude: float) -> Optional[str]:
+        """Nominatim lookup behind the coordinate cache (blocking: run off the event loop)"""
         # Check cache first
-        if cache_key in self.cache:
-            return self.cache[cache_key]
+        found, city_name = self.cache.get(latitude, longitude)
+        if found:
+            return city_name
         
         # Try Nominatim API (free, no API key required)
+        self.stats["requests"] += 1
         city_name = self._try_nominatim(latitude, longitude)
         
-        # Cache the result (even if None to avoid repeated failed requests)
-        self.cache[cache_key] = city_name
-        self.save_cache()
+        # Cache the result (None too: negative entries expire after the cache's negative TTL)
+        self.cache.put(latitude, longitude, city_name)
         
         return city_name
     
     def _try_nominatim(self, latitude: float, longitude: float) -> Optional[str]:
         """Try OpenStreetMap Nominatim API (free, no API key required)"""
         try:
-            url = f"https://nominatim.openstreetmap.org/reverse"
+            url = NOMINATIM_URL
             params = {
                 "lat": latitude,
                 "lon": longitude,
@@ -61,10 +94,7 @@ class GeocodingService:
             }
             
             print(f"Making request to Nominatim: {url} with params: {params}")
-            headers = {
-                'User-Agent': 'ApolloTyresChatbot/1.0 (https://apollotyres.com; contact@apollotyres.com)'
-            }
-            response = requests.get(url, params=params, headers=headers, timeout=5)
+            response = self._http.get(url, params=params, timeout=NOMINATIM_TIMEOUT)
             print(f"Response status: {response.status_code}")
             
             if response.status_code == 200:
@@ -94,42 +124,79 @@ class GeocodingService:
     
 
     
-    def get_location_info(self, latitude: float, longitude: float) -> Dict[str, Any]:
-        """
-        Get comprehensive location information including city name
-        Returns a dictionary with location details
-        """
-        city_name = self.get_city_from_coordinates(latitude, longitude)
-        
-        # Determine region based on coordinates
-        region = self._get_region_from_coordinates(latitude, longitude)
-        
+    def _location_info(self, latitude: float, longitude: float, city: Optional[str], place: Dict) -> Dict[str, Any]:
         return {
-            "city": city_name,
-            "region": region,
+            "city": city,
+            "district": place.get("district"),
+            "state": place.get("state"),
+            "pincode": place.get("pincode"),
+            "region": place.get("region") or self._get_region_from_coordinates(latitude, longitude),
             "latitude": latitude,
             "longitude": longitude,
             "coordinates": f"{latitude:.4f}, {longitude:.4f}"
         }
     
-    def _get_region_from_coordinates(self, latitude: float, longitude: float) -> str:
-        """Get region name based on coordinates"""
-        if 8.0 <= latitude <= 37.0 and 68.0 <= longitude <= 97.0:
-            # India regions
-            if 20.0 <= latitude <= 30.0 and 70.0 <= longitude <= 80.0:
-                return "Western India"
-            elif 10.0 <= latitude <= 20.0 and 70.0 <= longitude <= 80.0:
-                return "Southern India"
-            elif 20.0 <= latitude <= 30.0 and 80.0 <= longitude <= 90.0:
-                return "Central India"
-            elif 20.0 <= latitude <= 30.0 and 90.0 <= longitude <= 100.0:
-                return "Eastern India"
-            elif 30.0 <= latitude <= 37.0 and 70.0 <= longitude <= 80.0:
-                return "Northern India"
-            else:
-                return "India"
+    def get_location_info(self, latitude: float, longitude: float) -> Dict[str, Any]:
+        """
+        Get comprehensive location information including city name
+        Returns a dictionary with location details
+        """
+        self.stats["lookups"] += 1
+        place = self._offline_lookup(latitude, longitude)
+        city = place.get("city")
+        if city:
+            self.stats["offline_hits"] += 1
+        elif self.nominatim_fallback:
+            city = self._nominatim_city(latitude, longitude)
+        return self._location_info(latitude, longitude, city, place)
+    
+    async def _anominatim_city(self, latitude: float, longitude: float) -> Optional[str]:
+        """
+        Cache read and HTTP lookup run in a worker thread; concurrent lookups for the same cell
+        share one of them.
+        """
+        cache_key = self.cache_key(latitude, longitude)
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(self._nominatim_city, latitude, longitude))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
         else:
-            return "International"
+            self.stats["shared"] += 1
+        # shield: one caller disconnecting must not cancel the lookup the others are waiting on
+        return await asyncio.shield(task)
+    
+    async def aget_city_from_coordinates(self, latitude: float, longitude: float) -> Optional[str]:
+        """Async get_city_from_coordinates for request handlers; the offline path never leaves the loop."""
+        return (await self.aget_location_info(latitude, longitude))["city"]
+    
+    async def aget_location_info(self, latitude: float, longitude: float, memo: Dict = None) -> Dict[str, Any]:
+        """
+        Async get_location_info. `memo` is an optional per-session dict: a client that sends the same
+        coordinates with every message resolves them once per session.
+        """
+        cache_key = self.cache_key(latitude, longitude)
+        if memo is not None and cache_key in memo:
+            self.stats["memo_hits"] += 1
+            return memo[cache_key]
+        self.stats["lookups"] += 1
+        # Grid lookup is sub-millisecond: run it inline
+        place = self._offline_lookup(latitude, longitude)
+        city = place.get("city")
+        if city:
+            self.stats["offline_hits"] += 1
+        elif self.nominatim_fallback:
+            city = await self._anominatim_city(latitude, longitude)
+        info = self._location_info(latitude, longitude, city, place)
+        if memo is not None:
+            memo[cache_key] = info
+        return info
+    
+    def _get_region_from_coordinates(self, latitude: float, longitude: float) -> str:
+        """Get region name based on coordinates (from the state of the nearest known place)"""
+        if self.offline is not None:
+            return self.offline.region(latitude, longitude)
+        return "India" if in_india_bounds(latitude, longitude) else "International"
 
 # Global instance
 geocoding_service = GeocodingService() 
\ No newline at end of file
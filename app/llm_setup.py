@@ -2,11 +2,13 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
 from .config import settings
 
-def get_llm():
+def get_llm(streaming: bool = False, tags=None):
+    """Gemini chat client. streaming=True lets astream/astream_events yield tokens as they arrive."""
     return ChatGoogleGenerativeAI(
         model=settings.LLM_MODEL,
         google_api_key=settings.GEMINI_API_KEY,
-        disable_streaming=True
+        disable_streaming=not streaming,
+        tags=tags
     )
 
 SYSTEM_PROMPT = PromptTemplate(
@@ -1,11 +1,15 @@
 import os
 os.environ["PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION"] = "python"
 
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .database import update_sessions_table
+from fastapi.responses import JSONResponse
+from .database import update_sessions_table, update_messages_table
 from .routers import chat
-from . import analytics
+from . import analytics, vector_store
+from .rag_engine import rag_engine
+from .analytics_writer import analytics_writer
 
 app = FastAPI(title="Google Gen AI RAG App with ChromaDB")
 
@@ -33,6 +37,32 @@ app.include_router(analytics.router, prefix="/analytics", tags=["Analytics"])
 
 # Initialize database schema
 update_sessions_table()
+update_messages_table()
+
+@app.on_event("startup")
+async def init_rag_engine():
+    # Open the persisted index, then build retriever, LLM client and QA chain once, off the event loop.
+    # A missing index is reported by /health/ready instead of being built here.
+    if await asyncio.to_thread(vector_store.warm_up):
+        await asyncio.to_thread(rag_engine.initialize)
+
+@app.on_event("startup")
+async def start_analytics_writer():
+    analytics_writer.start()
+
+@app.on_event("shutdown")
+async def stop_analytics_writer():
+    # Apply every queued analytics record before the process exits
+    await analytics_writer.stop()
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness probe: 200 once the vector index is loaded, 503 until then."""
+    status = await asyncio.to_thread(vector_store.readiness)
+    status["rag_engine_ready"] = rag_engine.ready
+    status["analytics_writer"] = analytics_writer.stats()
+    ready = status["ready"] and rag_engine.ready
+    return JSONResponse(status_code=200 if ready else 503, content=status)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,194 @@
+# offline_geocoder.py — reverse geocoding for Indian coordinates without a network call
+# Places (city, district, state, pincode, centroid) are loaded from a bundled CSV into a grid
+# index of GRID_DEG x GRID_DEG cells. A nearest lookup only scans rings of cells around the
+# query point, so it stays well under a millisecond even with the full pincode directory loaded.
+#
+# app/data/india_places.csv ships a seed set of ~200 cities (every state and UT). A seed city's pincode
+# is only that city's head post office, so it is reported only for points within PINCODE_MAX_KM of it.
+# For pincode-level resolution convert the GeoNames postal-code dump (rows marked level=pincode, whose
+# nearest centroid's pincode is always reported; https://download.geonames.org/export/zip/IN.zip):
+#   python -m app.offline_geocoder convert-geonames IN.txt --out app/data/india_places.csv
+#   python -m app.offline_geocoder lookup 28.61 77.21
+
+import argparse
+import csv
+import math
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+DATA_PATH = os.getenv(
+    "OFFLINE_GEOCODER_PATH", os.path.join(os.path.dirname(__file__), "data", "india_places.csv")
+)
+# A place further away than this is not reported as the user's city (state/region still are)
+CITY_MAX_KM = float(os.getenv("OFFLINE_GEOCODER_CITY_MAX_KM", "50"))
+REGION_MAX_KM = float(os.getenv("OFFLINE_GEOCODER_REGION_MAX_KM", "250"))
+# City-level rows (no level=pincode) only lend their pincode to points this close
+PINCODE_MAX_KM = float(os.getenv("OFFLINE_GEOCODER_PINCODE_MAX_KM", "3"))
+GRID_DEG = 0.5
+EARTH_RADIUS_KM = 6371.0088
+INDIA_BOUNDS = (6.0, 37.5, 68.0, 97.5)  # lat_min, lat_max, lng_min, lng_max
+
+STATE_REGIONS = {
+    "Delhi": "Northern India", "Haryana": "Northern India", "Punjab": "Northern India",
+    "Chandigarh": "Northern India", "Himachal Pradesh": "Northern India", "Jammu and Kashmir": "Northern India",
+    "Ladakh": "Northern India", "Uttarakhand": "Northern India", "Uttar Pradesh": "Northern India",
+    "Rajasthan": "Northern India",
+    "Gujarat": "Western India", "Maharashtra": "Western India", "Goa": "Western India",
+    "Dadra and Nagar Haveli and Daman and Diu": "Western India",
+    "Madhya Pradesh": "Central India", "Chhattisgarh": "Central India",
+    "Bihar": "Eastern India", "Jharkhand": "Eastern India", "West Bengal": "Eastern India", "Odisha": "Eastern India",
+    "Assam": "North-Eastern India", "Meghalaya": "North-Eastern India", "Tripura": "North-Eastern India",
+    "Manipur": "North-Eastern India", "Mizoram": "North-Eastern India", "Nagaland": "North-Eastern India",
+    "Arunachal Pradesh": "North-Eastern India", "Sikkim": "North-Eastern India",
+    "Telangana": "Southern India", "Andhra Pradesh": "Southern India", "Karnataka": "Southern India",
+    "Tamil Nadu": "Southern India", "Kerala": "Southern India", "Puducherry": "Southern India",
+    "Andaman and Nicobar Islands": "Southern India", "Lakshadweep": "Southern India",
+}
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def in_india_bounds(latitude: float, longitude: float) -> bool:
+    lat_min, lat_max, lng_min, lng_max = INDIA_BOUNDS
+    return lat_min <= latitude <= lat_max and lng_min <= longitude <= lng_max
+
+
+class OfflineGeocoder:
+    def __init__(self, places: List[Dict], grid_deg: float = GRID_DEG):
+        self.places = places
+        self.grid_deg = grid_deg
+        self._grid: Dict[Tuple[int, int], List[int]] = {}
+        for i, place in enumerate(places):
+            self._grid.setdefault(self._cell(place["latitude"], place["longitude"]), []).append(i)
+        if self._grid:
+            rows = [c[0] for c in self._grid]
+            cols = [c[1] for c in self._grid]
+            self._bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    @classmethod
+    def load(cls, path: str = DATA_PATH) -> "OfflineGeocoder":
+        start = time.perf_counter()
+        places = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    row["latitude"] = float(row["latitude"])
+                    row["longitude"] = float(row["longitude"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                places.append(row)
+        geocoder = cls(places)
+        print(f"Offline geocoder: {len(places)} places from {path} in {time.perf_counter() - start:.2f}s")
+        return geocoder
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return int(math.floor(latitude / self.grid_deg)), int(math.floor(longitude / self.grid_deg))
+
+    def _ring(self, ci: int, cj: int, r: int):
+        if r == 0:
+            yield ci, cj
+            return
+        for dj in range(-r, r + 1):
+            yield ci - r, cj + dj
+            yield ci + r, cj + dj
+        for di in range(-r + 1, r):
+            yield ci + di, cj - r
+            yield ci + di, cj + r
+
+    def nearest(self, latitude: float, longitude: float, max_km: float = None) -> Optional[Tuple[Dict, float]]:
+        """(place, distance_km) for the closest place, or None if nothing is within max_km."""
+        if not self._grid:
+            return None
+        ci, cj = self._cell(latitude, longitude)
+        row_min, row_max, col_min, col_max = self._bounds
+        max_r = max(abs(ci - row_min), abs(ci - row_max), abs(cj - col_min), abs(cj - col_max))
+        # Conservative km per grid step: longitude degrees shrink towards the poles
+        step_km = self.grid_deg * 111.19 * math.cos(math.radians(min(89.0, abs(latitude) + self.grid_deg)))
+        best, best_km = None, float("inf")
+        for r in range(max_r + 1):
+            # Every point in ring r is at least (r - 1) full cells away
+            min_ring_km = max(0, r - 1) * step_km
+            if min_ring_km > best_km or (max_km is not None and min_ring_km > max_km):
+                break
+            for cell in self._ring(ci, cj, r):
+                for i in self._grid.get(cell, ()):
+                    place = self.places[i]
+                    km = haversine_km(latitude, longitude, place["latitude"], place["longitude"])
+                    if km < best_km:
+                        best, best_km = place, km
+        if best is None or (max_km is not None and best_km > max_km):
+            return None
+        return best, best_km
+
+    def region(self, latitude: float, longitude: float) -> str:
+        found = self.nearest(latitude, longitude, REGION_MAX_KM)
+        if found and found[0].get("state") in STATE_REGIONS:
+            return STATE_REGIONS[found[0]["state"]]
+        return "India" if in_india_bounds(latitude, longitude) else "International"
+
+    def lookup(self, latitude: float, longitude: float) -> Dict:
+        """city/district/state/pincode/region for the coordinates; fields are None when too far off."""
+        result = {"city": None, "district": None, "state": None, "pincode": None, "distance_km": None}
+        found = self.nearest(latitude, longitude, REGION_MAX_KM)
+        if found:
+            place, km = found
+            result["state"] = place.get("state") or None
+            result["distance_km"] = round(km, 2)
+            if km <= CITY_MAX_KM:
+                result["city"] = place.get("city") or None
+                result["district"] = place.get("district") or None
+                if place.get("level") == "pincode" or km <= PINCODE_MAX_KM:
+                    result["pincode"] = place.get("pincode") or None
+        if result["state"] in STATE_REGIONS:
+            result["region"] = STATE_REGIONS[result["state"]]
+        else:
+            result["region"] = "India" if in_india_bounds(latitude, longitude) else "International"
+        return result
+
+
+def convert_geonames(src: str, out: str) -> int:
+    """GeoNames postal dump (tab-separated) -> places CSV: one row per pincode centroid."""
+    count = 0
+    with open(src, encoding="utf-8") as f, open(out, "w", newline="", encoding="utf-8") as w:
+        writer = csv.writer(w)
+        writer.writerow(["city", "district", "state", "pincode", "latitude", "longitude", "level"])
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 11 or not cols[9] or not cols[10]:
+                continue
+            # country, pincode, place, state, state code, district, district code, sub-district, code, lat, lng
+            writer.writerow([cols[2], cols[5], cols[3], cols[1], cols[9], cols[10], "pincode"])
+            count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.offline_geocoder", description="Offline reverse geocoder")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert-geonames", help="build the places CSV from a GeoNames postal dump")
+    convert.add_argument("src")
+    convert.add_argument("--out", default=DATA_PATH)
+    lookup = sub.add_parser("lookup", help="resolve one coordinate pair")
+    lookup.add_argument("latitude", type=float)
+    lookup.add_argument("longitude", type=float)
+    args = parser.parse_args(argv)
+
+    if args.command == "convert-geonames":
+        print(f"Wrote {convert_geonames(args.src, args.out)} places to {args.out}")
+    elif args.command == "lookup":
+        geocoder = OfflineGeocoder.load()
+        start = time.perf_counter()
+        result = geocoder.lookup(args.latitude, args.longitude)
+        print(f"{result} ({(time.perf_counter() - start) * 1000:.3f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
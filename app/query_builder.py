@@ -0,0 +1,140 @@
+# query_builder.py — local standalone-query construction for single-call RAG mode
+# Replaces the condense-question LLM hop: the retrieval query is the new question plus entities
+# (tyre model, tyre size, vehicle) carried over from earlier user turns, and — for short follow-ups
+# like "and the price?" — the previous user turn itself.
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+TYRE_LINES = (
+    "amazer", "alnac", "apterra", "aspire", "acelere", "altrust", "alpha", "actizip", "actigrip",
+    "endurace", "endutrax", "endumile", "amar", "xt-7", "loadstar", "krishak", "tramplus", "vredestein",
+)
+VEHICLE_MAKES = (
+    "maruti", "suzuki", "hyundai", "tata", "mahindra", "honda", "toyota", "kia", "mg", "renault",
+    "nissan", "skoda", "volkswagen", "ford", "jeep", "bmw", "audi", "mercedes", "royal enfield",
+    "bajaj", "hero", "tvs", "yamaha", "ashok leyland", "eicher",
+)
+VEHICLE_MODELS = (
+    "swift", "dzire", "baleno", "brezza", "ertiga", "alto", "wagonr", "ciaz", "creta", "venue", "i10",
+    "i20", "verna", "nexon", "punch", "harrier", "safari", "tiago", "altroz", "thar", "scorpio",
+    "xuv300", "xuv500", "xuv700", "bolero", "city", "amaze", "innova", "fortuner", "seltos", "sonet",
+    "hector", "kwid", "duster", "magnite", "ecosport", "compass", "classic 350", "pulsar", "splendor",
+)
+
+_SIZE_RE = re.compile(
+    r"(?<!\d)(\d{3})\s*[/\s-]?\s*(\d{2})\s*[/\s-]?\s*(z?r)?\s*[/\s-]?\s*(\d{2})(?!\d)", re.I
+)
+# Tyre line plus up to two model qualifiers, e.g. "Amazer 4G Life", "Alnac 4GS", "Apterra AT2"
+_MODEL_RE = re.compile(
+    r"\b(" + "|".join(re.escape(t) for t in TYRE_LINES) + r")\b((?:\s+[a-z0-9][a-z0-9+-]{0,7}){0,2})",
+    re.I,
+)
+_VEHICLE_RE = re.compile(
+    r"\b(?:(" + "|".join(re.escape(m) for m in VEHICLE_MAKES) + r")\s+)?("
+    + "|".join(re.escape(m) for m in VEHICLE_MODELS) + r")\b",
+    re.I,
+)
+# Models that are also everyday words ("in the city") only count with their make ("Honda City")
+_MODELS_NEEDING_MAKE = {"city"}
+_QUALIFIER_STOP = {"tyre", "tyres", "tire", "tires", "for", "in", "and", "or", "with", "is", "the", "size", "price"}
+
+# Follow-ups at or below this many words also carry the previous user turn into the query
+FOLLOW_UP_MAX_WORDS = 6
+
+
+def _size(text: str) -> Optional[str]:
+    m = _SIZE_RE.search(text or "")
+    if not m:
+        return None
+    width, aspect, construction, rim = m.groups()
+    return f"{width}/{aspect} {(construction or 'R').upper()}{rim}"
+
+
+def _model(text: str) -> Optional[str]:
+    m = _MODEL_RE.search(text or "")
+    if not m:
+        return None
+    words = [m.group(1).title()]
+    for q in (m.group(2) or "").split():
+        # Qualifiers must look like model codes (4G, Life, AT2), not ordinary words
+        # and must contain a letter: "Alnac 4G 185/65 R15" stops before the size's width
+        if q.lower() in _QUALIFIER_STOP or not any(c.isalpha() for c in q):
+            break
+        words.append(q.upper() if any(c.isdigit() for c in q) else q.title())
+    return " ".join(words)
+
+
+def _vehicle(text: str) -> Optional[str]:
+    for m in _VEHICLE_RE.finditer(text or ""):
+        make, model = m.groups()
+        if make or model.lower() not in _MODELS_NEEDING_MAKE:
+            return " ".join(p.title() for p in (make, model) if p)
+    return None
+
+
+def extract_entities(text: str) -> Dict[str, str]:
+    """{"model", "size", "vehicle"} found in text (missing keys are omitted)."""
+    found = {"model": _model(text), "size": _size(text), "vehicle": _vehicle(text)}
+    return {k: v for k, v in found.items() if v}
+
+
+def _user_turns(chat_history: Sequence) -> List[str]:
+    """User questions from (question, answer) tuples or {"role", "content"} dicts, oldest first."""
+    turns = []
+    for turn in chat_history or []:
+        if isinstance(turn, dict):
+            if turn.get("role") == "user" and turn.get("content"):
+                turns.append(turn["content"])
+        elif isinstance(turn, (list, tuple)) and turn and turn[0]:
+            turns.append(turn[0])
+    return turns
+
+
+# Sizes are vehicle-specific: naming a new vehicle drops the old size. A mentioned entity always
+# replaces the carried one of the same kind.
+_CARRY_BLOCKED_BY = {"vehicle": {"size"}, "model": set(), "size": set()}
+
+
+def carried_entities(question: str, chat_history: Sequence, lookback: int = 4) -> Dict[str, str]:
+    """Entities from recent user turns that still apply to the new question (newest mention wins)."""
+    current = extract_entities(question)
+    blocked = set(current)
+    for key in current:
+        blocked |= _CARRY_BLOCKED_BY[key]
+    carried: Dict[str, str] = {}
+    for turn in reversed(_user_turns(chat_history)[-lookback:]):
+        for key, value in extract_entities(turn).items():
+            if key not in blocked and key not in carried:
+                carried[key] = value
+    return carried
+
+
+def build_retrieval_query(question: str, chat_history: Sequence = None) -> Tuple[str, Dict[str, str]]:
+    """
+    Standalone retrieval query for `question` without an LLM call.
+    Returns (query, carried_entities) so callers can log what was carried over.
+    """
+    question = (question or "").strip()
+    if not chat_history:
+        return question, {}
+    carried = carried_entities(question, chat_history)
+    parts = [question]
+    user_turns = _user_turns(chat_history)
+    if user_turns and len(question.split()) <= FOLLOW_UP_MAX_WORDS and not extract_entities(question):
+        # Bare follow-up ("what about price?"): the previous question supplies the subject
+        parts.append(user_turns[-1])
+    parts.extend(v for v in carried.values() if v.lower() not in " ".join(parts).lower())
+    return " ".join(parts), carried
+
+
+def format_chat_history(chat_history: Sequence) -> str:
+    """Render (question, answer) tuples the way ConversationalRetrievalChain does for the prompt."""
+    lines = []
+    for turn in chat_history or []:
+        if isinstance(turn, dict):
+            role = "Human" if turn.get("role") == "user" else "Assistant"
+            lines.append(f"{role}: {turn.get('content', '')}")
+        elif isinstance(turn, (list, tuple)) and len(turn) >= 2:
+            lines.append(f"Human: {turn[0]}\nAssistant: {turn[1]}")
+    return "\n" + "\n".join(lines) if lines else ""
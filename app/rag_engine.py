@@ -0,0 +1,154 @@
+# rag_engine.py — long-lived retrieval-QA engine for the chat router
+# The Chroma handle, retriever, LLM client and ConversationalRetrievalChain are built once (at startup)
+# and shared by every request. The chain keeps no memory of its own, so per-request state
+# (chat history, user location) is passed in as inputs and concurrent requests can share it.
+# Only the combine-docs (answer) step streams: its LLM carries ANSWER_TAG, and astream() forwards just
+# those token events, so the condense-question rewrite never leaks into the user-visible stream.
+# RAG_MODE=single skips the condense-question LLM hop: the retrieval query is built locally
+# (query_builder) and the answer comes from one prompt | LLM call.
+
+import asyncio
+import threading
+import time
+
+from langchain.chains import ConversationalRetrievalChain
+
+from . import vector_store, llm_setup
+from .config import settings
+from .query_builder import build_retrieval_query, format_chat_history
+
+ANSWER_TAG = "answer"
+MODES = ("condense", "single")
+
+
+def _chunk_text(chunk) -> str:
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
+    return ""
+
+
+class RAGEngine:
+    def __init__(self, k: int = 5, mode: str = None):
+        self.k = k
+        self.mode = mode or settings.RAG_MODE
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown RAG mode '{self.mode}' (expected one of {MODES})")
+        self.store = None
+        self.retriever = None
+        self.llm = None
+        self.answer_llm = None
+        self.answer_chain = None
+        self.chain = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.chain is not None
+
+    def initialize(self):
+        """Build store, retriever, LLM and chain once (idempotent, thread-safe)."""
+        if self.chain is not None:
+            return
+        with self._lock:
+            if self.chain is not None:
+                return
+            start = time.perf_counter()
+            store = vector_store.get_vector_store()
+            retriever = store.as_retriever(search_kwargs={"k": self.k})
+            llm = llm_setup.get_llm()
+            answer_llm = llm_setup.get_llm(streaming=True, tags=[ANSWER_TAG])
+            chain = ConversationalRetrievalChain.from_llm(
+                llm=answer_llm,
+                condense_question_llm=llm,
+                retriever=retriever,
+                combine_docs_chain_kwargs={"prompt": llm_setup.SYSTEM_PROMPT}
+            )
+            self.answer_chain = llm_setup.SYSTEM_PROMPT | answer_llm
+            self.store, self.retriever, self.llm, self.answer_llm = store, retriever, llm, answer_llm
+            self.chain = chain  # set last: `ready` means everything above is in place
+            print(f"RAG engine initialized in {time.perf_counter() - start:.2f}s")
+
+    @staticmethod
+    def _inputs(question: str, chat_history, user_location: str) -> dict:
+        return {
+            "question": question,
+            "chat_history": list(chat_history or []),
+            "user_location": user_location or "Unknown"
+        }
+
+    def single_call_inputs(self, docs, question: str, chat_history, user_location: str) -> dict:
+        return {
+            "context": "\n\n".join(doc.page_content for doc in docs),
+            "question": question,
+            "chat_history": format_chat_history(chat_history),
+            "user_location": user_location or "Unknown"
+        }
+
+    async def aretrieve(self, question: str, chat_history=None):
+        """Single-call mode retrieval: documents for the locally built standalone query."""
+        query, carried = build_retrieval_query(question, chat_history)
+        if carried:
+            print(f"Retrieval query with carried entities {carried}: {query}")
+        return await self.retriever.ainvoke(query)
+
+    def invoke(self, question: str, chat_history=None, user_location: str = "Unknown") -> str:
+        self.initialize()
+        if self.mode == "single":
+            docs = self.retriever.invoke(build_retrieval_query(question, chat_history)[0])
+            inputs = self.single_call_inputs(docs, question, chat_history, user_location)
+            return _chunk_text(self.answer_chain.invoke(inputs))
+        result = self.chain.invoke(self._inputs(question, chat_history, user_location))
+        return result["answer"]
+
+    async def ainvoke(self, question: str, chat_history=None, user_location: str = "Unknown") -> str:
+        """Answer one question without blocking the event loop."""
+        if not self.ready:
+            # Startup normally did this; build off the event loop if a request got here first
+            await asyncio.to_thread(self.initialize)
+        if self.mode == "single":
+            docs = await self.aretrieve(question, chat_history)
+            inputs = self.single_call_inputs(docs, question, chat_history, user_location)
+            return _chunk_text(await self.answer_chain.ainvoke(inputs))
+        result = await self.chain.ainvoke(self._inputs(question, chat_history, user_location))
+        return result["answer"]
+
+    async def astream(self, question: str, chat_history=None, user_location: str = "Unknown"):
+        """
+        Yield answer text pieces as Gemini produces them (answer step only).
+        If the model produced no token events, the final answer is yielded once at the end.
+        """
+        if not self.ready:
+            await asyncio.to_thread(self.initialize)
+        if self.mode == "single":
+            docs = await self.aretrieve(question, chat_history)
+            inputs = self.single_call_inputs(docs, question, chat_history, user_location)
+            async for chunk in self.answer_chain.astream(inputs):
+                text = _chunk_text(chunk)
+                if text:
+                    yield text
+            return
+        root_run_id = None
+        final_answer = None
+        streamed = False
+        async for event in self.chain.astream_events(
+            self._inputs(question, chat_history, user_location), version="v2"
+        ):
+            if root_run_id is None:
+                root_run_id = event["run_id"]
+            kind = event["event"]
+            if kind == "on_chat_model_stream" and ANSWER_TAG in event.get("tags", []):
+                text = _chunk_text(event["data"]["chunk"])
+                if text:
+                    streamed = True
+                    yield text
+            elif kind == "on_chain_end" and event["run_id"] == root_run_id:
+                output = event["data"].get("output") or {}
+                final_answer = output.get("answer") if isinstance(output, dict) else None
+        if not streamed and final_answer:
+            yield final_answer
+
+
+rag_engine = RAGEngine()
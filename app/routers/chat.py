@@ -1,165 +1,143 @@
 import json
-import uuid
+import time
+import asyncio
 from datetime import datetime
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Body
-from langchain.chains import ConversationalRetrievalChain
-from .. import database, vector_store, llm_setup, analytics
+from fastapi.responses import StreamingResponse
+from .. import analytics, vector_store
 from ..geocoding import geocoding_service
 from ..schemas import QueryRequest
+from ..session_backend import make_backend
+from ..rag_engine import rag_engine
+from ..analytics_writer import analytics_writer, TurnRecord
+from ..suggestions import suggestion_engine, FALLBACK_QUESTIONS
 
 router = APIRouter()
-chat_histories = {}
+# Conversation memory lives behind SESSION_BACKEND (memory | sqlite | redis) so several
+# workers/nodes can serve the same session
+session_backend = make_backend()
+chat_histories = session_backend.namespace("chat_histories")
+MAX_HISTORY_TURNS = 10
 
-def get_location_context(latitude: float, longitude: float) -> str:
-    """Get location context based on coordinates with city name"""
-    # Get comprehensive location info including city name
-    location_info = geocoding_service.get_location_info(latitude, longitude)
-    
+async def _session(fn, *args):
+    """Run a session-backend call inline for the in-process store, in a thread for shared ones."""
+    if session_backend.blocking:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+async def get_chat_history(session_id: str) -> list:
+    """(question, answer) tuples for the session; JSON backends hand them back as lists."""
+    items = await _session(chat_histories.get_list, session_id)
+    return [tuple(turn) for turn in items or []]
+
+def format_location(location_info: dict) -> str:
+    """Location string for the prompt: city and region, or region and coordinates"""
     # Build location string with city name
     if location_info["city"]:
-        location_string = f"{location_info['city']}, {location_info['region']}"
-    else:
-        # Fallback to coordinates if city not found
-        location_string = f"{location_info['region']} ({latitude:.4f}, {longitude:.4f})"
-    
-    return location_string
+        return f"{location_info['city']}, {location_info['region']}"
+    # Fallback to coordinates if city not found
+    return f"{location_info['region']} ({location_info['latitude']:.4f}, {location_info['longitude']:.4f})"
+
+async def resolve_location(user_location, memo: dict = None):
+    """
+    Resolve an optional {latitude, longitude} dict once per turn.
+    Returns (location string for the prompt, location info or None).
+    """
+    if user_location and user_location.get('latitude') and user_location.get('longitude'):
+        info = await geocoding_service.aget_location_info(
+            user_location['latitude'], user_location['longitude'], memo
+        )
+        return format_location(info), info
+    return "Unknown", None
+
+def _sse(data: dict, event: str = None) -> str:
+    """Format one Server-Sent Events frame."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
 @router.post("/query")
 async def query_qa(req: QueryRequest):
-    retriever = vector_store.get_vector_store().as_retriever(search_kwargs={"k": 5})
     session_id = req.session_id or "default"
-    
-    if session_id not in chat_histories:
-        chat_histories[session_id] = []
-    
-    qa = ConversationalRetrievalChain.from_llm(
-        llm=llm_setup.get_llm(),
-        retriever=retriever,
-        combine_docs_chain_kwargs={"prompt": llm_setup.SYSTEM_PROMPT}
-    )
+    chat_history = await get_chat_history(session_id)
     
     try:
         # Get location from request if available
-        user_location = getattr(req, 'user_location', None)
-        location_info = "Unknown"
-        
-        if user_location and user_location.get('latitude') and user_location.get('longitude'):
-            lat = user_location['latitude']
-            lng = user_location['longitude']
-            location_info = get_location_context(lat, lng)
-        
-        result = qa.invoke({
-            "question": req.question,
-            "chat_history": chat_histories[session_id],
-            "user_location": location_info
-        })
-        answer = result["answer"]
-        chat_histories[session_id].append((req.question, answer))
+        location_info, _ = await resolve_location(getattr(req, 'user_location', None))
         
-        if len(chat_histories[session_id]) > 10:
-            chat_histories[session_id] = chat_histories[session_id][-10:]
+        answer = await rag_engine.ainvoke(req.question, chat_history, location_info)
+        # Atomic append + trim, so concurrent workers on the same session cannot lose turns
+        await _session(chat_histories.append_and_trim, session_id, (req.question, answer), MAX_HISTORY_TURNS)
         
         return {"answer": answer}
+    except vector_store.VectorStoreNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/query/stream")
+async def query_qa_stream(req: QueryRequest):
+    """
+    Server-Sent Events variant of /query. Emits `data: {"chunk": ...}` frames as tokens arrive,
+    then `event: done` with the full answer and time-to-first-token (or `event: error`).
+    """
+    session_id = req.session_id or "default"
+    if not rag_engine.ready:
+        try:
+            await asyncio.to_thread(rag_engine.initialize)
+        except vector_store.VectorStoreNotReady as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    chat_history = await get_chat_history(session_id)
+    location_info, _ = await resolve_location(getattr(req, 'user_location', None))
+
+    async def events():
+        start = time.perf_counter()
+        ttft = None
+        answer = ""
+        try:
+            async for piece in rag_engine.astream(req.question, chat_history, location_info):
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                answer += piece
+                yield _sse({"chunk": piece})
+            await _session(chat_histories.append_and_trim, session_id, (req.question, answer), MAX_HISTORY_TURNS)
+            yield _sse({
+                "answer": answer,
+                "ttft": round(ttft, 3) if ttft is not None else None,
+                "response_time": round(time.perf_counter() - start, 3)
+            }, event="done")
+        except Exception as e:
+            yield _sse({"error": str(e)}, event="error")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/generate-questions")
 async def generate_suggested_questions(data: dict = Body(...)):
-    """Generate dynamic suggested questions based on conversation context"""
+    """Suggested follow-up questions: cached, then ranked from the question bank, LLM only as a fallback"""
     try:
         conversation_history = data.get("conversation_history", [])
         current_topic = data.get("current_topic", "")
         
-        print(f"Generating questions for topic: {current_topic}")
-        print(f"Conversation history length: {len(conversation_history)}")
-        
-        # Format conversation history for better context
-        formatted_history = ""
-        if conversation_history:
-            for i, message in enumerate(conversation_history):
-                if message.get("role") == "user":
-                    content = message.get('content', message.get('text', ''))
-                    formatted_history += f"User: {content}\n"
-                elif message.get("role") == "assistant":
-                    content = message.get('content', message.get('text', ''))
-                    formatted_history += f"Bot: {content}\n"
-        
-        print(f"Formatted history: {formatted_history[:200]}...")
-        
-        # Create a prompt for generating relevant questions
-        prompt = f"""
-Based on the following conversation about Apollo Tyres, generate 5 relevant follow-up questions that a user might ask about Apollo Tyres products and services.
-
-Conversation History:
-{formatted_history}
-
-Current Topic: {current_topic}
-
-Generate 5 questions that users would naturally ask about Apollo Tyres, such as:
-1. Questions about specific Apollo tyre models and their features
-2. Questions about warranty, pricing, and availability
-3. Questions about tyre performance, durability, and specifications
-4. Questions about finding dealers, installation, and services
-5. Questions about tyre maintenance, care, and best practices
-
-Focus on user questions about:
-- Specific Apollo tyre models (Amazer, Alnac, Apterra, etc.)
-- Warranty information and coverage
-- Pricing and budget options
-- Performance features and benefits
-- Dealer locations and services
-- Tyre maintenance and care
-- Installation and fitting services
-- Product comparisons and recommendations
-
-Make sure the questions are:
-- From the user's perspective (what users would ask)
-- Specific to Apollo Tyres products and services
-- Natural and conversational
-- Relevant to the current conversation context
-- Helpful for users to get more information
-
-Return only the questions, one per line, without numbering or bullet points.
-"""
-        
-        # Use the LLM to generate questions
-        llm = llm_setup.get_llm()
-        response = llm.invoke(prompt)
-        
-        # Extract questions from the response
-        questions_text = response.content.strip()
-        questions = [q.strip() for q in questions_text.split('\n') if q.strip()]
-        
-        print(f"Generated questions: {questions}")
-        
-        # Ensure we have exactly 5 questions
-        if len(questions) > 5:
-            questions = questions[:5]
-        elif len(questions) < 5:
-            # Add some fallback questions if not enough were generated
-            fallback_questions = [
-                "What is the warranty period for Apollo tyres?",
-                "How do I find a nearby Apollo dealer?",
-                "What are the different types of Apollo tyres?",
-                "How to maintain my tyres properly?",
-                "What is the recommended tyre pressure?"
-            ]
-            questions.extend(fallback_questions[:5-len(questions)])
-        
-        print(f"Final questions to return: {questions}")
-        return {"questions": questions}
+        questions, source = await suggestion_engine.suggest(conversation_history, current_topic)
+        print(f"Suggested questions for topic '{current_topic}' ({source}): {questions}")
+        return {"questions": questions, "source": source}
         
     except Exception as e:
         print(f"Error generating questions: {e}")
         # Return fallback questions if generation fails
-        fallback_questions = [
-            "What is the warranty period for Apollo tyres?",
-            "How do I find a nearby Apollo dealer?",
-            "What are the different types of Apollo tyres?",
-            "How to maintain my tyres properly?",
-            "What is the recommended tyre pressure?"
-        ]
-        return {"questions": fallback_questions}
+        return {"questions": list(FALLBACK_QUESTIONS)}
+
+@router.get("/generate-questions/stats")
+async def suggested_questions_stats():
+    return suggestion_engine.stats()
+
+@router.get("/geocoding/stats")
+async def geocoding_stats():
+    """Offline/memo/cache hit counters for reverse geocoding"""
+    return await asyncio.to_thread(geocoding_service.get_stats)
 
 @router.websocket("/ws")
 async def websocket_endpoint_ws(websocket: WebSocket):
@@ -168,23 +146,30 @@ async def websocket_endpoint_ws(websocket: WebSocket):
         await websocket.accept()
         print("WebSocket connection accepted")
         
-        # Create a unique session ID for this WebSocket connection
-        session_id = analytics.generate_short_id()
+        # Create a unique session ID for this WebSocket connection, or resume the one the client
+        # reconnects with (?session_id=...): its history survives in the session backend until idle TTL
+        session_id = websocket.query_params.get("session_id")
+        resumed = bool(session_id) and await _session(chat_histories.get_list, session_id) is not None
+        if not resumed:
+            session_id = analytics.generate_short_id()
+            await _session(chat_histories.set_list, session_id, [])
         user_id = analytics.generate_user_id()  # Generate a meaningful user ID
         session_start_time = datetime.now()
-        chat_histories[session_id] = []
-        print(f"Created new session: {session_id} for user: {user_id}")
+        print(f"{'Resumed' if resumed else 'Created new'} session: {session_id} for user: {user_id}")
+        await websocket.send_json({"session_id": session_id, "resumed": resumed})
         
         # Get client info
         client = websocket.client
         page_url = "unknown"  # Default value
+        location_memo = {}  # coordinates -> resolved location, for this connection only
         
-        # Record session start
-        analytics.record_user_event(
-            user_id=user_id,
-            session_id=session_id,
-            event_type="session_start",
-            event_data={
+        # Record session start. All analytics writes go through the background writer: the loop only
+        # enqueues, so MySQL latency never adds to answer latency.
+        analytics_writer.enqueue_event(
+            user_id,
+            session_id,
+            "session_start",
+            {
                 "page_url": page_url,
                 "timestamp": session_start_time.isoformat(),
                 "connection_type": "websocket",
@@ -202,180 +187,76 @@ async def websocket_endpoint_ws(websocket: WebSocket):
                 print(f"Received message from client: {data[:100]}...")
                 message = json.loads(data)
                 
-                # Update page URL if provided in the message
+                # Page URL and identity changes are written with this message's turn, or as a
+                # session update right away when the message carries no question
+                new_page_url = None
                 if "page_url" in message:
-                    page_url = message["page_url"]
-                    # Update session with page URL
-                    database.execute_query(
-                        """
-                        UPDATE sessions 
-                        SET page_url = %s 
-                        WHERE session_id = %s
-                        """,
-                        (page_url, session_id),
-                        fetch=False
-                    )
+                    page_url = new_page_url = message["page_url"]
                 
                 # Extract user_id from message if provided
+                identified_from = None
                 if "user_id" in message and message["user_id"]:
-                    new_user_id = message["user_id"]
-                    
-                    # First ensure the user exists by recording the identification event
-                    analytics.record_user_event(
-                        new_user_id,
-                        session_id,
-                        "user_identified",
-                        {
-                            "timestamp": datetime.now().isoformat(),
-                            "previous_id": user_id
-                        }
-                    )
-                    
-                    # Now that we know the user exists, update the session
-                    database.execute_query(
-                        """
-                        UPDATE sessions 
-                        SET user_id = %s 
-                        WHERE session_id = %s
-                        """,
-                        (new_user_id, session_id),
-                        fetch=False
-                    )
-                    
-                    user_id = new_user_id
+                    if message["user_id"] != user_id:
+                        identified_from = user_id
+                    user_id = message["user_id"]
                 
                 # Process the message
                 if "user_input" in message:
                     message_start_time = datetime.now()
                     print(f"Processing user input: {message['user_input'][:50]}...")
                     
-                    # Extract location data if available
+                    # Extract location data if available. Resolved once per turn (and once per
+                    # session for unchanged coordinates); the result feeds both analytics and the prompt.
                     user_location = message.get("user_location")
+                    location_info = "Unknown"
                     if user_location:
                         print(f"User location: {user_location}")
-                        
-                        # Get city name from coordinates if available
-                        if user_location.get('latitude') and user_location.get('longitude'):
-                            lat = user_location['latitude']
-                            lng = user_location['longitude']
-                            city_name = geocoding_service.get_city_from_coordinates(lat, lng)
-                            if city_name:
-                                user_location['city'] = city_name
-                                print(f"Detected city: {city_name}")
-                        
-                        # Store location data in session
-                        database.execute_query(
-                            """
-                            UPDATE sessions 
-                            SET location_data = %s 
-                            WHERE session_id = %s
-                            """,
-                            (json.dumps(user_location), session_id),
-                            fetch=False
-                        )
+                        location_info, resolved = await resolve_location(user_location, location_memo)
+                        if resolved and resolved["city"]:
+                            user_location['city'] = resolved["city"]
+                            print(f"Detected city: {resolved['city']}")
                     
-                    # Record the user's question with location
-                    analytics.record_user_event(
+                    # One analytics record per turn: question, answer, session columns
+                    turn = TurnRecord(
                         user_id,
                         session_id,
-                        "question_asked",
-                        {
-                            "question": message["user_input"],
-                            "timestamp": message_start_time.isoformat(),
-                            "chat_history_length": len(chat_histories[session_id]),
-                            "user_location": user_location
-                        }
-                    )
-
-                    # Check if conversation exists for this session
-                    conversation = database.execute_query(
-                        """
-                        SELECT conversation_id 
-                        FROM conversations 
-                        WHERE session_id = %s AND status = 'active'
-                        """,
-                        (session_id,)
+                        message["user_input"],
+                        message_start_time,
+                        page_url=new_page_url or (page_url if page_url != "unknown" else None),
+                        identified_from=identified_from,
+                        location=user_location
                     )
-
-                    if not conversation:
-                        # Create new conversation if none exists
-                        conversation_id = str(uuid.uuid4())
-                        database.execute_query(
-                            """
-                            INSERT INTO conversations 
-                            (conversation_id, session_id, user_id, start_time, status)
-                            VALUES (%s, %s, %s, %s, 'active')
-                            """,
-                            (conversation_id, session_id, user_id, message_start_time.isoformat()),
-                            fetch=False
-                        )
-                    else:
-                        conversation_id = conversation[0]['conversation_id']
                     
                     # Get chat history from message
                     chat_history = message.get("chat_history", [])
                     if chat_history:
                         formatted_history = [(msg["content"], "") for msg in chat_history if msg["role"] == "user"]
-                        chat_histories[session_id] = formatted_history
-                    
-                    # Build retriever
-                    retriever = vector_store.get_vector_store().as_retriever(search_kwargs={"k": 5})
-                    
-                    # Use ConversationalRetrievalChain
-                    qa = ConversationalRetrievalChain.from_llm(
-                        llm=llm_setup.get_llm(),
-                        retriever=retriever,
-                        combine_docs_chain_kwargs={"prompt": llm_setup.SYSTEM_PROMPT}
-                    )
+                        await _session(chat_histories.set_list, session_id, formatted_history)
                     
                     try:
-                        # Format location information for the LLM
-                        location_info = "Unknown"
-                        if user_location and user_location.get('latitude') and user_location.get('longitude'):
-                            lat = user_location['latitude']
-                            lng = user_location['longitude']
-                            location_info = get_location_context(lat, lng)
-                        
-                        # Get answer using chat history and location
-                        result = qa.invoke({
-                            "question": message["user_input"],
-                            "chat_history": chat_histories[session_id],
-                            "user_location": location_info
-                        })
-                        answer = result["answer"]
+                        # Stream the answer using chat history and location. Each frame carries the new
+                        # piece ("chunk") and the text so far ("text"), so clients that replace the
+                        # bubble and clients that append to it both render progressively.
+                        answer = ""
+                        ttft = None
+                        async for piece in rag_engine.astream(
+                            message["user_input"],
+                            await get_chat_history(session_id),
+                            location_info
+                        ):
+                            if ttft is None:
+                                ttft = (datetime.now() - message_start_time).total_seconds()
+                            answer += piece
+                            await websocket.send_json({"chunk": piece, "text": answer, "done": False})
                         response_time = (datetime.now() - message_start_time).total_seconds()
-                        
-                        # Record the bot's response
-                        analytics.record_user_event(
-                            user_id,
-                            session_id,
-                            "bot_response",
-                            {
-                                "response": answer,
-                                "timestamp": datetime.now().isoformat(),
-                                "response_time": response_time
-                            }
-                        )
+                        turn.answered(answer, response_time, ttft)
 
-                        # Update chat history
-                        chat_histories[session_id].append((message["user_input"], answer))
-                        
-                        # Update message count in sessions table (count each interaction as 1)
-                        database.execute_query(
-                            """
-                            UPDATE sessions 
-                            SET message_count = message_count + 1,
-                                last_message_time = %s
-                            WHERE session_id = %s
-                            """,
-                            (datetime.now().isoformat(), session_id),
-                            fetch=False
+                        # Update chat history (atomic append + trim to the last MAX_HISTORY_TURNS)
+                        await _session(
+                            chat_histories.append_and_trim,
+                            session_id, (message["user_input"], answer), MAX_HISTORY_TURNS
                         )
                         
-                        # Limit chat history length
-                        if len(chat_histories[session_id]) > 10:
-                            chat_histories[session_id] = chat_histories[session_id][-10:]
-                        
                         # Send response back to client
                         response = {
                             "text": answer,
@@ -383,59 +264,45 @@ async def websocket_endpoint_ws(websocket: WebSocket):
                         }
                         await websocket.send_json(response)
                         print(f"Response sent successfully for session {session_id}")
+                    except WebSocketDisconnect:
+                        raise
                     except Exception as e:
                         error_msg = f"Error processing request: {str(e)}"
                         print(error_msg)
                         
-                        # Record error event
-                        analytics.record_user_event(
-                            user_id,
-                            session_id,
-                            "error",
-                            {
-                                "error": str(e),
-                                "timestamp": datetime.now().isoformat(),
-                                "question": message["user_input"]
-                            }
-                        )
-                        
                         await websocket.send_json({
                             "error": error_msg,
                             "done": True
                         })
+                    finally:
+                        # Also on errors/disconnects: the question (and any answer) is still recorded
+                        analytics_writer.enqueue_turn(turn)
+                else:
+                    # Page URL / identification without a question: record it right away
+                    analytics_writer.enqueue_session_update(
+                        user_id,
+                        session_id,
+                        page_url=new_page_url or (page_url if page_url != "unknown" else None),
+                        identified_from=identified_from
+                    )
             except WebSocketDisconnect:
                 print(f"WebSocket disconnected for session {session_id}")
                 session_end_time = datetime.now()
                 session_duration = (session_end_time - session_start_time).total_seconds()
                 
-                # Update session with end time and duration
-                database.execute_query(
-                    """
-                    UPDATE sessions 
-                    SET end_time = %s,
-                        duration = %s,
-                        status = 'completed'
-                    WHERE session_id = %s
-                    """,
-                    (session_end_time.isoformat(), session_duration, session_id),
-                    fetch=False
-                )
-                
-                analytics.record_user_event(
+                # Session end time/duration and the session_end event, one record
+                analytics_writer.enqueue_session_end(
                     user_id,
                     session_id,
-                    "session_end",
-                    {
-                        "timestamp": session_end_time.isoformat(),
-                        "total_messages": len(chat_histories[session_id]),
-                        "duration": session_duration
-                    }
+                    session_end_time,
+                    session_duration,
+                    len(await get_chat_history(session_id))
                 )
                 break
             except Exception as e:
                 print(f"Error in WebSocket loop: {str(e)}")
                 if user_id:
-                    analytics.record_user_event(
+                    analytics_writer.enqueue_event(
                         user_id,
                         session_id,
                         "error",
@@ -453,9 +320,8 @@ async def websocket_endpoint_ws(websocket: WebSocket):
     except Exception as e:
         print(f"Fatal WebSocket error: {str(e)}")
     finally:
-        print(f"Cleaning up session {session_id}")
-        if session_id in chat_histories:
-            del chat_histories[session_id]
+        # The history stays in the session backend (expired after SESSION_STORE_IDLE_TTL idle), so a
+        # reconnect to any worker can resume it
         try:
             await websocket.close()
         except:
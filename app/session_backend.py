@@ -0,0 +1,440 @@
+# session_backend.py — pluggable store for per-session conversation state (app/ service)
+# In-process dicts tie a conversation to one worker, so multi-worker uvicorn or several nodes lose
+# context on reconnect. Every backend here exposes the same small API (values + capped lists with an
+# atomic append-and-trim) and is picked with SESSION_BACKEND:
+#   memory  — process-local SessionStore (default; single worker)
+#   sqlite  — one file shared by all workers on a box (SESSION_SQLITE_PATH)
+#   redis   — any Redis-protocol server shared across nodes (SESSION_REDIS_URL)
+# Values must be JSON-serialisable; shared backends round-trip them through JSON.
+# Same interface and settings as apollo_ai_agent/session_backend.py, kept in step with it: app/ is a
+# package and does not import the agent's flat modules. SESSION_STORE_IDLE_TTL is the idle TTL everywhere.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .session_store import SessionStore, make_store
+
+
+class SessionBackend:
+    """Interface. `ns` separates kinds of state (history, contexts, ...); `key` is usually the user id."""
+
+    name = "base"
+    # True when calls do network/disk I/O and should be run off the event loop
+    blocking = False
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._counter_lock = threading.Lock()
+
+    # ---- scalar values ----
+
+    def get_value(self, ns: str, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set_value(self, ns: str, key: str, value: Any):
+        raise NotImplementedError
+
+    def delete(self, ns: str, key: str):
+        raise NotImplementedError
+
+    # ---- capped lists ----
+
+    def get_list(self, ns: str, key: str) -> Optional[List[Any]]:
+        """
+        Items oldest-first, or None when nothing is stored for key (caller may rehydrate).
+        A list stored empty with set_list comes back as [], not None.
+        """
+        raise NotImplementedError
+
+    def set_list(self, ns: str, key: str, items: List[Any]):
+        raise NotImplementedError
+
+    def append_and_trim(self, ns: str, key: str, item: Any, max_len: int) -> int:
+        """Atomically append item and keep only the newest max_len items; returns the new length."""
+        raise NotImplementedError
+
+    # ---- stats ----
+
+    def count(self, ns: str, counter: str, n: int = 1):
+        with self._counter_lock:
+            bucket = self._counters.setdefault(ns, {})
+            bucket[counter] = bucket.get(counter, 0) + n
+
+    def stats(self, ns: str) -> Dict[str, Any]:
+        with self._counter_lock:
+            s = dict(self._counters.get(ns, {}))
+        s.update({"backend": self.name, "namespace": ns})
+        return s
+
+    def namespace(self, ns: str) -> "SessionNamespace":
+        return SessionNamespace(self, ns)
+
+    @staticmethod
+    def _list_marker_ns(ns: str) -> str:
+        """Namespace of the "list was set" markers (shared backends cannot store an empty list)."""
+        return f"{ns}#list"
+
+
+class SessionNamespace:
+    """Backend bound to one namespace, so callers read like the dicts they replace."""
+
+    def __init__(self, backend: SessionBackend, ns: str):
+        self.backend = backend
+        self.ns = ns
+
+    def get(self, key, default=None):
+        return self.backend.get_value(self.ns, key, default)
+
+    def set(self, key, value):
+        self.backend.set_value(self.ns, key, value)
+
+    def delete(self, key):
+        self.backend.delete(self.ns, key)
+
+    def get_list(self, key):
+        return self.backend.get_list(self.ns, key)
+
+    def set_list(self, key, items):
+        self.backend.set_list(self.ns, key, items)
+
+    def append_and_trim(self, key, item, max_len):
+        return self.backend.append_and_trim(self.ns, key, item, max_len)
+
+    def count(self, counter: str, n: int = 1):
+        self.backend.count(self.ns, counter, n)
+
+    def stats(self):
+        return self.backend.stats(self.ns)
+
+
+# ---------------------------------------------------------------------------
+# In-process
+# ---------------------------------------------------------------------------
+
+class InProcessSessionBackend(SessionBackend):
+    """One bounded SessionStore per namespace (LRU + idle TTL + memory cap)."""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self):
+        super().__init__()
+        self._stores: Dict[str, SessionStore] = {}
+        self._lock = threading.Lock()
+
+    def _store(self, ns: str) -> SessionStore:
+        store = self._stores.get(ns)
+        if store is None:
+            with self._lock:
+                store = self._stores.setdefault(ns, make_store(ns))
+        return store
+
+    def get_value(self, ns, key, default=None):
+        return self._store(ns).get(key, default)
+
+    def set_value(self, ns, key, value):
+        self._store(ns).set(key, value)
+
+    def delete(self, ns, key):
+        self._store(ns).pop(key)
+
+    def get_list(self, ns, key):
+        items = self._store(ns).get(key)
+        return list(items) if items is not None else None
+
+    def set_list(self, ns, key, items):
+        self._store(ns).set(key, list(items))
+
+    def append_and_trim(self, ns, key, item, max_len):
+        # Build a new list (not append in place) so the store re-measures the entry
+        return len(self._store(ns).update(key, lambda items: ((items or []) + [item])[-max_len:]))
+
+    def stats(self, ns):
+        s = self._store(ns).stats()
+        s.update(super().stats(ns))
+        return s
+
+
+# ---------------------------------------------------------------------------
+# SQLite (shared by every worker on one box)
+# ---------------------------------------------------------------------------
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    WAL-mode SQLite file. Each thread gets its own connection; writes use BEGIN IMMEDIATE so
+    append-and-trim is atomic across worker processes. Entries idle longer than idle_ttl are
+    treated as missing and purged periodically.
+    """
+
+    name = "sqlite"
+    blocking = True
+
+    PURGE_EVERY = 500  # writes between idle purges
+
+    def __init__(self, path: str = "session_state.db", idle_ttl: float = 2 * 3600):
+        super().__init__()
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self._init_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: we issue BEGIN/COMMIT ourselves
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS session_values (
+                ns TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (ns, key)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS session_lists (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ns TEXT NOT NULL,
+                key TEXT NOT NULL,
+                item TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_session_lists_key ON session_lists (ns, key, id)")
+
+    def _cutoff(self) -> float:
+        return time.time() - self.idle_ttl if self.idle_ttl > 0 else float("-inf")
+
+    def _after_write(self):
+        with self._writes_lock:
+            self._writes += 1
+            due = self._writes % self.PURGE_EVERY == 0
+        if due:
+            self.purge_idle()
+
+    def purge_idle(self) -> int:
+        """Delete values and lists whose last write is older than idle_ttl."""
+        if self.idle_ttl <= 0:
+            return 0
+        conn = self._conn()
+        cutoff = self._cutoff()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = conn.execute("DELETE FROM session_values WHERE updated_at < ?", (cutoff,)).rowcount
+            removed += conn.execute("""
+                DELETE FROM session_lists WHERE (ns, key) IN (
+                    SELECT ns, key FROM session_lists GROUP BY ns, key HAVING MAX(updated_at) < ?
+                )
+            """, (cutoff,)).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return removed
+
+    def get_value(self, ns, key, default=None):
+        row = self._conn().execute(
+            "SELECT value FROM session_values WHERE ns = ? AND key = ? AND updated_at >= ?",
+            (ns, key, self._cutoff()),
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_value(self, ns, key, value):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO session_values (ns, key, value, updated_at) VALUES (?, ?, ?, ?)",
+            (ns, key, json.dumps(value), time.time()),
+        )
+        self._after_write()
+
+    def delete(self, ns, key):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM session_values WHERE ns IN (?, ?) AND key = ?", (ns, self._list_marker_ns(ns), key))
+            conn.execute("DELETE FROM session_lists WHERE ns = ? AND key = ?", (ns, key))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_list(self, ns, key):
+        rows = self._conn().execute(
+            "SELECT item, updated_at FROM session_lists WHERE ns = ? AND key = ? ORDER BY id",
+            (ns, key),
+        ).fetchall()
+        if not rows:
+            # Stored empty (marker written by set_list) vs never stored / expired
+            return [] if self.get_value(self._list_marker_ns(ns), key) else None
+        if rows[-1][1] < self._cutoff():
+            return None
+        return [json.loads(item) for item, _ in rows]
+
+    def set_list(self, ns, key, items):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM session_lists WHERE ns = ? AND key = ?", (ns, key))
+            conn.executemany(
+                "INSERT INTO session_lists (ns, key, item, updated_at) VALUES (?, ?, ?, ?)",
+                [(ns, key, json.dumps(item), now) for item in items],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO session_values (ns, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (self._list_marker_ns(ns), key, "true", now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._after_write()
+
+    def append_and_trim(self, ns, key, item, max_len):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO session_lists (ns, key, item, updated_at) VALUES (?, ?, ?, ?)",
+                (ns, key, json.dumps(item), now),
+            )
+            conn.execute("""
+                DELETE FROM session_lists WHERE ns = ? AND key = ? AND id NOT IN (
+                    SELECT id FROM session_lists WHERE ns = ? AND key = ? ORDER BY id DESC LIMIT ?
+                )
+            """, (ns, key, ns, key, max_len))
+            length = conn.execute(
+                "SELECT COUNT(*) FROM session_lists WHERE ns = ? AND key = ?", (ns, key)
+            ).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._after_write()
+        return length
+
+    def stats(self, ns):
+        s = super().stats(ns)
+        conn = self._conn()
+        s["entries"] = conn.execute(
+            "SELECT COUNT(*) FROM session_values WHERE ns = ?", (ns,)
+        ).fetchone()[0] + conn.execute(
+            "SELECT COUNT(DISTINCT key) FROM session_lists WHERE ns = ?", (ns,)
+        ).fetchone()[0]
+        s["path"] = self.path
+        s["idle_ttl"] = self.idle_ttl
+        return s
+
+
+# ---------------------------------------------------------------------------
+# Redis protocol (shared across nodes)
+# ---------------------------------------------------------------------------
+
+class RedisSessionBackend(SessionBackend):
+    """
+    Works with any server speaking the Redis protocol (Redis, Valkey, KeyDB, a local stand-in).
+    Pass `client` to inject a connection (e.g. in tests); otherwise one is built from `url`
+    with the optional `redis` package. Every write refreshes the key's idle TTL.
+    """
+
+    name = "redis"
+    blocking = True
+
+    def __init__(self, url: str = "redis://localhost:6379/0", client=None,
+                 prefix: str = "apollo:session", idle_ttl: float = 2 * 3600):
+        super().__init__()
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("SESSION_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.idle_ttl = int(idle_ttl)
+
+    def _k(self, ns: str, key: str) -> str:
+        return f"{self.prefix}:{ns}:{key}"
+
+    def get_value(self, ns, key, default=None):
+        raw = self.client.get(self._k(ns, key))
+        return json.loads(raw) if raw is not None else default
+
+    def set_value(self, ns, key, value):
+        if self.idle_ttl > 0:
+            self.client.set(self._k(ns, key), json.dumps(value), ex=self.idle_ttl)
+        else:
+            self.client.set(self._k(ns, key), json.dumps(value))
+
+    def delete(self, ns, key):
+        self.client.delete(self._k(ns, key), self._k(self._list_marker_ns(ns), key))
+
+    def get_list(self, ns, key):
+        # A Redis list with no items does not exist: the marker set_list writes tells empty from missing
+        items = self.client.lrange(self._k(ns, key), 0, -1)
+        if items:
+            return [json.loads(item) for item in items]
+        return [] if self.client.exists(self._k(self._list_marker_ns(ns), key)) else None
+
+    def set_list(self, ns, key, items):
+        k = self._k(ns, key)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(k)
+        if items:
+            pipe.rpush(k, *[json.dumps(item) for item in items])
+            if self.idle_ttl > 0:
+                pipe.expire(k, self.idle_ttl)
+        # Never outlives the list: later appends refresh the list's TTL, not the marker's
+        if self.idle_ttl > 0:
+            pipe.set(self._k(self._list_marker_ns(ns), key), "1", ex=self.idle_ttl)
+        else:
+            pipe.set(self._k(self._list_marker_ns(ns), key), "1")
+        pipe.execute()
+
+    def append_and_trim(self, ns, key, item, max_len):
+        # MULTI/EXEC: concurrent appends from other workers cannot interleave with the trim
+        k = self._k(ns, key)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.rpush(k, json.dumps(item))
+        pipe.ltrim(k, -max_len, -1)
+        if self.idle_ttl > 0:
+            pipe.expire(k, self.idle_ttl)
+        pipe.llen(k)
+        return int(pipe.execute()[-1])
+
+    def stats(self, ns):
+        s = super().stats(ns)
+        s["prefix"] = f"{self.prefix}:{ns}"
+        s["idle_ttl"] = self.idle_ttl
+        return s
+
+
+def make_backend(kind: Optional[str] = None) -> SessionBackend:
+    """Build the backend named by SESSION_BACKEND (memory | sqlite | redis)."""
+    kind = (kind or os.getenv("SESSION_BACKEND", "memory")).strip().lower()
+    idle_ttl = float(os.getenv("SESSION_STORE_IDLE_TTL", str(2 * 3600)))
+    if kind == "sqlite":
+        return SQLiteSessionBackend(os.getenv("SESSION_SQLITE_PATH", "session_state.db"), idle_ttl=idle_ttl)
+    if kind == "redis":
+        return RedisSessionBackend(
+            os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0"),
+            prefix=os.getenv("SESSION_REDIS_PREFIX", "apollo:session"),
+            idle_ttl=idle_ttl,
+        )
+    if kind != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND '{kind}' (expected memory, sqlite or redis)")
+    return InProcessSessionBackend()
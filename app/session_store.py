@@ -0,0 +1,154 @@
+# session_store.py — bounded in-memory session state for the app/ chat router
+# Dict-like store with LRU ordering, idle-TTL expiry, an entry cap and an approximate memory cap
+# (same as apollo_ai_agent/session_store.py, SESSION_STORE_* settings). Idle websocket histories
+# expire here instead of being deleted on disconnect, so a reconnect within the TTL resumes them.
+# Used by session_backend.InProcessSessionBackend (the default SESSION_BACKEND).
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+def approx_size(value: Any) -> int:
+    """Rough deep size in bytes for the small JSON-like values we keep (str/list/dict/scalars)."""
+    if isinstance(value, str):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(approx_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class SessionStore:
+    """
+    LRU + idle-TTL map. Reads and writes refresh an entry's position and idle clock.
+    Note: mutate values through set()/store[key] = value so size accounting stays correct.
+    """
+
+    def __init__(self, name: str, max_entries: int = 50000, idle_ttl: float = 2 * 3600, max_bytes: int = 64 * 1024 * 1024):
+        self.name = name
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, list]" = OrderedDict()  # key -> [value, last_access, size]
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._stats = {"evictions": 0, "expirations": 0}
+
+    # ---- internals ----
+
+    def _drop_locked(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def _expire_locked(self, now: float):
+        # Least recently used entries sit at the front, so idle ones are found first
+        while self._data and self.idle_ttl > 0:
+            key, (_, last_access, _) = next(iter(self._data.items()))
+            if now - last_access <= self.idle_ttl:
+                break
+            self._drop_locked(key)
+            self._stats["expirations"] += 1
+
+    def _evict_locked(self):
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._data))
+            self._drop_locked(key)
+            self._stats["evictions"] += 1
+
+    # ---- dict-like API ----
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            self._expire_locked(now)
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            entry[1] = now
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        now = time.monotonic()
+        size = approx_size(value)
+        with self._lock:
+            if key in self._data:
+                self._drop_locked(key)
+            self._data[key] = [value, now, size]
+            self._bytes += size
+            self._expire_locked(now)
+            self._evict_locked()
+
+    def update(self, key, fn, default=None):
+        """Atomically replace the value with fn(current or default); returns the new value."""
+        with self._lock:
+            value = fn(self.get(key, default))
+            self.set(key, value)
+            return value
+
+    def setdefault(self, key, default=None):
+        with self._lock:
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                self.set(key, default)
+                return default
+            return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            self._drop_locked(key)
+            return entry[0]
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        if self.pop(key, _MISSING) is _MISSING:
+            raise KeyError(key)
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._expire_locked(time.monotonic())
+            s = dict(self._stats)
+            s.update({
+                "name": self.name,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "idle_ttl": self.idle_ttl,
+            })
+            return s
+
+
+def make_store(name: str, max_bytes: Optional[int] = None) -> SessionStore:
+    """Build a store from SESSION_STORE_* env settings."""
+    return SessionStore(
+        name,
+        max_entries=int(os.getenv("SESSION_STORE_MAX_ENTRIES", "50000")),
+        idle_ttl=float(os.getenv("SESSION_STORE_IDLE_TTL", str(2 * 3600))),
+        max_bytes=max_bytes if max_bytes is not None else int(os.getenv("SESSION_STORE_MAX_BYTES", str(64 * 1024 * 1024))),
+    )
@@ -0,0 +1,446 @@
+# suggestions.py — suggested follow-up questions for /chat/generate-questions without an LLM call
+# The widget asks for 5 suggestions after every answer. They now come from a question bank per topic
+# (model family, warranty, pricing, dealers, maintenance, ...) built offline, ranked by a light
+# TF-IDF cosine against the conversation, and cached in an LRU keyed by topic plus a fingerprint of
+# what the ranking reads (the user turns and the last answer). Gemini is only asked when the bank has nothing relevant (cache miss + low
+# match score), under a strict timeout; on timeout or error the bank answer is returned.
+#
+# Rebuild the bank (optionally topping each topic up with Gemini-written questions):
+#   python -m app.suggestions build [--llm-per-topic 5]
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .query_builder import extract_entities
+
+BANK_PATH = os.getenv("SUGGESTION_BANK_PATH", os.path.join(os.path.dirname(__file__), "suggestion_bank.json"))
+NUM_QUESTIONS = 5
+
+FALLBACK_QUESTIONS = [
+    "What is the warranty period for Apollo tyres?",
+    "How do I find a nearby Apollo dealer?",
+    "What are the different types of Apollo tyres?",
+    "How to maintain my tyres properly?",
+    "What is the recommended tyre pressure?"
+]
+
+# Display names for the model families in query_builder.TYRE_LINES
+MODEL_NAMES = {
+    "amazer": "Amazer", "alnac": "Alnac", "apterra": "Apterra", "aspire": "Aspire", "acelere": "Acelere",
+    "altrust": "Altrust", "alpha": "Alpha", "actizip": "Actizip", "actigrip": "Actigrip",
+    "endurace": "EnduRace", "endutrax": "EnduTrax", "endumile": "EnduMile", "amar": "Amar", "xt-7": "XT-7",
+    "loadstar": "LoadStar", "krishak": "Krishak", "tramplus": "Tramplus", "vredestein": "Vredestein",
+}
+
+MODEL_TEMPLATES = [
+    "What sizes does the Apollo {model} come in?",
+    "What is the price of the Apollo {model}?",
+    "What is the warranty on the Apollo {model}?",
+    "Which vehicles is the Apollo {model} suitable for?",
+    "How does the Apollo {model} perform on wet roads?",
+    "Where can I buy the Apollo {model} near me?",
+]
+
+# topic -> (keywords that signal the topic, curated questions)
+TOPICS: Dict[str, Tuple[Sequence[str], Sequence[str]]] = {
+    "warranty": (
+        ("warranty", "guarantee", "claim", "defect", "replacement", "coverage", "covered"),
+        (
+            "What does the Apollo tyre warranty cover?",
+            "How do I claim warranty on my Apollo tyre?",
+            "Do I need the purchase invoice for a warranty claim?",
+            "Is tyre damage from punctures covered under warranty?",
+            "How long is the warranty on Apollo car tyres?",
+            "Is the warranty different for truck and bus tyres?",
+        ),
+    ),
+    "pricing": (
+        ("price", "cost", "budget", "cheap", "expensive", "offer", "discount", "emi", "rate"),
+        (
+            "What is the price range of Apollo car tyres?",
+            "Which Apollo tyre is best for a tight budget?",
+            "Are there any current offers on Apollo tyres?",
+            "Does the price include fitting and balancing?",
+            "Are Apollo SUV tyres more expensive than car tyres?",
+        ),
+    ),
+    "dealers": (
+        ("dealer", "store", "shop", "near", "nearby", "buy", "location", "showroom", "outlet"),
+        (
+            "How do I find a nearby Apollo dealer?",
+            "Can I buy Apollo tyres online?",
+            "What are the opening hours of Apollo dealers?",
+            "Do Apollo dealers offer doorstep fitting?",
+            "Can I check tyre availability at a dealer before visiting?",
+        ),
+    ),
+    "installation": (
+        ("install", "fitting", "fit", "alignment", "balancing", "rotation", "service", "mount"),
+        (
+            "Do Apollo dealers do wheel alignment and balancing?",
+            "How long does it take to fit new tyres?",
+            "Should I replace all four tyres at once?",
+            "How often should I get wheel alignment done?",
+        ),
+    ),
+    "maintenance": (
+        ("maintain", "maintenance", "pressure", "psi", "wear", "tread", "puncture", "care", "inflate", "rotate"),
+        (
+            "What is the recommended tyre pressure?",
+            "How to maintain my tyres properly?",
+            "How often should I rotate my tyres?",
+            "How do I know when my tyres need replacing?",
+            "How do I check the tread depth of my tyres?",
+            "Can I drive on a punctured tubeless tyre?",
+        ),
+    ),
+    "performance": (
+        ("performance", "grip", "mileage", "durability", "durable", "wet", "noise", "comfort", "handling",
+         "braking", "load", "speed", "off-road", "offroad", "highway"),
+        (
+            "Which Apollo tyre gives the best mileage?",
+            "Which Apollo tyre has the best grip in the rain?",
+            "Which Apollo tyres are quietest on the highway?",
+            "What do the load index and speed rating mean?",
+            "Which Apollo tyre is best for off-road driving?",
+        ),
+    ),
+    "recommendation": (
+        ("suggest", "recommend", "best", "which", "suitable", "car", "suv", "bike", "truck", "vehicle", "compare"),
+        (
+            "Which Apollo tyre is best for my car?",
+            "What are the different types of Apollo tyres?",
+            "Which Apollo tyres are best for city driving?",
+            "Which Apollo tyres suit long highway drives?",
+            "Can you compare Amazer and Alnac tyres?",
+            "Which Apollo tyres are available for two-wheelers?",
+        ),
+    ),
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9/+-]*")
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "do", "does", "i", "my", "me", "of", "for", "to", "in", "on", "and",
+    "or", "what", "how", "can", "you", "it", "this", "that", "with", "be", "at", "there", "any", "should",
+    "apollo", "tyre", "tyres", "tire", "tires",
+}
+
+
+def _tokens(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+def _normalize(text: str) -> str:
+    return " ".join(_TOKEN_RE.findall((text or "").lower()))
+
+
+# ---------------------------------------------------------------------------
+# Offline bank
+# ---------------------------------------------------------------------------
+
+def build_bank(llm_per_topic: int = 0) -> Dict[str, List[str]]:
+    """topic -> questions: curated topic questions plus templates for every model family."""
+    bank = {topic: list(questions) for topic, (_, questions) in TOPICS.items()}
+    for key, name in MODEL_NAMES.items():
+        bank[f"model:{key}"] = [t.format(model=name) for t in MODEL_TEMPLATES]
+    if llm_per_topic:
+        from .llm_setup import get_llm
+        llm = get_llm()
+        for topic in list(bank):
+            prompt = (
+                f"Write {llm_per_topic} short questions a customer might ask an Apollo Tyres assistant about "
+                f"'{topic.replace('model:', 'the Apollo ')}'. One per line, no numbering."
+            )
+            extra = [q.strip(" -*\t") for q in llm.invoke(prompt).content.splitlines() if q.strip()]
+            bank[topic].extend(extra[:llm_per_topic])
+    # Dedupe (case/punctuation-insensitive), keep order
+    for topic, questions in bank.items():
+        seen, unique = set(), []
+        for q in questions:
+            if _normalize(q) not in seen:
+                seen.add(_normalize(q))
+                unique.append(q)
+        bank[topic] = unique
+    return bank
+
+
+def load_bank(path: str = BANK_PATH) -> Dict[str, List[str]]:
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)["topics"]
+    print(f"Suggestion bank not found at {path}; using the built-in questions")
+    return build_bank()
+
+
+# ---------------------------------------------------------------------------
+# Ranking
+# ---------------------------------------------------------------------------
+
+class QuestionIndex:
+    """TF-IDF vectors for every bank question, precomputed once."""
+
+    def __init__(self, bank: Dict[str, List[str]]):
+        self.entries: List[Tuple[str, str]] = [(topic, q) for topic, qs in bank.items() for q in qs]
+        df = Counter()
+        docs = [set(_tokens(q)) for _, q in self.entries]
+        for doc in docs:
+            df.update(doc)
+        n = max(1, len(docs))
+        self.idf = {t: math.log((n + 1) / (c + 1)) + 1.0 for t, c in df.items()}
+        self.vectors = [self.vectorize(q) for _, q in self.entries]
+
+    def vectorize(self, text: str, weight: float = 1.0, into: Dict[str, float] = None) -> Dict[str, float]:
+        vec = into if into is not None else {}
+        for t, c in Counter(_tokens(text)).items():
+            vec[t] = vec.get(t, 0.0) + weight * c * self.idf.get(t, 1.0)
+        return vec
+
+    @staticmethod
+    def cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+        if not a or not b:
+            return 0.0
+        if len(a) > len(b):
+            a, b = b, a
+        dot = sum(v * b.get(t, 0.0) for t, v in a.items())
+        if not dot:
+            return 0.0
+        return dot / (math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values())))
+
+
+def _turns(conversation_history: Sequence[dict], role: str) -> List[str]:
+    return [
+        m.get("content", m.get("text", "")) for m in conversation_history or []
+        if isinstance(m, dict) and m.get("role") == role and (m.get("content") or m.get("text"))
+    ]
+
+
+def detect_topics(text: str) -> List[str]:
+    """Topics mentioned in text, strongest first; model families come first."""
+    found = []
+    model = extract_entities(text).get("model")
+    if model:
+        key = model.split()[0].lower()
+        if key in MODEL_NAMES:
+            found.append(f"model:{key}")
+    tokens = set(_TOKEN_RE.findall((text or "").lower()))
+    scores = {topic: sum(1 for k in keywords if k in tokens) for topic, (keywords, _) in TOPICS.items()}
+    found.extend(t for t, s in sorted(scores.items(), key=lambda kv: -kv[1]) if s)
+    return found
+
+
+def fingerprint(conversation_history: Sequence[dict], current_topic: str = "") -> str:
+    """Stable key for everything rank() reads: every user turn (already-asked filter) and the last answer."""
+    user = [_normalize(t) for t in _turns(conversation_history, "user")]
+    bot = _turns(conversation_history, "assistant")[-1:]
+    raw = "\n".join([_normalize(current_topic)] + user + ["assistant:" + _normalize(t) for t in bot])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+# ---------------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------------
+
+SUGGESTION_PROMPT = """
+Based on the following conversation about Apollo Tyres, generate 5 relevant follow-up questions that a user might ask about Apollo Tyres products and services.
+
+Conversation History:
+{history}
+
+Current Topic: {topic}
+
+Generate 5 questions that users would naturally ask about Apollo Tyres, such as:
+1. Questions about specific Apollo tyre models and their features
+2. Questions about warranty, pricing, and availability
+3. Questions about tyre performance, durability, and specifications
+4. Questions about finding dealers, installation, and services
+5. Questions about tyre maintenance, care, and best practices
+
+Make sure the questions are:
+- From the user's perspective (what users would ask)
+- Specific to Apollo Tyres products and services
+- Natural and conversational
+- Relevant to the current conversation context
+
+Return only the questions, one per line, without numbering or bullet points.
+"""
+
+
+class SuggestionEngine:
+    def __init__(self, bank: Dict[str, List[str]] = None, cache_size: int = 2048, cache_ttl: float = 3600.0,
+                 min_score: float = 0.12, llm_fallback: bool = True, llm_timeout: float = 2.5,
+                 per_topic: int = 2):
+        self.index = QuestionIndex(bank if bank is not None else load_bank())
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.min_score = min_score
+        self.llm_fallback = llm_fallback
+        self.llm_timeout = llm_timeout
+        self.per_topic = per_topic  # diversity: at most this many suggestions from one topic
+        self._cache: "OrderedDict[str, Tuple[float, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._llm = None
+        self._stats = {"requests": 0, "cache_hits": 0, "bank": 0, "llm_calls": 0, "llm_timeouts": 0, "llm_errors": 0}
+
+    # ---- cache ----
+
+    def _cache_get(self, key: str) -> Optional[List[str]]:
+        with self._lock:
+            item = self._cache.get(key)
+            if item is None:
+                return None
+            stored_at, questions = item
+            if time.monotonic() - stored_at > self.cache_ttl:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return list(questions)
+
+    def _cache_put(self, key: str, questions: List[str]):
+        with self._lock:
+            self._cache[key] = (time.monotonic(), list(questions))
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # ---- ranking ----
+
+    def rank(self, conversation_history: Sequence[dict], current_topic: str = "",
+             k: int = NUM_QUESTIONS) -> Tuple[List[str], float]:
+        """Best k bank questions for the conversation and the top match score."""
+        user_turns = _turns(conversation_history, "user")
+        bot_turns = _turns(conversation_history, "assistant")
+        latest = user_turns[-1] if user_turns else ""
+        topics = detect_topics(" ".join([current_topic] + user_turns[-3:]))
+
+        # Newest user turn counts most; the last answer adds context (models it mentioned, etc.)
+        query: Dict[str, float] = {}
+        self.index.vectorize(latest, 1.0, query)
+        for turn in user_turns[-3:-1]:
+            self.index.vectorize(turn, 0.5, query)
+        self.index.vectorize(current_topic, 0.7, query)
+        if bot_turns:
+            self.index.vectorize(bot_turns[-1], 0.3, query)
+
+        asked = [self.index.vectorize(t) for t in user_turns]
+        scored = []
+        for (topic, question), vec in zip(self.index.entries, self.index.vectors):
+            score = self.index.cosine(query, vec)
+            if topic.startswith("model:") and topic not in topics:
+                # Another model family's template only matched on the generic words ("warranty")
+                score *= 0.5
+            if topic in topics:
+                # Boost by topic strength: the first detected topic gets the most
+                score += 0.2 / (1 + topics.index(topic))
+            scored.append((score, topic, question, vec))
+        scored.sort(key=lambda s: -s[0])
+
+        picked, per_topic = [], Counter()
+        for score, topic, question, vec in scored:
+            if len(picked) == k or score <= 0:
+                break
+            # Families the user has not mentioned share one slot budget; the main topic gets one extra
+            group = "model:other" if topic.startswith("model:") and topic not in topics else topic
+            limit = self.per_topic + (1 if topics and group == topics[0] else 0)
+            if per_topic[group] >= limit:
+                continue
+            if any(self.index.cosine(vec, a) > 0.85 for a in asked):
+                continue  # the user already asked this
+            picked.append(question)
+            per_topic[group] += 1
+        top = scored[0][0] if scored else 0.0
+        return picked, top
+
+    # ---- LLM fallback ----
+
+    async def _llm_questions(self, conversation_history: Sequence[dict], current_topic: str) -> List[str]:
+        if self._llm is None:
+            from .llm_setup import get_llm
+            self._llm = get_llm()
+        history = "".join(
+            f"{'User' if m.get('role') == 'user' else 'Bot'}: {m.get('content', m.get('text', ''))}\n"
+            for m in conversation_history or [] if isinstance(m, dict)
+        )
+        self._stats["llm_calls"] += 1
+        response = await asyncio.wait_for(
+            self._llm.ainvoke(SUGGESTION_PROMPT.format(history=history, topic=current_topic)),
+            timeout=self.llm_timeout
+        )
+        return [q.strip() for q in response.content.strip().split("\n") if q.strip()]
+
+    async def suggest(self, conversation_history: Sequence[dict], current_topic: str = "") -> Tuple[List[str], str]:
+        """Returns (questions, source) where source is cache | bank | llm."""
+        self._stats["requests"] += 1
+        topics = detect_topics(" ".join([current_topic] + _turns(conversation_history, "user")[-3:]))
+        key = f"{topics[0] if topics else 'general'}|{fingerprint(conversation_history, current_topic)}"
+        cached = self._cache_get(key)
+        if cached is not None:
+            self._stats["cache_hits"] += 1
+            return cached, "cache"
+
+        questions, top_score = self.rank(conversation_history, current_topic)
+        source = "bank"
+        if self.llm_fallback and top_score < self.min_score and conversation_history:
+            try:
+                generated = await self._llm_questions(conversation_history, current_topic)
+                if generated:
+                    questions = (generated + [q for q in questions if q not in generated])[:NUM_QUESTIONS]
+                    source = "llm"
+            except asyncio.TimeoutError:
+                self._stats["llm_timeouts"] += 1
+                print(f"Suggestion LLM fallback timed out after {self.llm_timeout}s; using the question bank")
+            except Exception as e:
+                self._stats["llm_errors"] += 1
+                print(f"Suggestion LLM fallback failed: {e}")
+        if source == "bank":
+            self._stats["bank"] += 1
+
+        questions.extend(q for q in FALLBACK_QUESTIONS if q not in questions)
+        questions = questions[:NUM_QUESTIONS]
+        self._cache_put(key, questions)
+        return questions, source
+
+    def stats(self) -> dict:
+        s = dict(self._stats)
+        with self._lock:
+            s["cache_entries"] = len(self._cache)
+        s["bank_questions"] = len(self.index.entries)
+        return s
+
+
+suggestion_engine = SuggestionEngine(
+    cache_size=int(os.getenv("SUGGESTIONS_CACHE_SIZE", "2048")),
+    cache_ttl=float(os.getenv("SUGGESTIONS_CACHE_TTL", "3600")),
+    min_score=float(os.getenv("SUGGESTIONS_MIN_SCORE", "0.12")),
+    llm_fallback=os.getenv("SUGGESTIONS_LLM_FALLBACK", "1") == "1",
+    llm_timeout=float(os.getenv("SUGGESTIONS_LLM_TIMEOUT", "2.5")),
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.suggestions", description="Manage the suggested-question bank")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="write the question bank JSON")
+    build.add_argument("--out", default=BANK_PATH)
+    build.add_argument("--llm-per-topic", type=int, default=0, help="extra Gemini-written questions per topic")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        bank = build_bank(args.llm_per_topic)
+        with open(args.out, "w") as f:
+            json.dump({"topics": bank}, f, indent=2)
+        print(f"Wrote {sum(len(q) for q in bank.values())} questions in {len(bank)} topics to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,10 @@
 import os
+import sys
+import time
 import uuid
+import shutil
+import argparse
+import threading
 import pandas as pd
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
@@ -7,33 +12,199 @@ from langchain_core.documents import Document
 from .config import settings
 
 embeddings = GoogleGenerativeAIEmbeddings(
-    model=settings.EMBED_MODEL, 
+    model=settings.EMBED_MODEL,
     google_api_key=settings.GEMINI_API_KEY
 )
 
+# Process-wide Chroma handle: opened once (startup warm-up or first use), then shared.
+# PERSIST_DIRECTORY is a symlink to the current index version (<dir>.v<timestamp>); the process opens
+# the resolved version, so a rebuild swapping the link never changes files under a running store.
+_store = None
+_store_path = None
+_store_lock = threading.Lock()
+_load_seconds = None
+_load_error = None
+
+BUILD_COMMAND = "python -m app.vector_store build"
+
+
+class VectorStoreNotReady(RuntimeError):
+    """The persisted index is missing; it is built offline with BUILD_COMMAND, never in a request."""
+
+
+def _index_exists(persist_directory: str) -> bool:
+    return os.path.isdir(persist_directory) and bool(os.listdir(persist_directory))
+
+
+def _versions(persist_directory: str) -> list:
+    """Index version directories next to persist_directory, newest first."""
+    prefix = os.path.basename(persist_directory) + ".v"
+    parent = os.path.dirname(persist_directory)
+    paths = [
+        os.path.join(parent, name) for name in os.listdir(parent)
+        if name.startswith(prefix) and os.path.isdir(os.path.join(parent, name))
+    ]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
 def get_vector_store():
-    if os.path.exists(settings.PERSIST_DIRECTORY):
+    """Return the shared Chroma store, opening the persisted index on first use."""
+    global _store, _store_path, _load_seconds, _load_error
+    if _store is not None:
+        return _store
+    with _store_lock:
+        if _store is not None:
+            return _store
+        if not _index_exists(settings.PERSIST_DIRECTORY):
+            _load_error = f"No vector index at '{settings.PERSIST_DIRECTORY}'. Build it with: {BUILD_COMMAND}"
+            raise VectorStoreNotReady(_load_error)
         print("Loading existing vector store...")
-        return Chroma(
-            persist_directory=settings.PERSIST_DIRECTORY,
+        start = time.perf_counter()
+        path = os.path.realpath(settings.PERSIST_DIRECTORY)
+        _store = Chroma(
+            persist_directory=path,
             embedding_function=embeddings
         )
-    
+        _store_path = path
+        _load_seconds = time.perf_counter() - start
+        _load_error = None
+        print(f"Vector store loaded in {_load_seconds:.2f}s")
+        return _store
+
+
+def warm_up() -> bool:
+    """Open the store at startup. Returns False (and records why) instead of raising."""
+    global _load_error
+    try:
+        get_vector_store()
+        return True
+    except Exception as e:
+        _load_error = str(e)
+        print(f"Vector store warm-up failed: {e}")
+        return False
+
+
+def document_count() -> int:
+    return get_vector_store()._collection.count()
+
+
+def readiness() -> dict:
+    """Snapshot for /health/ready. Never opens or builds the store itself."""
+    status = {
+        "ready": _store is not None,
+        "persist_directory": settings.PERSIST_DIRECTORY,
+        "load_seconds": round(_load_seconds, 3) if _load_seconds is not None else None,
+        "index_path": _store_path,
+        # A rebuild has swapped in a newer version since this process opened its store (restart to pick it up)
+        "stale": _store_path is not None and os.path.realpath(settings.PERSIST_DIRECTORY) != _store_path,
+        "documents": None,
+        "error": _load_error,
+    }
+    if _store is not None:
+        try:
+            status["documents"] = document_count()
+        except Exception as e:
+            status["ready"] = False
+            status["error"] = str(e)
+    return status
+
+
+def _point_at(persist_directory: str, version: str):
+    """Make persist_directory a symlink to version with one os.replace (atomic on POSIX)."""
+    if os.path.isdir(persist_directory) and not os.path.islink(persist_directory):
+        # One-time migration from a plain directory: it becomes a version of its own. Between this
+        # rename and the replace below there is briefly no index at the path; later swaps have no gap.
+        os.rename(persist_directory, f"{persist_directory}.v0-legacy")
+    link = f"{persist_directory}.link-{os.getpid()}"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(version), link)  # relative: versions sit next to the link
+    os.replace(link, persist_directory)
+
+
+def build_vector_store(csv_path: str = None, persist_directory: str = None, force: bool = False) -> int:
+    """
+    Embed the CSV (one Document per row) into a new index version and switch to it.
+    The index is written to its own version directory first, then the persist_directory symlink is
+    swapped to it in one step, so readers never see a half-written store or a missing path.
+    Previous versions are kept (running processes still have them open); remove them with
+    `prune` once every server has restarted on the new one. Returns the number of documents indexed.
+    """
+    csv_path = csv_path or settings.CSV_PATH
+    persist_directory = os.path.abspath(persist_directory or settings.PERSIST_DIRECTORY)
+    if _index_exists(persist_directory) and not force:
+        raise FileExistsError(f"Vector index already exists at '{persist_directory}' (use --force to rebuild)")
+
     print("Creating new vector store...")
-    df = pd.read_csv(settings.CSV_PATH)
+    df = pd.read_csv(csv_path)
 
     # Create one Document per CSV row (row-wise chunking)
     documents = []
     for idx, row in df.iterrows():
         content = "\n".join([f"{k}: {v}" for k, v in row.to_dict().items()])
         documents.append(Document(page_content=content, metadata={"row_index": int(idx)}))
-    
+
     print(f"Created {len(documents)} row documents (1 per CSV row)")
     ids = [str(uuid.uuid4()) for _ in documents]
-    
-    return Chroma.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        persist_directory=settings.PERSIST_DIRECTORY,
-        ids=ids
-    )
\ No newline at end of file
+
+    os.makedirs(os.path.dirname(persist_directory), exist_ok=True)
+    version = f"{persist_directory}.v{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    try:
+        Chroma.from_documents(
+            documents=documents,
+            embedding=embeddings,
+            persist_directory=version,
+            ids=ids
+        )
+        _point_at(persist_directory, version)
+    except Exception:
+        shutil.rmtree(version, ignore_errors=True)
+        raise
+    print(f"Vector store written to {version} (now {persist_directory})")
+    return len(documents)
+
+
+def prune_versions(persist_directory: str = None, keep: int = 1) -> list:
+    """
+    Delete old index versions, keeping the current one and the `keep` newest previous ones.
+    Only run it once every process reports stale=false in /health/ready (they may hold old versions open).
+    """
+    persist_directory = os.path.abspath(persist_directory or settings.PERSIST_DIRECTORY)
+    current = os.path.realpath(persist_directory)
+    previous = [v for v in _versions(persist_directory) if os.path.realpath(v) != current]
+    removed = previous[max(0, keep):]
+    for path in removed:
+        shutil.rmtree(path, ignore_errors=True)
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.vector_store", description="Manage the Chroma index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="embed the product CSV into a new index")
+    build.add_argument("--csv", default=settings.CSV_PATH)
+    build.add_argument("--persist-dir", default=settings.PERSIST_DIRECTORY)
+    build.add_argument("--force", action="store_true", help="replace an existing index")
+    prune = sub.add_parser("prune", help="delete old index versions (after servers have restarted)")
+    prune.add_argument("--persist-dir", default=settings.PERSIST_DIRECTORY)
+    prune.add_argument("--keep", type=int, default=1, help="previous versions to keep for rollback")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        if not os.path.exists(args.csv):
+            print(f"CSV file not found at {args.csv}")
+            return 1
+        try:
+            count = build_vector_store(args.csv, args.persist_dir, force=args.force)
+        except FileExistsError as e:
+            print(str(e))
+            return 1
+        print(f"Indexed {count} documents.")
+    elif args.command == "prune":
+        removed = prune_versions(args.persist_dir, keep=args.keep)
+        print(f"Removed {len(removed)} old index versions: {removed}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
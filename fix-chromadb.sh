@@ -23,8 +23,8 @@ else
 fi
 
 echo "🧹 Cleaning up any lock files..."
-find chroma_db -name "*.lock" -delete 2>/dev/null || true
-find chroma_db -name "*.tmp" -delete 2>/dev/null || true
+find chroma_db/ -name "*.lock" -delete 2>/dev/null || true
+find chroma_db/ -name "*.tmp" -delete 2>/dev/null || true
 
 echo "✅ ChromaDB fix complete!"
 echo "💡 You can now run ./reset-vectorstore.sh to recreate the vector store" 
\ No newline at end of file